@@ -1,10 +1,14 @@
 import argparse
+import hashlib
 import logging
+import re
 import sqlite3
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 import pandas as pd
 
@@ -25,6 +29,40 @@ LCR_SOURCE_CODES = {
     "A6K081": "LCRвв",
     "A6K082": "LCRів",
 }
+DB_6KX_COLUMNS = ["Date", "REC_NO", "EKP", "R030", "R031", "T100"]
+LCR_COLUMNS = ["Date", "LCRвв", "LCRів", "Min_NRM", "Target"]
+# Число файлов, записываемых в одной транзакции
+DEFAULT_WRITE_BATCH = 20
+# PRAGMA, которые можно задать через --pragma (имя=значение)
+_PRAGMA_NAME = re.compile(r"^(journal_mode|synchronous|cache_size|temp_store|mmap_size|locking_mode)$")
+_PRAGMA_VALUE = re.compile(r"^-?\w+$")
+# Манифест загрузки (--incremental): какие версии файлов уже загружены
+MANIFEST_TABLE = "LOAD_MANIFEST"
+MANIFEST_COLUMNS = ["path", "size", "mtime_ns", "sha256", "file_date", "loaded_at"]
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def _insert_sql(table: str, columns: List[str], verb: str = "INSERT") -> str:
+    names = ", ".join(f'"{column}"' for column in columns)
+    marks = ", ".join("?" for _ in columns)
+    return f'{verb} INTO "{table}" ({names}) VALUES ({marks})'
+
+
+INSERT_DB_6KX = _insert_sql("DB_6KX", DB_6KX_COLUMNS)
+INSERT_LCR = _insert_sql("LCR_Combined", LCR_COLUMNS)
+UPSERT_MANIFEST = _insert_sql(MANIFEST_TABLE, MANIFEST_COLUMNS, "INSERT OR REPLACE")
+DELETE_DB_6KX_DATE = 'DELETE FROM "DB_6KX" WHERE "Date" = ?'
+DELETE_LCR_DATE = 'DELETE FROM "LCR_Combined" WHERE "Date" = ?'
+CREATE_MANIFEST = f"""
+CREATE TABLE IF NOT EXISTS "{MANIFEST_TABLE}" (
+    "path" TEXT PRIMARY KEY,
+    "size" INTEGER NOT NULL,
+    "mtime_ns" INTEGER NOT NULL,
+    "sha256" TEXT NOT NULL,
+    "file_date" TEXT NOT NULL,
+    "loaded_at" TEXT NOT NULL
+)
+"""
 
 
 def configure_logger(verbose: bool, log_to_file: bool) -> logging.Logger:
@@ -115,8 +153,7 @@ def build_combined_dataframe(df: pd.DataFrame, file_date: str) -> pd.DataFrame:
     subset = df[EXPECTED_COLUMNS].copy()
     subset["Date"] = file_date
     subset["R031"] = subset["R030"].apply(calculate_r031)
-    columns = ["Date", "REC_NO", "EKP", "R030", "R031", "T100"]
-    return subset[columns]
+    return subset[DB_6KX_COLUMNS]
 
 
 def normalize_numeric(value) -> Optional[float]:
@@ -175,52 +212,263 @@ def check_required_tables(db_path: Path, logger: logging.Logger) -> bool:
     return True
 
 
-def is_date_already_loaded(conn: sqlite3.Connection, file_date: str) -> bool:
-    """Проверяет, существует ли дата в LCR_Combined, чтобы избежать повторной загрузки. Используется опцией --skip-existing."""
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT 1 FROM LCR_Combined WHERE Date = ? LIMIT 1",
-        (file_date,),
-    )
-    return cursor.fetchone() is not None
+def load_loaded_dates(conn: sqlite3.Connection) -> set:
+    """Возвращает все даты из LCR_Combined одним запросом. Используется опциями --skip-existing и --incremental вместо запроса на каждый файл."""
+    return {row[0] for row in conn.execute("SELECT DISTINCT Date FROM LCR_Combined")}
 
 
-def process_file(
-    file_path: Path,
-    file_date: str,
-    conn: sqlite3.Connection,
-    logger: logging.Logger,
-    dry_run: bool,
-) -> bool:
-    """Обрабатывает один Excel-файл: читает, проверяет и при необходимости записывает данные в таблицы DB_6KX и LCR_Combined. Учитывает флаг dry-run и детально логирует каждый этап."""
+class ManifestEntry(NamedTuple):
+    """Строка LOAD_MANIFEST: версия файла (размер, время изменения, SHA-256), загруженная за дату file_date."""
+
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    file_date: str
+    loaded_at: Optional[str] = None
+
+
+def manifest_key(file_path: Path) -> str:
+    """Ключ файла в манифесте — абсолютный путь в виде строки."""
+    return str(file_path.absolute())
+
+
+def file_sha256(file_path: Path) -> str:
+    """Считает SHA-256 содержимого файла блоками по HASH_CHUNK_BYTES, не загружая файл в память целиком."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ensure_manifest_table(conn: sqlite3.Connection) -> None:
+    """Создает таблицу LOAD_MANIFEST, если ее еще нет в базе."""
+    with conn:
+        conn.execute(CREATE_MANIFEST)
+
+
+def record_manifest(conn: sqlite3.Connection, entry: ManifestEntry) -> None:
+    """Добавляет или обновляет строку манифеста для entry.path в текущей транзакции соединения."""
+    loaded_at = entry.loaded_at or datetime.now().isoformat(sep=" ", timespec="seconds")
+    conn.execute(UPSERT_MANIFEST, tuple(entry._replace(loaded_at=loaded_at)))
+
+
+class LoadManifest:
+    """Индекс LOAD_MANIFEST в памяти, читается одним запросом при старте. Неизмененный файл (тот же путь, размер и время изменения) пропускается без открытия; для остальных сравнивается SHA-256 с последней загруженной версией той же даты."""
+
+    def __init__(self, entries: Iterable[ManifestEntry] = ()):
+        self.by_path: Dict[str, ManifestEntry] = {}
+        # Хэш файла, загруженного за дату последним, — его данные сейчас в DB_6KX
+        self.current_hash: Dict[str, str] = {}
+        for entry in entries:
+            self.by_path[entry.path] = entry
+            self.current_hash[entry.file_date] = entry.sha256
+
+    def __len__(self) -> int:
+        return len(self.by_path)
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "LoadManifest":
+        """Читает манифест из базы; если таблицы еще нет (например, в dry-run), возвращает пустой индекс."""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (MANIFEST_TABLE,)
+        ).fetchone()
+        if not exists:
+            return cls()
+        names = ", ".join(f'"{column}"' for column in MANIFEST_COLUMNS)
+        rows = conn.execute(f'SELECT {names} FROM "{MANIFEST_TABLE}" ORDER BY "loaded_at", rowid')
+        return cls(ManifestEntry(*row) for row in rows)
+
+    def classify(self, file_path: Path, file_date: str) -> Tuple[str, ManifestEntry]:
+        """Сравнивает файл с манифестом. Возвращает статус и строку манифеста: unchanged — файл не менялся (не открывается); same_content — содержимое совпадает с загруженным за эту дату; changed/new — файл нужно загрузить. OSError при недоступном файле пробрасывается."""
+        stat = file_path.stat()
+        key = manifest_key(file_path)
+        known = self.by_path.get(key)
+        if known and known.size == stat.st_size and known.mtime_ns == stat.st_mtime_ns:
+            return "unchanged", known
+
+        entry = ManifestEntry(key, stat.st_size, stat.st_mtime_ns, file_sha256(file_path), file_date)
+        if self.current_hash.get(file_date) == entry.sha256:
+            return "same_content", entry
+        return ("changed" if known else "new"), entry
+
+
+class LogRecorder:
+    """Накапливает сообщения журнала в процессе-обработчике вместо вывода. Основной процесс выводит их через replay в порядке дат, поэтому лог параллельной загрузки совпадает с последовательной."""
+
+    def __init__(self):
+        self.records = []
+
+    def log(self, level: int, msg: str, *args) -> None:
+        self.records.append((level, msg, args))
+
+    def debug(self, msg: str, *args) -> None:
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args) -> None:
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg: str, *args) -> None:
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg: str, *args) -> None:
+        self.log(logging.ERROR, msg, *args)
+
+
+def replay_records(records, logger: logging.Logger) -> None:
+    """Выводит в logger сообщения, накопленные LogRecorder, в исходном порядке."""
+    for level, msg, args in records:
+        logger.log(level, msg, *args)
+
+
+def prepare_file(file_path: Path, file_date: str, logger) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """Читает и проверяет Excel-файл и строит наборы для DB_6KX и LCR_Combined. Возвращает None, если файл не прочитан или не прошел проверку (причина записана в logger)."""
     logger.info("Обработка файла %s (дата %s)", file_path.name, file_date)
     try:
         df = read_source_dataframe(file_path)
     except Exception as exc:
         logger.error("Ошибка при чтении файла %s: %s", file_path, exc)
-        return False
+        return None
 
     validation_error = validate_dataframe(df)
     if validation_error:
         logger.error("Пропускаю %s: %s", file_path, validation_error)
-        return False
+        return None
 
     df_combined = build_combined_dataframe(df, file_date)
     lcr_row = build_lcr_row(df_combined, file_date, logger)
+    return df_combined, lcr_row
 
-    if dry_run:
-        logger.info("Режим dry-run: запись в БД пропущена для %s", file_path.name)
-        return True
 
-    try:
-        df_combined.to_sql("DB_6KX", conn, if_exists="append", index=False)
-        pd.DataFrame([lcr_row]).to_sql("LCR_Combined", conn, if_exists="append", index=False)
-    except Exception as exc:
-        logger.error("Ошибка при записи данных из %s: %s", file_path, exc)
-        return False
+def parse_pragma(text: str) -> Tuple[str, str]:
+    """Разбирает аргумент --pragma вида имя=значение (например, journal_mode=WAL). Допускаются только PRAGMA из _PRAGMA_NAME, чтобы аргумент нельзя было использовать для произвольного SQL."""
+    name, _, value = text.partition("=")
+    name, value = name.strip().lower(), value.strip()
+    if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(value):
+        raise argparse.ArgumentTypeError(f"Недопустимая PRAGMA: {text}")
+    return name, value
 
-    logger.info("Файл %s успешно загружен", file_path.name)
-    return True
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: List[Tuple[str, str]], logger: logging.Logger) -> None:
+    """Устанавливает PRAGMA соединения перед загрузкой и логирует фактическое значение каждой. WAL не поддерживается на сетевых дисках — для базы на r:\\ его включать не следует."""
+    for name, value in pragmas:
+        result = conn.execute(f"PRAGMA {name}={value}").fetchone()
+        logger.info("PRAGMA %s=%s (результат: %s)", name, value, result[0] if result else value)
+
+
+def _db_6kx_rows(df_combined: pd.DataFrame):
+    """Строки DB_6KX для executemany: пустые значения (NaN) записываются как NULL, как при to_sql."""
+    values = df_combined[DB_6KX_COLUMNS].to_numpy(dtype=object)
+    missing = pd.isna(values)
+    if missing.any():
+        values[missing] = None
+    return values.tolist()
+
+
+def insert_file(
+    conn: sqlite3.Connection,
+    df_combined: pd.DataFrame,
+    lcr_row: dict,
+    replace: bool = False,
+    manifest_entry: Optional[ManifestEntry] = None,
+) -> None:
+    """Добавляет наборы одного файла в DB_6KX и LCR_Combined подготовленными INSERT (executemany) в текущей транзакции соединения. При replace сначала удаляет строки этой даты, а manifest_entry записывает в LOAD_MANIFEST в той же транзакции; фиксацию и откат выполняет вызывающий код."""
+    if replace:
+        conn.execute(DELETE_DB_6KX_DATE, (lcr_row["Date"],))
+        conn.execute(DELETE_LCR_DATE, (lcr_row["Date"],))
+    conn.executemany(INSERT_DB_6KX, _db_6kx_rows(df_combined))
+    conn.execute(INSERT_LCR, tuple(lcr_row[column] for column in LCR_COLUMNS))
+    if manifest_entry is not None:
+        record_manifest(conn, manifest_entry)
+
+
+class BulkWriter:
+    """Записывает подготовленные файлы пачками: одна транзакция на batch_size файлов вместо фиксации после каждого. При ошибке пачка откатывается целиком и ее файлы записываются по одному, каждый в своей транзакции, чтобы в базу попали все корректные файлы, а в лог — точная причина сбоя. Строка «Файл … успешно загружен» выводится при постановке файла в очередь, сразу после его «Обработка файла», как при записи по одному; при фиксации пачки в лог идет только ее итог, при откате — предупреждение и ошибки файлов, не записанных и по одному."""
+
+    def __init__(self, conn: sqlite3.Connection, logger: logging.Logger, batch_size: int = DEFAULT_WRITE_BATCH):
+        self.conn = conn
+        self.logger = logger
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+
+    def add(
+        self,
+        file_path: Path,
+        file_date: str,
+        df_combined: pd.DataFrame,
+        lcr_row: dict,
+        replace: bool = False,
+        manifest_entry: Optional[ManifestEntry] = None,
+    ) -> List[Tuple[Path, bool]]:
+        """Ставит файл в очередь; при заполнении пачки записывает ее. Параметры replace и manifest_entry передаются в insert_file. Возвращает результаты записанных файлов (путь, успех)."""
+        self.pending.append((file_path, file_date, df_combined, lcr_row, replace, manifest_entry))
+        if self.batch_size > 1:
+            # Результат выводится в порядке файлов; если пачка не запишется, flush сообщит об ошибке
+            self.logger.info("Файл %s успешно загружен", file_path.name)
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[Tuple[Path, bool]]:
+        """Записывает накопленные файлы одной транзакцией. Возвращает результаты (путь, успех) в порядке записи."""
+        batch, self.pending = self.pending, []
+        if not batch:
+            return []
+        if len(batch) > 1:
+            try:
+                with self.conn:
+                    for _, _, df_combined, lcr_row, replace, manifest_entry in batch:
+                        insert_file(self.conn, df_combined, lcr_row, replace, manifest_entry)
+            except Exception as exc:
+                self.logger.warning(
+                    "Ошибка при записи пачки из %s файлов (%s): пачка отменена, запись по одному файлу",
+                    len(batch),
+                    exc,
+                )
+            else:
+                self.logger.debug("Записана пачка из %s файлов", len(batch))
+                return [(item[0], True) for item in batch]
+        return [self._write_single(*item) for item in batch]
+
+    def _write_single(
+        self,
+        file_path: Path,
+        file_date: str,
+        df_combined: pd.DataFrame,
+        lcr_row: dict,
+        replace: bool = False,
+        manifest_entry: Optional[ManifestEntry] = None,
+    ) -> Tuple[Path, bool]:
+        try:
+            with self.conn:
+                insert_file(self.conn, df_combined, lcr_row, replace, manifest_entry)
+        except Exception as exc:
+            self.logger.error("Ошибка при записи данных из %s: %s", file_path, exc)
+            return file_path, False
+        if self.batch_size == 1:
+            self.logger.info("Файл %s успешно загружен", file_path.name)
+        return file_path, True
+
+
+def _prepare_in_worker(item: Tuple[str, Path]):
+    """Точка входа процесса-обработчика: готовит файл и возвращает результат вместе с накопленным журналом."""
+    file_date, file_path = item
+    recorder = LogRecorder()
+    return prepare_file(file_path, file_date, recorder), recorder.records
+
+
+def prepare_in_pool(items: List[Tuple[str, Path]], workers: int) -> Iterator[tuple]:
+    """Готовит файлы (дата, путь) в пуле из workers процессов и выдает (результат, журнал) в исходном порядке. В работе одновременно не больше 2 * workers файлов, чтобы при медленной записи готовые DataFrame не копились в памяти."""
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(_prepare_in_worker, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 
 def parse_args() -> argparse.Namespace:
@@ -257,6 +505,32 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Пропускать файлы, если дата уже есть в LCR_Combined",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Загружать только новые и измененные файлы по манифесту {MANIFEST_TABLE}; повторно выпущенный файл заменяет данные своей даты",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Число процессов для чтения файлов (по умолчанию 1 — последовательно); запись в БД — в одном процессе в порядке дат",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_WRITE_BATCH,
+        help=f"Число файлов в одной транзакции записи (по умолчанию {DEFAULT_WRITE_BATCH})",
+    )
+    parser.add_argument(
+        "--pragma",
+        type=parse_pragma,
+        action="append",
+        default=[],
+        metavar="ИМЯ=ЗНАЧЕНИЕ",
+        help="PRAGMA соединения перед загрузкой, можно несколько раз: journal_mode=WAL, synchronous=NORMAL, cache_size=-65536 (WAL — только для локальной базы)",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -304,6 +578,21 @@ def main() -> int:
     failed: List[Path] = []
 
     with sqlite3.connect(db_path) as conn:
+        apply_pragmas(conn, args.pragma, logger)
+        writer = BulkWriter(conn, logger, args.batch_size)
+        # Файлы в очереди BulkWriter -> дата; дата считается загруженной только после записи
+        queued: Dict[Path, str] = {}
+
+        def account(results: List[Tuple[Path, bool]]) -> None:
+            nonlocal processed
+            for written_path, ok in results:
+                file_date = queued.pop(written_path)
+                if ok:
+                    processed += 1
+                    loaded_dates.add(file_date)
+                else:
+                    failed.append(written_path)
+
         files_with_dates = []
         for file_path in files:
             try:
@@ -316,8 +605,59 @@ def main() -> int:
 
         files_with_dates.sort(key=lambda item: item[0])
 
+        # Даты и манифест читаются одним запросом каждый, а не запросом на файл
+        loaded_dates = set()
+        if args.skip_existing or args.incremental:
+            loaded_dates = load_loaded_dates(conn)
+        manifest = None
+        if args.incremental:
+            if not args.dry_run:
+                ensure_manifest_table(conn)
+            manifest = LoadManifest.load(conn)
+            logger.info(
+                "Манифест загрузки: файлов %s, дат в LCR_Combined %s",
+                len(manifest),
+                len(loaded_dates),
+            )
+
+        # Даты, уже загруженные до запуска (--skip-existing), и неизмененные файлы не читаются
+        already_loaded = set(loaded_dates) if args.skip_existing else set()
+        states = {}
+        to_prepare = []
+        claimed_dates = set()
         for file_date, file_path in files_with_dates:
-            if args.skip_existing and is_date_already_loaded(conn, file_date):
+            if file_date in already_loaded:
+                continue
+            if manifest is not None:
+                try:
+                    states[file_path] = manifest.classify(file_path, file_date)
+                except OSError as exc:
+                    states[file_path] = exc
+                    continue
+                status, manifest_entry = states[file_path]
+                if status == "same_content" and file_date in claimed_dates:
+                    # Дату в этом запуске уже заменяет другой файл — совпадение с прежней версией не в счет
+                    states[file_path] = status, manifest_entry = "changed", manifest_entry
+                if status in ("unchanged", "same_content"):
+                    continue
+            to_prepare.append((file_date, file_path))
+            claimed_dates.add(file_date)
+
+        prepared_iter = None
+        if args.workers > 1:
+            prepared_iter = prepare_in_pool(to_prepare, args.workers)
+        to_prepare = {file_path for _, file_path in to_prepare}
+
+        for file_date, file_path in files_with_dates:
+            prepared = records = None
+            if prepared_iter is not None and file_path in to_prepare:
+                prepared, records = next(prepared_iter)
+
+            if file_date in queued.values():
+                # Файл той же даты еще в очереди — записываем пачку, чтобы знать, загружена ли дата
+                account(writer.flush())
+
+            if args.skip_existing and file_date in loaded_dates:
                 logger.info(
                     "Дата %s уже есть в LCR_Combined, пропускаю файл %s",
                     file_date,
@@ -326,10 +666,55 @@ def main() -> int:
                 skipped += 1
                 continue
 
-            if process_file(file_path, file_date, conn, logger, args.dry_run):
-                processed += 1
+            state = states.get(file_path)
+            if isinstance(state, OSError):
+                logger.error("Не удалось прочитать файл %s: %s", file_path, state)
+                failed.append(file_path)
+                continue
+            status, manifest_entry = state if state else (None, None)
+            if status == "unchanged":
+                logger.info("Файл %s не изменился после загрузки, пропускаю", file_path.name)
+                skipped += 1
+                continue
+            if status == "same_content":
+                logger.info(
+                    "Содержимое %s совпадает с загруженным за %s, пропускаю",
+                    file_path.name,
+                    file_date,
+                )
+                if not args.dry_run:
+                    # Запоминаем новый размер и время изменения, чтобы в следующий раз не считать хэш
+                    with conn:
+                        record_manifest(conn, manifest_entry)
+                skipped += 1
+                continue
+
+            if prepared_iter is None:
+                prepared = prepare_file(file_path, file_date, logger)
             else:
+                replay_records(records, logger)
+
+            if prepared is None:
                 failed.append(file_path)
+                continue
+
+            replace = manifest is not None and file_date in loaded_dates
+            if replace:
+                logger.info(
+                    "Дата %s уже загружена: данные заменяются файлом %s",
+                    file_date,
+                    file_path.name,
+                )
+            if args.dry_run:
+                logger.info("Режим dry-run: запись в БД пропущена для %s", file_path.name)
+                processed += 1
+            else:
+                # Дата попадает в loaded_dates в account(), когда запись файла зафиксирована;
+                # в dry-run ничего не записано — дата не считается загруженной
+                queued[file_path] = file_date
+                account(writer.add(file_path, file_date, *prepared, replace, manifest_entry))
+
+        account(writer.flush())
 
     logger.info(
         "Готово: обработано=%s, пропущено=%s, с ошибками=%s",
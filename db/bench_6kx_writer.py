@@ -0,0 +1,119 @@
+"""
+Замер скорости записи 6KX в SQLite на синтетических файлах.
+
+Сравнивает прежнюю запись (два DataFrame.to_sql на файл) с BulkWriter
+(executemany, одна транзакция на пачку файлов) при разных размерах пачки
+и PRAGMA. Каждый запуск пишет в новую временную базу; выводится лучшее
+время из --repeat запусков.
+
+    python db/bench_6kx_writer.py --files 200 --rows 1500
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db.batch_entry_db_6kx import BulkWriter, apply_pragmas, build_combined_dataframe, build_lcr_row
+
+CREATE_TABLES = [
+    'CREATE TABLE DB_6KX ("Date" TEXT, "REC_NO" TEXT, "EKP" TEXT, "R030" TEXT, "R031" TEXT, "T100" TEXT)',
+    'CREATE TABLE LCR_Combined ("Date" TEXT, "LCRвв" REAL, "LCRів" REAL, "Min_NRM" REAL, "Target" REAL)',
+]
+
+
+def synthetic_files(count: int, rows: int, seed: int = 0) -> List[Tuple[Path, str, pd.DataFrame, dict]]:
+    """Подготовленные наборы count файлов по rows строк — в том виде, в каком их строит загрузчик."""
+    rng = np.random.default_rng(seed)
+    logger = logging.getLogger("bench_6kx_writer")
+    dates = pd.bdate_range("2020-01-01", periods=count).strftime("%Y-%m-%d")
+    ekp = [f"A6K{i % 1000:03d}" for i in range(rows)]
+    ekp[81 % rows], ekp[82 % rows] = "A6K081", "A6K082"
+    files = []
+    for file_date in dates:
+        source = pd.DataFrame({
+            "REC_NO": [str(i) for i in range(rows)],
+            "EKP": ekp,
+            "R030": rng.choice(["980", "840", "978", "#"], rows),
+            "T100": [f"{value:.2f}".replace(".", ",") for value in rng.uniform(0, 1e6, rows)],
+        })
+        df_combined = build_combined_dataframe(source, file_date)
+        files.append((Path(f"6КХ_{file_date}.xlsx"), file_date, df_combined, build_lcr_row(df_combined, file_date, logger)))
+    return files
+
+
+def _new_db(directory: str, name: str) -> Path:
+    path = Path(directory) / f"{name}.db"
+    with sqlite3.connect(path) as conn:
+        for statement in CREATE_TABLES:
+            conn.execute(statement)
+    conn.close()
+    return path
+
+
+def write_to_sql(conn: sqlite3.Connection, files) -> None:
+    """Прежний путь: DataFrame.to_sql для DB_6KX и LCR_Combined на каждый файл."""
+    for _, _, df_combined, lcr_row in files:
+        df_combined.to_sql("DB_6KX", conn, if_exists="append", index=False)
+        pd.DataFrame([lcr_row]).to_sql("LCR_Combined", conn, if_exists="append", index=False)
+
+
+def write_bulk(conn: sqlite3.Connection, files, batch_size: int) -> None:
+    logger = logging.getLogger("bench_6kx_writer")
+    writer = BulkWriter(conn, logger, batch_size)
+    for item in files:
+        writer.add(*item)
+    writer.flush()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Замер скорости записи 6KX в SQLite")
+    parser.add_argument("--files", type=int, default=200, help="Число синтетических файлов")
+    parser.add_argument("--rows", type=int, default=1500, help="Строк DB_6KX в файле")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого варианта (берется лучшее время)")
+    parser.add_argument("--dir", default=None, help="Каталог для временных баз (по умолчанию — системный)")
+    args = parser.parse_args()
+
+    files = synthetic_files(args.files, args.rows)
+    total_rows = args.files * args.rows
+    logger = logging.getLogger("bench_6kx_writer")
+    wal = [("journal_mode", "WAL"), ("synchronous", "NORMAL"), ("cache_size", "-65536")]
+    variants = [
+        ("to_sql по файлу (прежний путь)", [], lambda conn: write_to_sql(conn, files)),
+        ("BulkWriter, пачка 1", [], lambda conn: write_bulk(conn, files, 1)),
+        ("BulkWriter, пачка 20", [], lambda conn: write_bulk(conn, files, 20)),
+        ("BulkWriter, пачка 100", [], lambda conn: write_bulk(conn, files, 100)),
+        ("BulkWriter, пачка 20 + WAL", wal, lambda conn: write_bulk(conn, files, 20)),
+    ]
+
+    print(f"Файлов: {args.files}, строк в файле: {args.rows}, всего строк: {total_rows}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for i, (title, pragmas, write) in enumerate(variants):
+            best = None
+            for attempt in range(args.repeat):
+                db_path = _new_db(directory, f"bench_{i}_{attempt}")
+                with sqlite3.connect(db_path) as conn:
+                    apply_pragmas(conn, pragmas, logger)
+                    started = time.perf_counter()
+                    write(conn)
+                    conn.commit()
+                    elapsed = time.perf_counter() - started
+                    count = conn.execute("SELECT COUNT(*) FROM DB_6KX").fetchone()[0]
+                conn.close()
+                assert count == total_rows, f"{title}: записано {count} строк из {total_rows}"
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{title:<34} {best:7.2f} с  {args.files / best:8.1f} файл/с  {total_rows / best:10.0f} строк/с")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,24 +1,108 @@
 # Авторизация в SR_bank
 
+import atexit
 import json
 import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
 import oracledb
 
-def get_oracle_connection():
+# Параметры пула сессий (общий на процесс, создаётся при первом обращении)
+POOL_MIN = 1              # минимальное число сессий в пуле
+POOL_MAX = 4              # максимальное число сессий в пуле
+POOL_INCREMENT = 1        # на сколько сессий расширять пул за раз
+POOL_PING_INTERVAL = 60   # секунд простоя, после которых сессия проверяется ping-ом перед выдачей
+POOL_TIMEOUT = 300        # секунд простоя, после которых лишние сессии закрываются
+STMT_CACHE_SIZE = 40      # размер кеша подготовленных выражений на сессию
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _load_credentials() -> dict:
+    """Читает ~/.conda/db_ac.json один раз за процесс."""
     # 1) Формируем полный путь к файлу в .conda для текущего пользователя
-    creds_path = os.path.expanduser(r"~\.conda\db_ac.json")
+    creds_path = os.path.expanduser(os.path.join("~", ".conda", "db_ac.json"))
 
     # 2) Загружаем параметры
     with open(creds_path, "r", encoding="utf-8") as f:
-        creds = json.load(f)
+        return json.load(f)
+
+
+def connection_identity() -> str:
+    """Пользователь и DSN подключения (user@dsn) — различает окружения, например, в ключе кеша."""
+    creds = _load_credentials()
+    return f"{creds['user'].upper()}@{creds['dsn']}"
+
+
+def get_oracle_connection():
+    """Открывает отдельное (непулированное) соединение в Thin Mode."""
+    creds = _load_credentials()
 
-    # 3) Подключаемся в Thin Mode
+    # Подключаемся в Thin Mode
     return oracledb.connect(
         user=creds["user"],
         password=creds["password"],
         dsn=creds["dsn"]
     )
 
+
+def get_oracle_pool() -> oracledb.ConnectionPool:
+    """
+    Возвращает общий на процесс пул сессий Oracle, создавая его при первом вызове.
+
+    Размеры пула задаются константами POOL_MIN / POOL_MAX / POOL_INCREMENT.
+    Перед выдачей сессии, простоявшей дольше POOL_PING_INTERVAL секунд,
+    oracledb проверяет её ping-ом и при необходимости заменяет новой.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                creds = _load_credentials()
+                _pool = oracledb.create_pool(
+                    user=creds["user"],
+                    password=creds["password"],
+                    dsn=creds["dsn"],
+                    min=POOL_MIN,
+                    max=POOL_MAX,
+                    increment=POOL_INCREMENT,
+                    ping_interval=POOL_PING_INTERVAL,
+                    timeout=POOL_TIMEOUT,
+                    stmtcachesize=STMT_CACHE_SIZE,
+                    getmode=oracledb.POOL_GETMODE_WAIT,
+                )
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """Берёт сессию из пула и возвращает её обратно по выходу из блока with."""
+    conn = get_oracle_pool().acquire()
+    try:
+        yield conn
+    finally:
+        # close() у пулированного соединения возвращает сессию в пул
+        conn.close()
+
+
+def close_oracle_pool():
+    """Закрывает пул сессий (вызывается автоматически при завершении процесса)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            try:
+                _pool.close(force=True)
+            finally:
+                _pool = None
+
+
+atexit.register(close_oracle_pool)
+
+
 if __name__ == "__main__":
     conn = get_oracle_connection()
     print("✅ Connected using JSON config in .conda")
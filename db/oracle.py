@@ -1,12 +1,122 @@
+import hashlib
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
 # Импортируем библиотеку pandas для работы с таблицами и данными
 import pandas as pd
-# Импортируем функцию для подключения к базе данных Oracle
-from db.connect_db_oracle import get_oracle_connection
+import oracledb
+# Импортируем функции для подключения к базе данных Oracle
+from db.connect_db_oracle import connection_identity, get_oracle_connection, pooled_connection
+from db import result_cache
+from utils.sql_templates import validate_params
 
-# Определяем функцию для выполнения SQL-запроса и получения результатов в виде DataFrame
-def query(sql: str, params: dict = None) -> pd.DataFrame:
-    # Получаем соединение с базой данных Oracle
-    conn = get_oracle_connection()
+# pyarrow нужен только для колоночного режима; без него используется запасной путь
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Брать сессии из общего пула (False — старое поведение: новое соединение на каждый запрос)
+USE_POOL = True
+
+# Настройки выборки для колоночного режима (query_columnar)
+FETCH_ARRAYSIZE = 5000    # строк за один сетевой round trip
+FETCH_PREFETCHROWS = FETCH_ARRAYSIZE + 1
+
+# Настройки поиска по списку ключей (query_in_batches)
+IN_BATCH_SIZE = 500       # ключей в одном запросе (Oracle допускает не более 1000 в IN)
+IN_WORKERS = 4            # параллельных запросов (не больше размера пула POOL_MAX)
+
+
+# Клиентская статистика выполнений: сколько раз выполнялся каждый текст SQL.
+# Каждый новый текст — минимум один hard parse в Oracle, повторный — мягкий разбор
+# или попадание в кеш выражений сессии.
+_statement_counts = Counter()
+_statement_lock = threading.Lock()
+
+
+def _record_statement(sql: str):
+    digest = hashlib.sha1(sql.encode("utf-8")).hexdigest()
+    with _statement_lock:
+        _statement_counts[digest] += 1
+
+
+def statement_stats() -> dict:
+    """Возвращает число выполнений и число различных текстов SQL с начала процесса (или сброса)."""
+    with _statement_lock:
+        return {
+            "executions": sum(_statement_counts.values()),
+            "distinct_statements": len(_statement_counts),
+        }
+
+
+def reset_statement_stats():
+    """Сбрасывает клиентскую статистику выполнений."""
+    with _statement_lock:
+        _statement_counts.clear()
+
+
+def session_parse_counts(conn) -> dict:
+    """
+    Читает счётчики разбора текущей сессии из v$mystat.
+
+    Требует права SELECT на v$mystat / v$statname.
+
+    Returns:
+        dict: {'parse count (total)': n, 'parse count (hard)': n, 'execute count': n}
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT sn.NAME, ms.VALUE FROM v$mystat ms "
+            "JOIN v$statname sn ON sn.STATISTIC# = ms.STATISTIC# "
+            "WHERE sn.NAME IN ('parse count (total)', 'parse count (hard)', 'execute count')"
+        )
+        return {name: int(value) for name, value in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def expand_in_list(sql: str, name: str, values, size: int):
+    """
+    Раскрывает :<name> внутри IN (...) в фиксированное число bind-переменных.
+
+    Список дополняется NULL до size элементов (IN с NULL ничего не совпадает),
+    поэтому текст запроса одинаков для любого набора значений не длиннее size.
+    Элементы-кортежи раскрываются в группы для многоколоночного IN:
+    (col1, col2) IN (:<name>_0_0, :<name>_0_1), ...
+
+    Returns:
+        tuple: (sql, params) — текст с :<name>_0 ... :<name>_{size-1} и словарь значений
+    """
+    values = list(values)
+    if len(values) > size:
+        raise ValueError(f"Для :{name} передано {len(values)} значений, допускается не более {size}")
+    width = len(values[0]) if values and isinstance(values[0], tuple) else 0
+
+    params = {}
+    placeholders = []
+    for i in range(size):
+        value = values[i] if i < len(values) else None
+        if width:
+            group = [f"{name}_{i}_{j}" for j in range(width)]
+            for j, bind in enumerate(group):
+                params[bind] = None if value is None else value[j]
+            placeholders.append("(" + ", ".join(f":{bind}" for bind in group) + ")")
+        else:
+            params[f"{name}_{i}"] = value
+            placeholders.append(f":{name}_{i}")
+
+    text = ", ".join(placeholders)
+    sql = re.sub(rf"(?<![\w:]):{re.escape(name)}\b", lambda _: text, sql)
+    return sql, params
+
+
+def _execute(conn, sql: str, params: dict = None) -> pd.DataFrame:
     # Создаём курсор для выполнения SQL-запросов
     cursor = conn.cursor()
     try:
@@ -21,5 +131,317 @@ def query(sql: str, params: dict = None) -> pd.DataFrame:
     finally:
         # Закрываем курсор в любом случае (даже если произошла ошибка)
         cursor.close()
+
+
+def _numbers_as_float(cursor, metadata):
+    """Output type handler: NUMBER/FLOAT сразу в float вместо int/Decimal."""
+    if metadata.type_code is oracledb.DB_TYPE_NUMBER:
+        return cursor.var(float, arraysize=cursor.arraysize)
+
+
+def _column_array(values, type_code):
+    """Собирает одну колонку пакета в numpy-массив нужного dtype."""
+    if type_code is oracledb.DB_TYPE_NUMBER:
+        return np.array([np.nan if v is None else v for v in values], dtype="float64")
+    if type_code in (oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP):
+        return pd.to_datetime(pd.Series(values, dtype="object")).to_numpy()
+    return np.array(values, dtype="object")
+
+
+def _execute_columnar_fallback(conn, sql: str, params: dict = None) -> pd.DataFrame:
+    """Колоночная сборка без pyarrow: fetchmany пакетами, каждый пакет сразу в numpy-колонки."""
+    cursor = conn.cursor()
+    try:
+        cursor.arraysize = FETCH_ARRAYSIZE
+        cursor.prefetchrows = FETCH_PREFETCHROWS
+        cursor.outputtypehandler = _numbers_as_float
+        cursor.execute(sql, params or {})
+        description = cursor.description
+        chunks = [[] for _ in description]
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            # Транспонируем пакет и сразу отпускаем кортежи строк
+            for i, values in enumerate(zip(*rows)):
+                chunks[i].append(_column_array(values, description[i].type_code))
+            del rows
+        data = {}
+        for col, parts in zip(description, chunks):
+            if parts:
+                data[col.name] = np.concatenate(parts)
+            else:
+                data[col.name] = _column_array((), col.type_code)
+        return pd.DataFrame(data, columns=[col.name for col in description])
+    finally:
+        cursor.close()
+
+
+def _require_arrow():
+    if pa is None:
+        raise RuntimeError("Для as_arrow=True требуется пакет pyarrow")
+
+
+def _execute_columnar(conn, sql: str, params: dict = None, as_arrow: bool = False):
+    if as_arrow:
+        # Проверка до выполнения запроса, чтобы не выбирать результат впустую
+        _require_arrow()
+    if pa is not None and hasattr(conn, "fetch_df_all"):
+        # oracledb собирает результат сразу в Arrow-колонки, минуя кортежи Python
+        odf = conn.fetch_df_all(sql, params or {}, arraysize=FETCH_ARRAYSIZE)
+        table = pa.table(odf)
+        if as_arrow:
+            return table
+        return table.to_pandas(self_destruct=True, split_blocks=True)
+
+    df = _execute_columnar_fallback(conn, sql, params)
+    if as_arrow:
+        # pyarrow есть, но в oracledb нет fetch_df_all — Arrow собирается из готовых колонок
+        return pa.Table.from_pandas(df, preserve_index=False)
+    return df
+
+
+@contextmanager
+def _connection():
+    if USE_POOL:
+        # Берём сессию из пула; по выходу из блока она возвращается в пул
+        with pooled_connection() as conn:
+            yield conn
+        return
+
+    # Получаем отдельное соединение с базой данных Oracle
+    conn = get_oracle_connection()
+    try:
+        yield conn
+    finally:
         # Закрываем соединение с базой данных
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def _with_connection(func, *args, **kwargs):
+    with _connection() as conn:
+        return func(conn, *args, **kwargs)
+
+
+def _cached(func, sql: str, params: dict, use_cache: bool, volatile: bool,
+            cache_version: str = None) -> pd.DataFrame:
+    """Обёртка над дисковым кешем результатов (см. db.result_cache)."""
+    # Несовпадение параметров и bind-переменных ловим до round trip в БД
+    validate_params(sql, params)
+    ttl = result_cache.ttl_for(params, volatile) if use_cache and result_cache.is_enabled() else False
+    if ttl is False:
+        _record_statement(sql)
+        return _with_connection(func, sql, params)
+
+    key = result_cache.make_key(sql, params, connection_identity(), cache_version)
+    df = result_cache.get(key)
+    if df is None:
+        _record_statement(sql)
+        df = _with_connection(func, sql, params)
+        result_cache.put(key, df, ttl)
+    return df
+
+
+# Определяем функцию для выполнения SQL-запроса и получения результатов в виде DataFrame
+def query(sql: str, params: dict = None, use_cache: bool = True, volatile: bool = False,
+          cache_version: str = None) -> pd.DataFrame:
+    """
+    Выполняет запрос и возвращает результат в виде DataFrame.
+
+    Результаты по закрытым датам берутся из дискового кеша (db.result_cache).
+
+    Args:
+        sql (str): текст запроса
+        params (dict): bind-параметры
+        use_cache (bool): False — всегда идти в БД
+        volatile (bool): данные могут меняться (прогнозный режим) — короткий срок кеша
+        cache_version (str): версия данных в БД, добавляется в ключ кеша
+    """
+    return _cached(_execute, sql, params, use_cache, volatile, cache_version)
+
+
+def query_columnar(sql: str, params: dict = None, as_arrow: bool = False,
+                   use_cache: bool = True, volatile: bool = False, cache_version: str = None):
+    """
+    Выполняет запрос и собирает результат сразу по колонкам.
+
+    В отличие от query() не строит промежуточный список кортежей: при наличии
+    pyarrow используется Connection.fetch_df_all (Arrow-колонки), иначе —
+    fetchmany пакетами по FETCH_ARRAYSIZE с переводом NUMBER в float64
+    и DATE в datetime64.
+
+    Args:
+        sql (str): текст запроса
+        params (dict): bind-параметры
+        as_arrow (bool): вернуть pyarrow.Table вместо DataFrame (кеш не используется)
+        use_cache (bool): False — всегда идти в БД
+        volatile (bool): данные могут меняться (прогнозный режим) — короткий срок кеша
+        cache_version (str): версия данных в БД, добавляется в ключ кеша
+
+    Returns:
+        pd.DataFrame | pyarrow.Table
+    """
+    if as_arrow:
+        _require_arrow()
+        return _with_connection(_execute_columnar, sql, params, as_arrow=True)
+    return _cached(_execute_columnar, sql, params, use_cache, volatile, cache_version)
+
+
+def query_iter(sql: str, params: dict = None, chunk_rows: int = FETCH_ARRAYSIZE):
+    """
+    Выполняет запрос и отдаёт результат частями (DataFrame по chunk_rows строк).
+
+    Пиковая память ограничена размером части, а не всего результата.
+    Сессия удерживается, пока генератор не исчерпан или не закрыт.
+
+    Args:
+        sql (str): текст запроса
+        params (dict): bind-параметры
+        chunk_rows (int): число строк в одной части
+
+    Yields:
+        pd.DataFrame: очередная часть результата (первая может быть пустой,
+                      если запрос ничего не вернул — чтобы передать колонки)
+    """
+    validate_params(sql, params)
+    _record_statement(sql)
+    with _connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.arraysize = chunk_rows
+            cursor.prefetchrows = chunk_rows + 1
+            cursor.execute(sql, params or {})
+            columns = [col[0] for col in cursor.description]
+            yielded = False
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yielded = True
+                yield pd.DataFrame(rows, columns=columns)
+            if not yielded:
+                yield pd.DataFrame(columns=columns)
+        finally:
+            cursor.close()
+
+
+def query_in_batches(sql: str, name: str, keys, params: dict = None,
+                     batch_size: int = IN_BATCH_SIZE, workers: int = IN_WORKERS,
+                     use_cache: bool = True, cache_version: str = None) -> pd.DataFrame:
+    """
+    Выполняет запрос с IN (:<name>) для произвольно длинного списка ключей.
+
+    Ключи делятся на пакеты по batch_size; каждый пакет раскрывается в ровно
+    batch_size bind-переменных (см. expand_in_list), поэтому текст запроса один
+    для всех пакетов и любого числа ключей. Пакеты выполняются параллельно
+    (до workers сессий пула), результаты склеиваются в порядке пакетов.
+
+    Args:
+        sql (str): текст запроса с плейсхолдером :<name> внутри IN (...)
+        name (str): имя плейсхолдера списка
+        keys (Iterable): ключи (кортежи — для многоколоночного IN)
+        params (dict): остальные bind-параметры, общие для всех пакетов
+        batch_size (int): ключей в одном запросе (не более 1000)
+        workers (int): число параллельных запросов
+        use_cache (bool): False — всегда идти в БД
+        cache_version (str): версия данных в БД, добавляется в ключ кеша
+
+    Returns:
+        pd.DataFrame: объединённый результат всех пакетов
+    """
+    keys = list(keys)
+    batches = [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)] or [[]]
+
+    def run(batch):
+        batch_sql, batch_params = expand_in_list(sql, name, batch, batch_size)
+        return query(batch_sql, {**(params or {}), **batch_params}, use_cache=use_cache,
+                     cache_version=cache_version)
+
+    if len(batches) == 1 or workers <= 1:
+        frames = [run(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            # map сохраняет порядок пакетов независимо от порядка завершения
+            frames = list(executor.map(run, batches))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _bench_pool(n: int):
+    global USE_POOL
+    import time
+
+    for use_pool in (False, True):
+        USE_POOL = use_pool
+        started = time.perf_counter()
+        for _ in range(n):
+            query("SELECT 1 AS X FROM dual")
+        elapsed = time.perf_counter() - started
+        label = "pool" if use_pool else "connect per query"
+        print(f"{label:>18}: {n} запросов за {elapsed:.3f} с ({elapsed / n * 1000:.1f} мс/запрос)")
+
+
+def _bench_fetch(n: int):
+    import time
+    import tracemalloc
+
+    # Синтетическая «широкая» выборка: числа, даты и строки
+    sql = (
+        "SELECT level AS ID, level * 1.5 AS SUM_UAH, level * 0.25 AS SUM_CUR, "
+        "SYSDATE - level / 1440 AS POST_DATE, 'ACC' || level AS ACCOUNT_NUMBER, "
+        "RPAD('x', 40, 'x') AS DESCRIPTION "
+        "FROM dual CONNECT BY level <= :n"
+    )
+    runs = [("fetchall + DataFrame", lambda: query(sql, {"n": n})),
+            ("columnar", lambda: query_columnar(sql, {"n": n}))]
+    for label, func in runs:
+        if pa is not None:
+            pa.default_memory_pool().release_unused()
+        tracemalloc.start()
+        started = time.perf_counter()
+        df = func()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        arrow_peak = pa.default_memory_pool().max_memory() if pa is not None else 0
+        print(f"{label:>22}: {len(df)} строк за {elapsed:.3f} с, "
+              f"пик Python {peak / 2**20:.1f} МБ, пик Arrow {arrow_peak / 2**20:.1f} МБ")
+
+
+def _bench_parse(n: int):
+    from datetime import date, timedelta
+
+    # Один и тот же запрос для n разных дат: подстановка литерала против bind-переменной.
+    # Замер по одной сессии пула: разница счётчика 'parse count (hard)' из v$mystat.
+    template = "SELECT COUNT(*) AS CNT FROM dual WHERE TO_DATE(:date_param, 'DD.MM.YYYY') <= SYSDATE"
+    dates = [(date.today() - timedelta(days=i)).strftime("%d.%m.%Y") for i in range(n)]
+    with pooled_connection() as conn:
+        for label, use_binds in (("литерал в тексте", False), ("bind-переменная", True)):
+            before = session_parse_counts(conn)
+            for value in dates:
+                if use_binds:
+                    _execute(conn, template, {"date_param": value})
+                else:
+                    _execute(conn, template.replace(":date_param", f"'{value}'"))
+            after = session_parse_counts(conn)
+            delta = {k: after[k] - before[k] for k in after}
+            print(f"{label:>18}: hard parse {delta['parse count (hard)']}, "
+                  f"всего разборов {delta['parse count (total)']}, выполнений {delta['execute count']}")
+
+
+if __name__ == "__main__":
+    # Замеры на локальном стенде. DSN берётся из ~/.conda/db_ac.json —
+    # достаточно, например, контейнера Oracle Free.
+    #   python -m db.oracle pool 50       — пул против соединения на запрос
+    #   python -m db.oracle fetch 500000  — fetchall против колоночной выборки
+    #   python -m db.oracle parse 200     — hard parse: литералы против bind-переменных
+    import sys
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else "pool"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else {"pool": 50, "parse": 200}.get(mode, 200000)
+    if mode == "fetch":
+        _bench_fetch(count)
+    elif mode == "parse":
+        _bench_parse(count)
+    else:
+        _bench_pool(count)
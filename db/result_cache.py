@@ -0,0 +1,183 @@
+"""
+Дисковый кеш результатов запросов к Oracle (Parquet).
+
+Ключ — хеш текста SQL-шаблона, нормализованные bind-параметры и подключение
+(пользователь и DSN), чтобы кеши разных окружений не смешивались. Вызывающий
+может добавить в ключ версию данных (query(..., cache_version=...)): так
+перезагрузка закрытого дня, замеченная probe, не отдает прежний результат.
+Политика хранения:
+- все даты в параметрах раньше сегодняшней — результат считается неизменным
+  (закрытый отчётный день) и хранится без срока;
+- хотя бы одна дата сегодня или позже, либо запрос помечен как volatile
+  (прогнозный режим) — результат живёт SHORT_TTL секунд;
+- запросы без дат в параметрах не кешируются;
+- пустой результат бессрочно не хранится (данные за день могли быть еще
+  не загружены) — он живёт SHORT_TTL секунд.
+
+Общий объём ограничен MAX_CACHE_BYTES, лишнее вытесняется по LRU
+(время последнего обращения хранится в mtime файла).
+Обход кеша: ENABLE_CACHE = False, переменная окружения SR_CACHE=off
+или query(..., use_cache=False).
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+# Parquet требует pyarrow; без него кеш просто не используется
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+ENABLE_CACHE = True
+CACHE_DIR = Path(os.environ.get("SR_CACHE_DIR", Path.home() / ".conda" / "sr_cache"))
+MAX_CACHE_BYTES = 512 * 2**20   # предельный объём кеша на диске
+SHORT_TTL = 10 * 60             # секунд жизни для сегодняшних и прогнозных дат
+
+_DATE_STR = re.compile(r"^\d{2}\.\d{2}\.\d{4}$")
+_META_KEY = b"sr_cache_expires"
+
+
+def is_enabled() -> bool:
+    """Кеш включён в модуле, не отключён через окружение и доступен pyarrow."""
+    if not ENABLE_CACHE or pq is None:
+        return False
+    return os.environ.get("SR_CACHE", "").lower() not in ("off", "0", "false", "no")
+
+
+def _as_date(value):
+    """Возвращает date для значений-дат (включая строки DD.MM.YYYY), иначе None."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and _DATE_STR.match(value):
+        try:
+            return datetime.strptime(value, "%d.%m.%Y").date()
+        except ValueError:
+            return None
+    return None
+
+
+def _normalize(value):
+    """Приводит bind-параметр к стабильному строковому виду для ключа."""
+    if isinstance(value, datetime):
+        if value.time() == datetime.min.time():
+            return value.date().isoformat()
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def make_key(sql: str, params: dict = None, identity: str = "", version: str = None) -> str:
+    """
+    Ключ кеша: хеш шаблона + отсортированные нормализованные параметры + подключение (user@dsn).
+
+    version — версия данных в БД (например, probe из run_memo.data_version): после
+    перезагрузки данных за закрытую дату ключ меняется и бессрочная запись не используется.
+    """
+    template_hash = hashlib.sha256(sql.strip().encode("utf-8")).hexdigest()
+    normalized = {str(k).lower(): _normalize(v) for k, v in (params or {}).items()}
+    parts = [identity, template_hash, sorted(normalized.items())]
+    if version:
+        parts.append(version)
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ttl_for(params: dict = None, volatile: bool = False):
+    """
+    Определяет срок хранения результата.
+
+    Returns:
+        float | None | False: секунды жизни, None — бессрочно, False — не кешировать
+    """
+    dates = [d for d in (_as_date(v) for v in (params or {}).values()) if d is not None]
+    if not dates:
+        return False
+    if volatile or max(dates) >= date.today():
+        return SHORT_TTL
+    return None
+
+
+def _path(key: str) -> Path:
+    return CACHE_DIR / f"{key}.parquet"
+
+
+def get(key: str):
+    """Возвращает DataFrame из кеша или None (нет записи, истёк срок, файл повреждён)."""
+    path = _path(key)
+    if not path.exists():
+        return None
+    try:
+        table = pq.read_table(path)
+    except Exception:
+        path.unlink(missing_ok=True)
+        return None
+
+    expires = float((table.schema.metadata or {}).get(_META_KEY, b"0"))
+    if expires and expires < time.time():
+        path.unlink(missing_ok=True)
+        return None
+
+    # Отмечаем обращение для LRU
+    os.utime(path, None)
+    return table.to_pandas()
+
+
+def put(key: str, df: pd.DataFrame, ttl) -> bool:
+    """Сохраняет результат; при ошибке сериализации просто не кеширует."""
+    if ttl is None and df.empty:
+        # Пустая выборка по закрытой дате — скорее всего, загрузка еще не завершилась
+        ttl = SHORT_TTL
+    expires = 0 if ttl is None else time.time() + ttl
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_META_KEY] = str(expires).encode()
+        table = table.replace_schema_metadata(metadata)
+        tmp_path = _path(key).with_suffix(".tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, _path(key))
+    except Exception:
+        return False
+    evict()
+    return True
+
+
+def evict(max_bytes: int = None):
+    """Удаляет давно не использованные записи, пока объём кеша больше max_bytes."""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    if not CACHE_DIR.exists():
+        return
+    entries = []
+    for path in CACHE_DIR.glob("*.parquet"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def clear():
+    """Полностью очищает кеш."""
+    evict(max_bytes=0)
@@ -1,11 +1,11 @@
 from db.oracle import query
 from utils.date_utils import get_previous_working_day
 from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
-from utils.date_utils import forecast_date
+from utils.sql_templates import get_sql
+from utils.run_context import current_context
 
 
-def fetch_to_banks_42x():
+def fetch_to_banks_42x(ctx=None):
     """
     Получает данные из Oracle по форме 42X (межбанковские операции).
 
@@ -16,35 +16,40 @@ def fetch_to_banks_42x():
     Returns:
         DataFrame: результат выполнения SQL-запроса с данными по форме 42X
     """
-    # Получаем путь к SQL-шаблону для формы 42X
-    sql_path = get_sql_path("SR_BANKS_42X_template.sql")
-
-    # Читаем содержимое SQL-файла
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+    # Получаем текст SQL-шаблона для формы 42X из реестра
+    sql = get_sql("SR_BANKS_42X_template.sql")
 
     # Определяем дату для запроса в зависимости от режима работы
-    if not forecast_date():
+    # Дата прогноза — из контекста запуска (читается из книги один раз)
+    date_forecast = (ctx or current_context()).forecast_date
+    if not date_forecast:
         # Если прогнозная дата не установлена - берем предыдущий рабочий день
         date_param = get_previous_working_day()
+        volatile = False
     else:
         # Если установлена прогнозная дата - используем её
-        date_param = forecast_date()
+        date_param = date_forecast
+        # Прогнозные данные могут меняться — кешируем ненадолго
+        volatile = True
 
     # Выполняем запрос к Oracle с параметром даты
-    return query(sql, {"date_param": date_param})
+    return query(sql, {"date_param": date_param}, volatile=volatile)
 
 
-def paste_to_excel_banks_42x():
+def paste_to_excel_banks_42x(ctx=None):
     """
     Загружает данные по форме 42X и вставляет их в Excel.
 
     Функция получает данные из базы данных и записывает их
     в указанный лист Excel в именованную таблицу.
+
+    Returns:
+        int: число записанных ячеек (записываются только изменившиеся)
     """
     # Получаем данные из базы
-    df = fetch_to_banks_42x()
+    df = fetch_to_banks_42x(ctx)
 
     # Вставляем данные в Excel на лист "F42X" в таблицу "tActualForecast42X"
-    paste_to_excel("F42X", "tActualForecast42X", df)
+    # (только изменившиеся ячейки — без полного пересчета зависимых формул)
+    return paste_to_excel("F42X", "tActualForecast42X", df, diff=True)
     
\ No newline at end of file
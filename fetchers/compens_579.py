@@ -1,27 +1,22 @@
-import xlwings as xw
 from db.oracle import query
 from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
+from utils.sql_templates import get_sql
+from utils.run_context import current_context
 
-def fetch_to_compens_579():
-    # Получаем текущую книгу
-    wb = xw.Book.caller()
-
-    # Получаем значения из именованных ячеек
-    date_param = wb.names['RDATE'].refers_to_range.value
+def fetch_to_compens_579(ctx=None):
+    # Отчетная дата из контекста запуска (параметры книги читаются один раз)
+    date_param = (ctx or current_context()).rdate
         
     # Приводим даты к строкам (DD.MM.YYYY)
     date_param_str = date_param.strftime("%d.%m.%Y")
 
-    sql_path = get_sql_path("SR_COMPENSATION_579_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+    sql = get_sql("SR_COMPENSATION_579_template.sql")
 
     # Подставляем значения в SQL
     sql = sql.replace(":date_param", f"'{date_param_str}'")
    
     return query(sql)
 
-def paste_to_excel_comp_579():
-    df = fetch_to_compens_579()
+def paste_to_excel_comp_579(ctx=None):
+    df = fetch_to_compens_579(ctx)
     paste_to_excel("menu", "Check_579", df)
\ No newline at end of file
@@ -6,23 +6,20 @@ import os
 import tempfile
 
 # --- Ваши импорты ---
-from db.oracle import query
-from utils.path_utils import get_sql_path
+from db.oracle import query, expand_in_list
+from utils.sql_templates import get_sql
 from utils.date_utils import get_previous_working_day
+from utils.excel_writer import paste_to_excel
 
 sys.stdout.reconfigure(encoding='utf-8')
 
+# Число пар (счет, договор) в одном запросе — оно же число bind-переменных в IN (...)
+CHUNK_SIZE = 25
+
 def clear_and_paste(sheet_name: str, table_name: str, df_to_paste: pd.DataFrame):
-    """Ваша функция для вставки данных (без изменений)."""
+    """Вставляет данные в таблицу через общий paste_to_excel (в том числе в файловом бэкенде)."""
     try:
-        wb = xw.Book.caller()
-        sheet = wb.sheets[sheet_name]
-        table = sheet.tables[table_name]
-        if table.data_body_range is not None:
-            table.data_body_range.clear_contents()
-        if not df_to_paste.empty:
-            sheet.range(table.header_row_range.address).offset(1, 0).value = df_to_paste.values
-            table.resize(table.header_row_range.expand('down'))
+        paste_to_excel(sheet_name, table_name, df_to_paste)
         print(f"Данные ({len(df_to_paste)} строк) успешно вставлены в таблицу '{table_name}'.")
     except Exception as e:
         print(f"!!! Ошибка при вставке в Excel: {e}")
@@ -46,19 +43,20 @@ def get_initial_data_pairs() -> pd.DataFrame:
     print(f"Найдено {len(df_pairs)} уникальных пар (счет, договор) для обработки.")
     return df_pairs
 
-def fetch_chunk_data(id_acc_chunk_str: str, id_ctr_chunk_str: str) -> pd.DataFrame:
-    """Выполняет SQL-запрос для одного "чанка", убирая ';' (без изменений)."""
-    sql_path = get_sql_path("SR_6JX_Reserve_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql_template = f.read().strip().rstrip(';')
+def fetch_chunk_data(id_acc_chunk: list, id_ctr_chunk: list) -> pd.DataFrame:
+    """Выполняет SQL-запрос для одного "чанка" через bind-переменные.
 
-    date_param_str = get_previous_working_day().strftime("%d.%m.%Y")
-    
-    sql = sql_template.replace(":data_id_ctr", id_ctr_chunk_str)
-    sql = sql.replace(":data_id_acc", id_acc_chunk_str)
-    sql = sql.replace(":date_param", f"'{date_param_str}'")
+    Списки ID раскрываются в CHUNK_SIZE bind-переменных (недостающие — NULL),
+    поэтому текст запроса одинаков для всех чанков и разбирается Oracle один раз.
+    """
+    sql = get_sql("SR_6JX_Reserve_template.sql")
+
+    sql, params_ctr = expand_in_list(sql, "data_id_ctr", id_ctr_chunk, CHUNK_SIZE)
+    sql, params_acc = expand_in_list(sql, "data_id_acc", id_acc_chunk, CHUNK_SIZE)
+    params = {**params_ctr, **params_acc}
+    params["date_param"] = get_previous_working_day().strftime("%d.%m.%Y")
     
-    return query(sql)
+    return query(sql, params)
 
 def paste_to_excel_6jx_reserve():
     """Основная функция с обновленной логикой агрегации."""
@@ -68,21 +66,19 @@ def paste_to_excel_6jx_reserve():
         clear_and_paste("F6JX_Details", "F6JX_Reserve", pd.DataFrame())
         return
 
-    chunk_size = 25
+    chunk_size = CHUNK_SIZE
     all_results = []
     
     print(f"Обработка будет вестись частями по {chunk_size} записей...")
     
-    # --- Блок получения данных по "чанкам" (без изменений) ---
+    # --- Блок получения данных по "чанкам" ---
     for i, chunk_df in enumerate([df_pairs[i:i + chunk_size] for i in range(0, len(df_pairs), chunk_size)]):
         print(f"Обработка чанка {i + 1}...")
-        id_acc_chunk = chunk_df['ID рахунку'].astype(str).tolist()
-        id_ctr_chunk = chunk_df['ID договору'].astype(str).tolist()
-        id_acc_chunk_str = ",".join([f"'{x}'" for x in id_acc_chunk])
-        id_ctr_chunk_str = ",".join([f"'{x}'" for x in id_ctr_chunk])
+        id_acc_chunk = [int(x) for x in chunk_df['ID рахунку'].dropna()]
+        id_ctr_chunk = [int(x) for x in chunk_df['ID договору'].dropna()]
         
         try:
-            df_chunk_db = fetch_chunk_data(id_acc_chunk_str, id_ctr_chunk_str)
+            df_chunk_db = fetch_chunk_data(id_acc_chunk, id_ctr_chunk)
             if not df_chunk_db.empty:
                 all_results.append(df_chunk_db)
         except Exception as e:
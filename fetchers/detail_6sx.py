@@ -1,10 +1,12 @@
-import xlwings as xw
 import pandas as pd
 import logging
 import os
 from db.oracle import query
-from utils.path_utils import get_sql_path
-from utils.excel_writer import paste_to_excel_smart
+from utils.sql_templates import get_sql
+from utils.excel_writer import excel_session
+from utils.excel_format import apply_row_styles
+from utils import run_memo
+from utils.run_context import current_context
 
 # Настройка логирования (отключено по умолчанию)
 ENABLE_LOGGING = True  # Установите True для включения логов
@@ -34,22 +36,46 @@ def _setup_logger():
 
 logger = _setup_logger()
 
+# Колонки probe (SR_6SX_VERSION_template.sql), от которых зависит перечень счетов
+ACCOUNT_PROBE_COLUMNS = ['SNAPSHOT_ROWS', 'SNAPSHOT_SUM', 'EXCLUDE_ROWS']
 
-def fetch_6sx_data():
+
+def fetch_6sx_probe(rdate):
+    """
+    Дешевая проверка версии данных SR_BANK на дату rdate (число строк и суммы
+    остатков и документов, число исключенных счетов). Всегда идет в БД, минуя кеш:
+    по результату run_memo замечает перезагрузку данных внутри MEMO_WINDOW.
+
+    Returns:
+        pd.DataFrame: одна строка с колонками SNAPSHOT_ROWS, SNAPSHOT_SUM,
+                      DOCUMENT_ROWS, DOCUMENT_SUM, EXCLUDE_ROWS
+    """
+    sql = get_sql("SR_6SX_VERSION_template.sql")
+    return query(sql, {"date_param": rdate}, use_cache=False)
+
+
+def fetch_6sx_data(refresh=False, ctx=None, probe=None):
     """
     Получает и обрабатывает данные для формирования перечня счетов 6S.
 
+    Результат запоминается на MEMO_WINDOW (utils.run_memo) по отчетной дате
+    и версии данных в БД (fetch_6sx_probe), чтобы pay_6sx и forex_6sx
+    не запрашивали перечень счетов повторно.
+
+    Args:
+        refresh (bool): пересчитать перечень запросами в БД, минуя сохраненный результат и кеш
+        ctx (RunContext): контекст запуска (по умолчанию — current_context())
+        probe (pd.DataFrame): результат fetch_6sx_probe, если он уже получен вызывающим
+
     Returns:
         tuple: (acc_calc, acc_exclude) - два DataFrame для записи в Excel
     """
     logger.info("=== Начало fetch_6sx_data ===")
 
-    # Получаем активную книгу Excel
-    wb = xw.Book.caller()
-
-    # Шаг 1: Получаем отчетную дату из именованной ячейки RDATE на листе menu
+    # Шаг 1: Отчетная дата из именованной ячейки RDATE (через контекст запуска)
+    ctx = ctx or current_context()
     try:
-        rdate = wb.names['RDATE'].refers_to_range.value
+        rdate = ctx['RDATE']
         logger.info(f"Отчетная дата RDATE: {rdate}")
     except KeyError:
         logger.error("Именованная ячейка 'RDATE' не найдена в книге Excel")
@@ -58,23 +84,41 @@ def fetch_6sx_data():
         logger.error(f"Ошибка получения даты RDATE: {e}")
         raise ValueError(f"Ошибка получения даты RDATE: {e}")
 
+    version = None
+    if run_memo.is_enabled():
+        if probe is None:
+            probe = fetch_6sx_probe(rdate)
+        version = run_memo.data_version(probe[ACCOUNT_PROBE_COLUMNS])
+
+    # Версия входит и в ключ кеша результатов: иначе после перезагрузки закрытого дня
+    # пересчет получил бы из кеша прежние строки
+    acc_calc, acc_exclude = run_memo.memoize(
+        "6sx_accounts", rdate,
+        lambda: _build_6sx_lists(rdate, use_cache=not refresh, cache_version=version),
+        version=version, refresh=refresh,
+    )
+
+    logger.info(f"Итог: acc_calc={len(acc_calc)}, acc_exclude={len(acc_exclude)}")
+    logger.info("=== Конец fetch_6sx_data ===")
+
+    return acc_calc, acc_exclude
+
+
+def _build_6sx_lists(rdate, use_cache=True, cache_version=None):
+    """Запрашивает счета на дату rdate и делит их на acc_calc / acc_exclude (шаги 2-5); cache_version — версия данных для ключа кеша."""
     # Шаг 2: Получаем перечень счетов, которые уже исключены из расчета 6SX
-    sql_path_exclude = get_sql_path("SR_6SX_EXCLUDE_template.sql")
-    with open(sql_path_exclude, encoding="utf-8") as f:
-        sql_exclude = f.read().strip().rstrip(";")
+    sql_exclude = get_sql("SR_6SX_EXCLUDE_template.sql")
 
-    df_exclude = query(sql_exclude)
+    df_exclude = query(sql_exclude, use_cache=use_cache, cache_version=cache_version)
     logger.info(f"Получено исключенных счетов из БД: {len(df_exclude)}")
 
     # Формируем множество номеров счетов для быстрой проверки (только по ACCOUNT_NUMBER)
     excluded_accounts = set(df_exclude['ACCOUNT_NUMBER'].tolist())
 
     # Шаг 3: Получаем перечень счетов с остатками на текущий день
-    sql_path_account = get_sql_path("SR_6SX_ACCOUNT_template.sql")
-    with open(sql_path_account, encoding="utf-8") as f:
-        sql_account = f.read().strip().rstrip(";")
+    sql_account = get_sql("SR_6SX_ACCOUNT_template.sql")
 
-    df_account = query(sql_account, {"date_param": rdate})
+    df_account = query(sql_account, {"date_param": rdate}, use_cache=use_cache, cache_version=cache_version)
     logger.info(f"Получено счетов с остатками: {len(df_account)}")
 
     # Добавляем колонку для пометок
@@ -119,12 +163,18 @@ def fetch_6sx_data():
     acc_calc = acc_calc[columns_to_keep]
     acc_exclude = acc_exclude[columns_to_keep + ['mark']]
 
-    logger.info(f"Итог: acc_calc={len(acc_calc)}, acc_exclude={len(acc_exclude)}")
-    logger.info("=== Конец fetch_6sx_data ===")
-
     return acc_calc, acc_exclude
 
 
+# Стили строк t6S_EXCLUDE по колонке mark (цвета в формате BGR)
+EXCLUDE_STYLES = {
+    # Серый шрифт 35% (RGB: 166, 166, 166) и зачеркнутый
+    'pre_excluded': {'Color': 0xA6A6A6, 'Strikethrough': True, 'Bold': False},
+    # Красный шрифт (RGB: 255, 0, 0) и полужирный
+    'exclude': {'Color': 0x0000FF, 'Bold': True, 'Strikethrough': False},
+}
+
+
 def apply_exclude_formatting(sheet_name, table_name, df_exclude):
     """
     Применяет форматирование к таблице t6S_EXCLUDE:
@@ -136,60 +186,36 @@ def apply_exclude_formatting(sheet_name, table_name, df_exclude):
         table_name (str): Имя таблицы Excel
         df_exclude (pd.DataFrame): DataFrame с данными исключений (должен содержать колонку 'mark')
     """
-    wb = xw.Book.caller()
-    sheet = wb.sheets[sheet_name]
-    table = sheet.api.ListObjects(table_name)
-
-    # Получаем начальную строку данных таблицы (после заголовка)
-    start_row = table.HeaderRowRange.Row + 1
-    start_col = table.Range.Column
-
-    # Применяем форматирование построчно
-    for i, (idx, row) in enumerate(df_exclude.iterrows()):
-        # Номер строки в Excel (используем счетчик i, а не индекс из DataFrame)
-        excel_row = start_row + i
-
-        # Получаем диапазон для всей строки таблицы
-        row_range = sheet.range((excel_row, start_col)).resize(1, 5)  # 5 колонок
-
-        if row['mark'] == 'pre_excluded':
-            # Серый шрифт 35% (RGB: 166, 166, 166) и зачеркнутый
-            row_range.api.Font.Color = 0xA6A6A6  # В Excel используется BGR формат
-            row_range.api.Font.Strikethrough = True
-            row_range.api.Font.Bold = False
-
-        elif row['mark'] == 'exclude':
-            # Красный шрифт (RGB: 255, 0, 0) и полужирный
-            row_range.api.Font.Color = 0x0000FF  # Красный в BGR формате
-            row_range.api.Font.Bold = True
-            row_range.api.Font.Strikethrough = False
+    # Строки с одинаковой отметкой форматируются одним объединённым диапазоном
+    apply_row_styles(sheet_name, table_name, df_exclude['mark'], EXCLUDE_STYLES, num_columns=5)  # 5 колонок
 
 
-def paste_to_excel_detail_6sx(sheet_name="6SX_ACC"):
+def paste_to_excel_detail_6sx(sheet_name="6SX_ACC", ctx=None):
     """
     Основная функция для вставки данных 6SX в Excel.
     Вызывается из main.py через xlwings.
 
     Args:
         sheet_name (str): Имя листа Excel (по умолчанию "6SX_ACC")
+        ctx (RunContext): контекст запуска (по умолчанию — current_context())
     """
     logger.info("=== Начало paste_to_excel_detail_6sx ===")
     try:
-        # Получаем обработанные данные
-        acc_calc, acc_exclude = fetch_6sx_data()
+        # Получаем обработанные данные (начало цепочки — всегда свежий запрос)
+        acc_calc, acc_exclude = fetch_6sx_data(refresh=True, ctx=ctx)
 
-        # Записываем acc_calc в таблицу t6S_TO_CALC
-        paste_to_excel_smart(sheet_name, "t6S_TO_CALC", acc_calc)
-        logger.info("t6S_TO_CALC записана успешно")
+        # Обе таблицы и форматирование — в одной сессии записи (без пересчета между шагами)
+        with excel_session() as session:
+            # Записываем acc_calc в таблицу t6S_TO_CALC
+            session.paste(sheet_name, "t6S_TO_CALC", acc_calc)
 
-        # Записываем acc_exclude в таблицу t6S_EXCLUDE (без колонки mark)
-        acc_exclude_output = acc_exclude[['R020', 'ACCOUNT_NUMBER', 'CUR', 'SUM_UAH', 'NAME_ACC']]
-        paste_to_excel_smart(sheet_name, "t6S_EXCLUDE", acc_exclude_output)
-        logger.info("t6S_EXCLUDE записана успешно")
+            # Записываем acc_exclude в таблицу t6S_EXCLUDE (без колонки mark)
+            acc_exclude_output = acc_exclude[['R020', 'ACCOUNT_NUMBER', 'CUR', 'SUM_UAH', 'NAME_ACC']]
+            session.paste(sheet_name, "t6S_EXCLUDE", acc_exclude_output)
 
-        # Применяем форматирование к таблице t6S_EXCLUDE
-        apply_exclude_formatting(sheet_name, "t6S_EXCLUDE", acc_exclude)
-        logger.info("Форматирование t6S_EXCLUDE применено")
+            # Применяем форматирование к таблице t6S_EXCLUDE
+            session.format(apply_exclude_formatting, sheet_name, "t6S_EXCLUDE", acc_exclude)
+        logger.info("t6S_TO_CALC и t6S_EXCLUDE записаны, форматирование t6S_EXCLUDE применено")
     except Exception as e:
         logger.error(f"Ошибка в paste_to_excel_detail_6sx: {e}", exc_info=True)
         raise
@@ -19,36 +19,28 @@ if sys.platform == 'win32':
 import xlwings as xw
 import pandas as pd
 from utils.excel_writer import paste_to_excel
+from utils.run_context import current_context
 
 
-def get_path_from_params() -> str:
+def get_path_from_params(ctx=None) -> str:
     """
     Получает путь к файлу DA7X из таблицы параметров.
 
+    Args:
+        ctx (RunContext): контекст запуска (по умолчанию — current_context());
+                          таблица tParam читается им один раз за запуск
+
     Returns:
         str: Путь к файлу Excel
     """
-    # Получаем активную книгу Excel
-    wb = xw.Book.caller()
-
-    # Получаем лист с параметрами
-    sheet = wb.sheets['sys']
-
-    # Получаем таблицу tParam
-    table = sheet.api.ListObjects("tParam")
-    table_range = table.Range
-
-    # Читаем данные из таблицы в DataFrame
-    df = sheet.range(table_range.Address).options(pd.DataFrame, header=1, index=False).value
-
-    # Находим строку с параметром Path_DA7X
-    path_row = df[df['Параметр'] == 'Path_DA7X']
+    params = (ctx or current_context()).params
 
-    if path_row.empty:
+    # Находим параметр Path_DA7X
+    if 'Path_DA7X' not in params:
         raise ValueError("Параметр 'Path_DA7X' не найден в таблице tParam")
 
     # Получаем значение пути
-    path = path_row['Значение'].iloc[0]
+    path = params['Path_DA7X']
 
     if pd.isna(path) or path == '':
         raise ValueError("Путь для параметра 'Path_DA7X' не указан")
@@ -56,7 +48,7 @@ def get_path_from_params() -> str:
     return path
 
 
-def fetch_data_from_da7x() -> pd.DataFrame:
+def fetch_data_from_da7x(ctx=None) -> pd.DataFrame:
     """
     Читает данные из файла DA7X и фильтрует по счетам, начинающимся с "140" или "142".
 
@@ -64,7 +56,7 @@ def fetch_data_from_da7x() -> pd.DataFrame:
         pd.DataFrame: Отфильтрованные данные
     """
     # Получаем путь к файлу
-    file_path = get_path_from_params()
+    file_path = get_path_from_params(ctx)
 
     print(f"Открытие файла: {file_path}")
 
@@ -111,13 +103,13 @@ def fetch_data_from_da7x() -> pd.DataFrame:
         print("Файл-источник закрыт")
 
 
-def paste_to_excel_a7x_details():
+def paste_to_excel_a7x_details(ctx=None):
     """
     Основная функция: получает данные из файла DA7X и вставляет их в таблицу tA7_Details.
     """
     try:
         # Получаем данные
-        df = fetch_data_from_da7x()
+        df = fetch_data_from_da7x(ctx)
 
         # Выводим информацию о данных для отладки
         print(f"\nИнформация о данных для вставки:")
@@ -1,16 +1,14 @@
-import xlwings as xw
-from db.oracle import query
+from db.oracle import query_columnar
 from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
+from utils.sql_templates import get_sql_variant
+from utils.run_context import current_context
 
-def fetch_to_diff_acc():
-    # Получаем текущую книгу и лист DIFF
-    wb = xw.Book.caller()
-
-    # Получаем значения из именованных ячеек
-    date_param_old = wb.names['date_start'].refers_to_range.value
-    date_param = wb.names['date_end'].refers_to_range.value
-    date_r020 = wb.names['d_r020'].refers_to_range.value
+def fetch_to_diff_acc(ctx=None):
+    # Значения именованных ячеек — из контекста запуска (читаются из книги один раз)
+    ctx = ctx or current_context()
+    date_param_old = ctx['date_start']
+    date_param = ctx['date_end']
+    date_r020 = ctx['d_r020']
     
     # Приводим даты к строкам (DD.MM.YYYY)
     date_param_old_str = date_param_old.strftime("%d.%m.%Y")
@@ -22,21 +20,23 @@ def fetch_to_diff_acc():
         # Если это число (включая float), приводим к int, затем к строке
         date_r020_str = str(int(date_r020))
 
-    sql_path = get_sql_path("SR_DIFF_ACC_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
-
-    # Подставляем значения в SQL9
-    sql = sql.replace(":date_param_old", f"'{date_param_old_str}'")
-    sql = sql.replace(":date_param", f"'{date_param_str}'")
-    sql = sql.replace(":date_r020", f"'{date_r020_str}'")
+    # Условие по остатку — вариант шаблона (фиксированный набор текстов),
+    # значения дат и R020 передаются bind-переменными
     if date_r020_str == '2600':
-        sql = sql.replace(":over_param", "ACS.BASE_AMOUNT > 0")
+        over_param = "ACS.BASE_AMOUNT > 0"
     else:
-        sql = sql.replace(":over_param", "ACS.BASE_AMOUNT <> 0")
+        over_param = "ACS.BASE_AMOUNT <> 0"
+    sql = get_sql_variant("SR_DIFF_ACC_template.sql", over_param=over_param)
+
+    params = {
+        "date_param_old": date_param_old_str,
+        "date_param": date_param_str,
+        "date_r020": date_r020_str,
+    }
 
-    return query(sql)
+    # Широкая выборка — собираем сразу по колонкам
+    return query_columnar(sql, params)
 
-def paste_to_excel_diff_acc():
-    df = fetch_to_diff_acc()
+def paste_to_excel_diff_acc(ctx=None):
+    df = fetch_to_diff_acc(ctx)
     paste_to_excel("DIFF", "tDiffAcc", df)
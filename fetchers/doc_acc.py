@@ -1,30 +1,29 @@
-import xlwings as xw
-from db.oracle import query
-from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
+from db.oracle import query, query_iter
+from utils.excel_writer import paste_to_excel_chunks
+from utils.sql_templates import get_sql
+from utils.run_context import current_context
 
-def fetch_to_doc_acc():
-    # Получаем текущую книгу и лист DIFF
-    wb = xw.Book.caller()
+# Размер части при потоковой выгрузке документов
+CHUNK_ROWS = 20000
 
-    # Получаем значения из именованных ячеек
-    date_param = wb.names['date_end'].refers_to_range.value
-    date_acc = wb.names['num_acc'].refers_to_range.value
+def _doc_acc_params(ctx=None):
+    # Значения именованных ячеек — из контекста запуска (читаются из книги один раз)
+    ctx = ctx or current_context()
+    date_param = ctx['date_end']
+    date_acc = ctx['num_acc']
     
-    # Приводим даты к строкам (DD.MM.YYYY)
-    date_param_str = date_param.strftime("%d.%m.%Y")
-    date_acc_str = str(int(date_acc))
+    # Приводим даты к строкам (DD.MM.YYYY) — передаются bind-переменными
+    return {
+        "date_param": date_param.strftime("%d.%m.%Y"),
+        "date_acc": str(int(date_acc)),
+    }
 
-    sql_path = get_sql_path("SR_DOC_ACC_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+def fetch_to_doc_acc(ctx=None):
+    return query(get_sql("SR_DOC_ACC_template.sql"), _doc_acc_params(ctx))
 
-    # Подставляем значения в SQL9
-    sql = sql.replace(":date_param", f"'{date_param_str}'")
-    sql = sql.replace(":date_acc", f"'{date_acc_str}'")
-    
-    return query(sql)
+def iter_doc_acc(chunk_rows=CHUNK_ROWS, ctx=None):
+    # Документы по счету могут исчисляться сотнями тысяч — отдаём частями
+    return query_iter(get_sql("SR_DOC_ACC_template.sql"), _doc_acc_params(ctx), chunk_rows=chunk_rows)
 
-def paste_to_excel_doc_acc():
-    df = fetch_to_doc_acc()
-    paste_to_excel("DIFF", "tDetailAcc", df)
+def paste_to_excel_doc_acc(ctx=None):
+    paste_to_excel_chunks("DIFF", "tDetailAcc", iter_doc_acc(ctx=ctx), progress=True)
@@ -2,34 +2,33 @@ from db.oracle import query
 from utils.date_utils import get_previous_working_day
 from pandas.tseries.offsets import BDay
 from utils.excel_writer import paste_to_excel_smart
-from utils.path_utils import get_sql_path
-from utils.date_utils import forecast_date
+from utils.sql_templates import get_sql
+from utils.run_context import current_context
 
-def fetch_to_diff_spot():
+def fetch_to_diff_spot(ctx=None):
 
-    sql_path = get_sql_path("SR_DIFF_DZ_SPOT_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+    sql = get_sql("SR_DIFF_DZ_SPOT_template.sql")
 
     # Определяем даты параметров в зависимости от режима прогноза
-    if not forecast_date():
+    # Дата прогноза — из контекста запуска (читается из книги один раз)
+    date_forecast = (ctx or current_context()).forecast_date
+    if not date_forecast:
         date_param_old = get_previous_working_day() - BDay(1)
         date_param = get_previous_working_day()
+        volatile = False
     else:
-        date_param_old = forecast_date() - BDay(1)
-        date_param = forecast_date()
+        date_param_old = date_forecast - BDay(1)
+        date_param = date_forecast
+        # Прогнозные данные могут меняться — кешируем ненадолго
+        volatile = True
 
-    # Форматируем даты как строки в формате 'DD.MM.YYYY'
-    date_param_old_str = date_param_old.strftime("%d.%m.%Y")
-    date_param_str = date_param.strftime("%d.%m.%Y")
+    # Даты передаём bind-переменными в формате 'DD.MM.YYYY' — текст запроса не меняется
+    params = {
+        "date_param_old": date_param_old.strftime("%d.%m.%Y"),
+        "date_param": date_param.strftime("%d.%m.%Y"),
+    }
+    return query(sql, params, volatile=volatile)
 
-    # Подставляем значения прямо в текст SQL-запроса
-    sql = sql.replace(":date_param_old", f"'{date_param_old_str}'")
-    sql = sql.replace(":date_param", f"'{date_param_str}'")
-
-    # Теперь параметров не передаём — всё уже подставлено
-    return query(sql)
-
-def paste_to_excel_diff_spot():
-    df = fetch_to_diff_spot()
+def paste_to_excel_diff_spot(ctx=None):
+    df = fetch_to_diff_spot(ctx)
     paste_to_excel_smart("Нрк_TEST", "tDZ_Spot_Diff", df)
@@ -1,10 +1,10 @@
 import logging
 import os
 import pandas as pd
-from db.oracle import query
-from utils.path_utils import get_sql_path
+from db.oracle import query_in_batches
+from utils.sql_templates import get_sql
 from utils.excel_writer import paste_to_excel_smart
-from utils.parser_forex import parse_forex_numbers
+from utils.parser_forex import extract_forex_numbers
 from fetchers.pay_6sx import fetch_pay_6sx_data
 
 # Логирование (установите True для включения)
@@ -31,35 +31,39 @@ def _setup_logger():
 logger = _setup_logger()
 
 
-def fetch_forex_6sx_data() -> pd.DataFrame:
+def fetch_forex_6sx_data(with_documents=False, ctx=None) -> pd.DataFrame:
     """
     Формирует перечень forex-сделок по документам 6S.
 
     Алгоритм:
     1. Получает данные pay_6sx (поле DESCRIPTION).
-    2. Парсит DESCRIPTION через parse_forex_numbers — извлекает номера сделок.
-    3. Выполняет SQL SR_6SX_FOREX_template.sql с динамическим IN-clause.
+    2. Извлекает номера сделок сразу из всей колонки DESCRIPTION (extract_forex_numbers).
+    3. Выполняет SQL SR_6SX_FOREX_template.sql пакетами номеров (query_in_batches).
+
+    Args:
+        with_documents (bool): вернуть сделки, присоединенные к исходным документам
+                               pay_6sx (по строке на пару документ — сделка)
+        ctx (RunContext): контекст запуска (по умолчанию — current_context())
 
     Returns:
-        pd.DataFrame: колонки DOC_NO, DESCRIPTION, S135
+        pd.DataFrame: колонки DOC_NO, DESCRIPTION, S135; при with_documents=True —
+                      колонки документа pay_6sx, DEAL_NO, FX_DESCRIPTION, S135
     """
     logger.info("=== Начало fetch_forex_6sx_data ===")
 
     # Получаем документы 6S с полем DESCRIPTION
-    df_pay = fetch_pay_6sx_data()
+    df_pay = fetch_pay_6sx_data(ctx=ctx)
     logger.info(f"Получено строк из pay_6sx: {len(df_pay)}")
 
     if df_pay.empty or 'DESCRIPTION' not in df_pay.columns:
         logger.info("Нет данных DESCRIPTION, возвращаем пустой DataFrame")
         return pd.DataFrame(columns=['DOC_NO', 'DESCRIPTION', 'S135'])
 
-    # Парсим все описания и собираем уникальные номера сделок
-    all_numbers = []
-    for desc in df_pay['DESCRIPTION'].dropna():
-        all_numbers.extend(parse_forex_numbers(str(desc)))
+    # Связи документ -> номер сделки по всей колонке описаний
+    links = extract_forex_numbers(df_pay['DESCRIPTION'])
 
     # Убираем дубли, сохраняем порядок
-    unique_numbers = list(dict.fromkeys(all_numbers))
+    unique_numbers = links['DEAL_NO'].drop_duplicates().tolist()
     logger.info(f"Найдено уникальных номеров сделок: {len(unique_numbers)}")
 
     if not unique_numbers:
@@ -67,29 +71,35 @@ def fetch_forex_6sx_data() -> pd.DataFrame:
         return pd.DataFrame(columns=['DOC_NO', 'DESCRIPTION', 'S135'])
 
     # Читаем SQL-шаблон
-    sql_path = get_sql_path("SR_6SX_FOREX_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
-
-    # Строим динамический IN-clause: заменяем :data_number на :v0, :v1, ...
-    placeholders = ", ".join(f":v{i}" for i in range(len(unique_numbers)))
-    sql = sql.replace(":data_number", placeholders)
-    params = {f"v{i}": num for i, num in enumerate(unique_numbers)}
+    sql = get_sql("SR_6SX_FOREX_template.sql")
 
-    df_result = query(sql, params)
+    # Номера передаются пакетами фиксированного размера (стабильный текст запроса,
+    # без ограничения Oracle в 1000 элементов IN), пакеты выполняются параллельно
+    df_result = query_in_batches(sql, "data_number", unique_numbers)
+    # Внутри пакета строки упорядочены по DOC_NO — восстанавливаем общий порядок
+    df_result = df_result.sort_values('DOC_NO', kind='mergesort').reset_index(drop=True)
     logger.info(f"Итого forex-сделок: {len(df_result)}")
+
+    if with_documents:
+        # Присоединяем сделки к документам, в описании которых найден их номер
+        docs = df_pay.drop(columns=['_ROLE'], errors='ignore')
+        deals = df_result.rename(columns={'DOC_NO': 'DEAL_NO', 'DESCRIPTION': 'FX_DESCRIPTION'})
+        df_result = (links.join(docs, on='ROW')
+                          .merge(deals, on='DEAL_NO', how='inner')
+                          .drop(columns=['ROW']))
+        logger.info(f"Связей документ — сделка: {len(df_result)}")
     logger.info("=== Конец fetch_forex_6sx_data ===")
     return df_result
 
 
-def paste_to_excel_forex_6sx(sheet_name="6SX_ACC"):
+def paste_to_excel_forex_6sx(sheet_name="6SX_ACC", ctx=None):
     """
     Записывает перечень forex-сделок в таблицу t6S_FOREX на листе 6SX_ACC.
     Вызывается из main.py через xlwings.
     """
     logger.info("=== Начало paste_to_excel_forex_6sx ===")
     try:
-        df = fetch_forex_6sx_data()
+        df = fetch_forex_6sx_data(ctx=ctx)
         paste_to_excel_smart(sheet_name, "t6S_FOREX", df)
         logger.info("t6S_FOREX записана успешно")
     except Exception as e:
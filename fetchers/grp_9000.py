@@ -1,25 +1,29 @@
 from db.oracle import query
 from utils.date_utils import get_previous_working_day
 from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
-from utils.date_utils import forecast_date
+from utils.sql_templates import get_sql
+from utils.run_context import current_context
 
-def fetch_to_9000grp():
-    # Путь к текущему файлу
-    sql_path = get_sql_path("SR_CHECK_9000_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+def fetch_to_9000grp(ctx=None):
+    # Текст SQL-шаблона из реестра
+    sql = get_sql("SR_CHECK_9000_template.sql")
     
     # Определяем даты параметров в зависимости от режима прогноза
-    if not forecast_date():
+    # Дата прогноза — из контекста запуска (читается из книги один раз)
+    date_forecast = (ctx or current_context()).forecast_date
+    if not date_forecast:
         date_param = get_previous_working_day()
+        volatile = False
         ccf_param = 1
     else:
-        date_param = forecast_date()
+        date_param = date_forecast
+        # Прогнозные данные могут меняться — кешируем ненадолго
+        volatile = True
         ccf_param = 0.2
     
-    return query(sql, {"date_param": date_param, "ccf_param": ccf_param})
+    return query(sql, {"date_param": date_param, "ccf_param": ccf_param}, volatile=volatile)
 
-def paste_to_excel_9000grp():
-    df = fetch_to_9000grp()
-    paste_to_excel("Нрк_TEST", "tSUM9000", df)
+def paste_to_excel_9000grp(ctx=None):
+    df = fetch_to_9000grp(ctx)
+    # Между обновлениями данные меняются мало — пишем только изменившиеся ячейки
+    return paste_to_excel("Нрк_TEST", "tSUM9000", df, diff=True)
@@ -4,7 +4,7 @@ import pandas as pd
 
 from db.oracle import query
 from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
+from utils.sql_templates import get_sql
 from utils.date_utils import get_previous_working_day
 
 # --- Логирование (отключить при необходимости установив False) ---
@@ -78,9 +78,7 @@ def fetch_interest_7sx():
     logger.info(f"Отчётная дата: {rdate}")
 
     # Загружаем SQL-шаблон
-    sql_path = get_sql_path("SR_7S_INTEREST_RISK_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+    sql = get_sql("SR_7S_INTEREST_RISK_template.sql")
 
     # Выполняем запрос с подстановкой даты
     df = query(sql, {"date_param": rdate})
@@ -1,11 +1,13 @@
-import xlwings as xw
 import pandas as pd
 import logging
 import os
-from db.oracle import query
-from utils.path_utils import get_sql_path
-from utils.excel_writer import paste_to_excel_smart
-from fetchers.detail_6sx import fetch_6sx_data
+from db.oracle import query, query_in_batches
+from utils.sql_templates import get_sql
+from utils.excel_writer import excel_session
+from utils.excel_format import apply_row_styles
+from fetchers.detail_6sx import fetch_6sx_data, fetch_6sx_probe
+from utils import run_memo
+from utils.run_context import current_context
 
 # Логирование (отключено по умолчанию, установите True для включения)
 ENABLE_LOGGING = True
@@ -36,14 +38,88 @@ def _setup_logger():
 logger = _setup_logger()
 
 
-def fetch_pay_6sx_data():
+# Пакетный режим: все счета одним запросом на пакет вместо запроса на каждый счет
+BATCH_MODE = True
+# Число пар (счет, валюта) в одном пакетном запросе
+BATCH_SIZE = 200
+
+PAY_COLUMNS = ['R020', 'ACCOUNT_DT', 'CUR', 'ACCOUNT_CT', 'DESCRIPTION', 'SUM_UAH', '_ROLE']
+# Колонки probe (SR_6SX_VERSION_template.sql), от которых зависят документы
+PAY_PROBE_COLUMNS = ['DOCUMENT_ROWS', 'DOCUMENT_SUM']
+
+
+def _fetch_documents_per_account(acc_calc, rdate, use_cache=True, cache_version=None):
+    """Прежний режим: отдельный запрос SR_6SX_PAY_template.sql на каждый счет и валюту."""
+    sql = get_sql("SR_6SX_PAY_template.sql")
+
+    results = []
+    for _, row in acc_calc.iterrows():
+        params = {
+            "date_param": rdate,
+            "data_acc": row['ACCOUNT_NUMBER'],  # строка — SUBSTR корректно даст R020
+            "data_cur": row['CUR'],
+        }
+        df = query(sql, params, use_cache=use_cache, cache_version=cache_version)
+        if not df.empty:
+            df['_DATA_ACC'] = row['ACCOUNT_NUMBER']
+            results.append(df)
+        logger.info(f"Счет {row['ACCOUNT_NUMBER']} ({row['CUR']}): найдено документов {len(df)}")
+    return results
+
+
+def _fetch_documents_batched(acc_calc, rdate, use_cache=True, cache_version=None):
+    """
+    Пакетный режим: пары (счет, валюта) передаются пачками по BATCH_SIZE
+    в SR_6SX_PAY_BATCH_template.sql (query_in_batches, пачки выполняются параллельно),
+    каждая строка результата несет свой счет (DATA_ACC).
+
+    Порядок строк воспроизводит прежний цикл: сначала по порядку счетов в acc_calc,
+    внутри счета — по ACCOUNT_DT, ACCOUNT_CT (как в ORDER BY шаблона).
+    """
+    template = get_sql("SR_6SX_PAY_BATCH_template.sql")
+    # Уникальные пары: повторы в acc_calc восстанавливаются ниже через merge
+    pairs = list(dict.fromkeys(zip(acc_calc['ACCOUNT_NUMBER'], acc_calc['CUR'])))
+
+    df_all = query_in_batches(template, "data_acc_cur", pairs, {"date_param": rdate}, batch_size=BATCH_SIZE,
+                              use_cache=use_cache, cache_version=cache_version)
+    logger.info(f"Пар (счет, валюта): {len(pairs)}, пакетов по {BATCH_SIZE}: "
+                f"{-(-len(pairs) // BATCH_SIZE)}, найдено документов {len(df_all)}")
+    if df_all.empty:
+        return []
+
+    # Номер счета в acc_calc задает порядок блоков, как в прежнем цикле
+    # (merge также повторяет документы, если пара встречается в acc_calc дважды)
+    order = pd.DataFrame({
+        '_ACC_KEY': acc_calc['ACCOUNT_NUMBER'].astype(str).values,
+        '_CUR_KEY': acc_calc['CUR'].astype(str).values,
+        '_DATA_ACC': acc_calc['ACCOUNT_NUMBER'].values,
+        '_ORDER': range(len(acc_calc)),
+    })
+    df_all['_ACC_KEY'] = df_all.pop('DATA_ACC').astype(str)
+    df_all['_CUR_KEY'] = df_all['CUR'].astype(str)
+    df_all = df_all.merge(order, on=['_ACC_KEY', '_CUR_KEY'], how='inner')
+    df_all = df_all.sort_values(['_ORDER', 'ACCOUNT_DT', 'ACCOUNT_CT'], kind='mergesort')
+    df_all = df_all.drop(columns=['_ORDER', '_ACC_KEY', '_CUR_KEY']).reset_index(drop=True)
+    return [df_all]
+
+
+def fetch_pay_6sx_data(refresh=False, ctx=None):
     """
     Получает перечень документов, формирующих остатки для счетов 6S.
 
+    Результат запоминается (utils.run_memo) по отчетной дате, версии перечня
+    счетов и версии документов в БД (fetch_6sx_probe): forex_6sx в пределах
+    MEMO_WINDOW переиспользует его, выполняя только probe.
+
     Алгоритм:
-    1. Читает отчетную дату RDATE из Excel.
+    1. Берет отчетную дату RDATE из контекста запуска.
     2. Получает перечень счетов к расчету (acc_calc) через fetch_6sx_data().
-    3. Для каждого счета выполняет SQL-запрос и собирает результаты.
+    3. Получает документы по всем счетам (пакетами при BATCH_MODE, иначе — по одному счету).
+    4. Векторно определяет роль счета (DT/CT) и меняет знак суммы для CT.
+
+    Args:
+        refresh (bool): запросить документы в БД заново, минуя сохраненный результат и кеш
+        ctx (RunContext): контекст запуска (по умолчанию — current_context())
 
     Returns:
         pd.DataFrame: перечень документов с колонками R020, ACCOUNT_DT, CUR,
@@ -51,42 +127,50 @@ def fetch_pay_6sx_data():
     """
     logger.info("=== Начало fetch_pay_6sx_data ===")
 
-    # Получаем отчетную дату из именованной ячейки RDATE на листе menu
-    wb = xw.Book.caller()
+    # Отчетная дата из именованной ячейки RDATE (через контекст запуска)
+    ctx = ctx or current_context()
     try:
-        rdate = wb.names['RDATE'].refers_to_range.value
+        rdate = ctx['RDATE']
         logger.info(f"Отчетная дата RDATE: {rdate}")
     except KeyError:
         logger.error("Именованная ячейка 'RDATE' не найдена в книге Excel")
         raise ValueError("Именованная ячейка 'RDATE' не найдена в книге Excel")
 
+    # Версия данных в БД — один дешевый запрос на перечень счетов и документы
+    probe = fetch_6sx_probe(rdate) if run_memo.is_enabled() else None
+
     # Получаем перечень счетов к расчету (без исключенных)
-    acc_calc, _ = fetch_6sx_data()
+    acc_calc, _ = fetch_6sx_data(ctx=ctx, probe=probe)
     logger.info(f"Получено счетов для обработки: {len(acc_calc)}")
 
     # Если счетов нет — возвращаем пустой DataFrame
     if acc_calc.empty:
         logger.info("acc_calc пуст, возвращаем пустой DataFrame")
-        return pd.DataFrame(columns=['R020', 'ACCOUNT_DT', 'CUR', 'ACCOUNT_CT', 'DESCRIPTION', 'SUM_UAH', '_ROLE'])
+        return pd.DataFrame(columns=PAY_COLUMNS)
+
+    # Версия — перечень счетов и документы в БД: при их изменении документы запрашиваются заново.
+    # Она же входит в ключ кеша результатов, иначе после перезагрузки закрытого дня
+    # пересчет получил бы из кеша прежние строки
+    version = None
+    if probe is not None:
+        version = run_memo.data_version(acc_calc, probe[PAY_PROBE_COLUMNS])
+    df_all = run_memo.memoize(
+        "6sx_pay", rdate,
+        lambda: _build_pay_documents(acc_calc, rdate, use_cache=not refresh, cache_version=version),
+        version=version, refresh=refresh,
+    )
 
-    # Читаем SQL-шаблон запроса документов
-    sql_path = get_sql_path("SR_6SX_PAY_template.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+    logger.info(f"Итого документов: {len(df_all)}")
+    logger.info("=== Конец fetch_pay_6sx_data ===")
+    return df_all
 
-    # Выполняем запрос для каждого счета и собираем результаты
-    results = []
-    for _, row in acc_calc.iterrows():
-        params = {
-            "date_param": rdate,
-            "data_acc": row['ACCOUNT_NUMBER'],  # строка — SUBSTR корректно даст R020
-            "data_cur": row['CUR'],
-        }
-        df = query(sql, params)
-        if not df.empty:
-            df['_DATA_ACC'] = row['ACCOUNT_NUMBER']
-            results.append(df)
-        logger.info(f"Счет {row['ACCOUNT_NUMBER']} ({row['CUR']}): найдено документов {len(df)}")
+
+def _build_pay_documents(acc_calc, rdate, use_cache=True, cache_version=None):
+    """Запрашивает документы по счетам acc_calc и расставляет роли DT/CT (cache_version — версия данных для ключа кеша)."""
+    if BATCH_MODE:
+        results = _fetch_documents_batched(acc_calc, rdate, use_cache, cache_version)
+    else:
+        results = _fetch_documents_per_account(acc_calc, rdate, use_cache, cache_version)
 
     # Объединяем все результаты в один DataFrame
     if results:
@@ -101,61 +185,49 @@ def fetch_pay_6sx_data():
         df_all.loc[mask_ct, 'SUM_UAH'] *= -1
         df_all = df_all.drop(columns=['_DATA_ACC'])
     else:
-        df_all = pd.DataFrame(columns=['R020', 'ACCOUNT_DT', 'CUR', 'ACCOUNT_CT', 'DESCRIPTION', 'SUM_UAH', '_ROLE'])
-
-    logger.info(f"Итого документов: {len(df_all)}")
-    logger.info("=== Конец fetch_pay_6sx_data ===")
+        df_all = pd.DataFrame(columns=PAY_COLUMNS)
     return df_all
 
 
+# Цвета в формате BGR (Excel)
+COLOR_GREEN = 0x006100   # зеленый
+COLOR_RED   = 0x0000FF   # красный
+COLOR_AUTO  = -4105      # xlColorIndexAutomatic
+ROLE_STYLES = {'DT': {'Color': COLOR_GREEN}, 'CT': {'Color': COLOR_RED}}
+
+
 def _apply_role_formatting(sheet_name, table_name, roles):
     """Применяет цвет шрифта к строкам таблицы в зависимости от роли счета.
 
     DT (дебет, ACCOUNT_DT = data_acc) — зеленый шрифт.
     CT (кредит, ACCOUNT_CT = data_acc) — красный шрифт.
     """
-    # Цвета в формате BGR (Excel)
-    COLOR_GREEN = 0x006100   # зеленый
-    COLOR_RED   = 0x0000FF   # красный
-    COLOR_AUTO  = -4105      # xlColorIndexAutomatic
-
-    wb = xw.Book.caller()
-    sheet = wb.sheets[sheet_name]
-    table = sheet.api.ListObjects(table_name)
-    start_row = table.HeaderRowRange.Row + 1
-    start_col = table.Range.Column
-    num_columns = table.ListColumns.Count
-
-    for i, role in enumerate(roles):
-        row_range = sheet.range((start_row + i, start_col)).resize(1, num_columns)
-        if role == 'DT':
-            row_range.api.Font.Color = COLOR_GREEN
-        elif role == 'CT':
-            row_range.api.Font.Color = COLOR_RED
-        else:
-            row_range.api.Font.ColorIndex = COLOR_AUTO
-
-
-def paste_to_excel_pay_6sx(sheet_name="6SX_ACC"):
+    # Остальные строки — автоматический цвет; DT и CT — блоками по роли
+    apply_row_styles(sheet_name, table_name, roles, ROLE_STYLES, default={'ColorIndex': COLOR_AUTO})
+
+
+def paste_to_excel_pay_6sx(sheet_name="6SX_ACC", ctx=None):
     """
     Записывает перечень документов 6SX в таблицу t6S_PAY на листе 6SX_ACC.
     Вызывается из main.py через xlwings.
 
     Args:
         sheet_name (str): Имя листа Excel (по умолчанию "6SX_ACC")
+        ctx (RunContext): контекст запуска (по умолчанию — current_context())
     """
     logger.info("=== Начало paste_to_excel_pay_6sx ===")
     try:
-        df = fetch_pay_6sx_data()
+        # Перечень счетов берется из результата detail_6sx, документы запрашиваются заново
+        df = fetch_pay_6sx_data(refresh=True, ctx=ctx)
         # Отделяем колонку роли до записи в Excel
         roles = df['_ROLE'].tolist() if '_ROLE' in df.columns else []
         df_excel = df.drop(columns=['_ROLE'], errors='ignore')
-        paste_to_excel_smart(sheet_name, "t6S_PAY", df_excel)
+        with excel_session() as session:
+            session.paste(sheet_name, "t6S_PAY", df_excel)
+            # Применяем форматирование шрифта по роли счета
+            if roles:
+                session.format(_apply_role_formatting, sheet_name, "t6S_PAY", roles)
         logger.info("t6S_PAY записана успешно")
-        # Применяем форматирование шрифта по роли счета
-        if roles:
-            _apply_role_formatting(sheet_name, "t6S_PAY", roles)
-            logger.info("Форматирование шрифта применено")
     except Exception as e:
         logger.error(f"Ошибка в paste_to_excel_pay_6sx: {e}", exc_info=True)
         raise
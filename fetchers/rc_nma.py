@@ -1,13 +1,11 @@
 from db.oracle import query
 from utils.date_utils import get_previous_working_day
 from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
+from utils.sql_templates import get_sql
 
 def fetch_to_rc_nma():
-    # Путь к текущему файлу
-    sql_path = get_sql_path("SR_RC_NMA.sql")
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+    # Текст SQL-шаблона из реестра
+    sql = get_sql("SR_RC_NMA.sql")
     
     # Определяем даты параметров в зависимости от режима прогноза
     date_param = get_previous_working_day()    
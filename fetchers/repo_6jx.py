@@ -1,13 +1,10 @@
 from db.oracle import query
 from utils.excel_writer import paste_to_excel
-from utils.path_utils import get_sql_path
+from utils.sql_templates import get_sql
 
 def fetch_to_repo():
-    # Получаем путь к SQL-файлу шаблона
-    sql_path = get_sql_path("SR_6JX_REPO_template.sql")
-    # Открываем и читаем SQL-запрос из файла
-    with open(sql_path, encoding="utf-8") as f:
-        sql = f.read().strip().rstrip(";")
+    # Получаем текст SQL-шаблона из реестра
+    sql = get_sql("SR_6JX_REPO_template.sql")
     # Выполняем запрос к базе данных и возвращаем результат
     return query(sql)
 
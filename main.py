@@ -3,44 +3,87 @@
 
 Каждая функция run_*() вызывается из VBA:
     RunPython "import main; main.run_<name>()"
-"""
 
-# == Баланс / регуляторные отчёты =============================================
-from fetchers.secur_doc import paste_to_excel_secur_doc
-from fetchers.grp_9000 import paste_to_excel_9000grp
-from fetchers.balance_nrk import paste_to_excel_balance_nrk
-from fetchers.diff_acc import paste_to_excel_diff_acc
-from fetchers.doc_acc import paste_to_excel_doc_acc
-from fetchers.compens_579 import paste_to_excel_comp_579
+Модули fetchers/charts/db импортируются при первом вызове соответствующей
+run_*() (реестр REGISTRY), а не при "import main": кнопка, которой нужен
+один fetcher, не загружает matplotlib, scipy и остальные модули проекта.
 
-# == Позиции и сделки (6JX / 42X) =============================================
-from fetchers.dz_spot import paste_to_excel_dz_spot
-from fetchers.dz_spot_diff import paste_to_excel_diff_spot
-from fetchers.fz_ccf_6jx import paste_to_excel_fz_ccf_6jx
-from fetchers.detail_6jx import paste_to_excel_6jx_reserve
-from fetchers.repo_6jx import paste_to_excel_repo
-from fetchers.banks_42x import paste_to_excel_banks_42x
-
-# == Регуляторный капитал =====================================================
-from fetchers.rc_component import paste_to_excel_rc_comp
-from fetchers.rc_nma import paste_to_excel_rc_nma
-
-# == Детализация счетов (6SX / 7SX / A7X) =====================================
-from fetchers.detail_a7x import paste_to_excel_a7x_details
-from fetchers.detail_6sx import paste_to_excel_detail_6sx
-from fetchers.pay_6sx import paste_to_excel_pay_6sx
-from fetchers.forex_6sx import paste_to_excel_forex_6sx
-from fetchers.interest_7sx import paste_to_excel_interest_7sx
-
-# == Графики ==================================================================
-from charts.chart_es import paste_plot_var_es
-from charts.chart_as_v2 import insert_image_to_excel
-from charts.chart_es_trade import paste_plot_var_es_trade
-from charts.chart_as_trade import insert_chart_as_trade
-from charts.chart_7s_mrrr import create_market_risk_chart
+При SR_WORKER=1 вызовы выполняются в постоянном рабочем процессе (worker.py).
+"""
+import importlib
+import os
+import subprocess
+import sys
+
+# Имя run_*() -> (модуль, функция); модуль импортируется при первом вызове
+REGISTRY = {
+    # == Баланс / регуляторные отчёты =========================================
+    "run_secur_doc": ("fetchers.secur_doc", "paste_to_excel_secur_doc"),
+    "run_grp_9000": ("fetchers.grp_9000", "paste_to_excel_9000grp"),
+    "run_balance_nrk": ("fetchers.balance_nrk", "paste_to_excel_balance_nrk"),
+    "run_diff_acc": ("fetchers.diff_acc", "paste_to_excel_diff_acc"),
+    "run_doc_acc": ("fetchers.doc_acc", "paste_to_excel_doc_acc"),
+    "run_compens_579": ("fetchers.compens_579", "paste_to_excel_comp_579"),
+
+    # == Позиции и сделки (6JX / 42X) =========================================
+    "run_dz_spot": ("fetchers.dz_spot", "paste_to_excel_dz_spot"),
+    "run_diff_spot": ("fetchers.dz_spot_diff", "paste_to_excel_diff_spot"),
+    "run_fz_ccf_6jx": ("fetchers.fz_ccf_6jx", "paste_to_excel_fz_ccf_6jx"),
+    "run_6jx_reserve": ("fetchers.detail_6jx", "paste_to_excel_6jx_reserve"),
+    "run_repo_6jx": ("fetchers.repo_6jx", "paste_to_excel_repo"),
+    "run_42x_banks": ("fetchers.banks_42x", "paste_to_excel_banks_42x"),
+
+    # == Регуляторный капитал =================================================
+    "run_rc_comp": ("fetchers.rc_component", "paste_to_excel_rc_comp"),
+    "run_rc_nma": ("fetchers.rc_nma", "paste_to_excel_rc_nma"),
+
+    # == Детализация счетов (6SX / 7SX / A7X) =================================
+    "run_a7x_details": ("fetchers.detail_a7x", "paste_to_excel_a7x_details"),
+    "run_detail_6sx": ("fetchers.detail_6sx", "paste_to_excel_detail_6sx"),
+    "run_pay_6sx": ("fetchers.pay_6sx", "paste_to_excel_pay_6sx"),
+    "run_forex_6sx": ("fetchers.forex_6sx", "paste_to_excel_forex_6sx"),
+    "run_interest_7sx": ("fetchers.interest_7sx", "paste_to_excel_interest_7sx"),
+    "run_reset_6sx": ("utils.run_memo", "invalidate"),
+
+    # == Графики ==============================================================
+    "run_plot_var_es": ("charts.chart_es", "paste_plot_var_es"),
+    "run_plot_as": ("charts.chart_as_v2", "insert_image_to_excel"),
+    "run_plot_es_trade": ("charts.chart_es_trade", "paste_plot_var_es_trade"),
+    "run_plot_as_trade": ("charts.chart_as_trade", "insert_chart_as_trade"),
+    "run_chart_7s": ("charts.chart_7s_mrrr", "create_market_risk_chart"),
+
+    # == База данных ==========================================================
+    "run_single_6kx_file": ("db.entry_db_6kx", "process_single_6kx_file"),
+}
+
+_resolved = {}
+
+
+def resolve(name: str):
+    """Функция, которую вызывает run-имя name; модуль импортируется при первом обращении."""
+    target = _resolved.get(name)
+    if target is None:
+        module_name, attr = REGISTRY[name]
+        target = getattr(importlib.import_module(module_name), attr)
+        _resolved[name] = target
+    return target
+
+
+def invoke(name: str, *args, **kwargs):
+    """Вызывает функцию для run-имени name в одном контексте запуска (utils.run_context) на весь вызов."""
+    from utils.run_context import run_context
+    with run_context():
+        return resolve(name)(*args, **kwargs)
+
+
+def _dispatch(name: str, *args, **kwargs):
+    """Вызывает функцию для run-имени name: в рабочем процессе (SR_WORKER=1, см. worker.py) или здесь."""
+    if not args and not kwargs and os.environ.get("SR_WORKER"):
+        import worker
+        if worker.is_enabled() and worker.run_remote(name):
+            return None
+    return invoke(name, *args, **kwargs)
 
-# == База данных ==============================================================
-from db.entry_db_6kx import process_single_6kx_file
 
 # =============================================================================
 # Основные вызовы (вызываются из Excel через xlwings)
@@ -50,115 +93,175 @@ from db.entry_db_6kx import process_single_6kx_file
 
 def run_secur_doc():
     """Запускает вставку данных по security documents в Excel."""
-    paste_to_excel_secur_doc()
+    _dispatch("run_secur_doc")
 
 def run_grp_9000():
     """Запускает вставку данных по группе 9000 в Excel."""
-    paste_to_excel_9000grp()
+    _dispatch("run_grp_9000")
 
 def run_balance_nrk():
     """Запускает вставку данных по балансу NRK в Excel."""
-    paste_to_excel_balance_nrk()
+    _dispatch("run_balance_nrk")
 
 def run_diff_acc():
     """Запускает вставку данных по diff accounts в Excel."""
-    paste_to_excel_diff_acc()
+    _dispatch("run_diff_acc")
 
 def run_doc_acc():
     """Запускает вставку данных по doc accounts в Excel."""
-    paste_to_excel_doc_acc()
+    _dispatch("run_doc_acc")
 
 def run_compens_579():
     """Запускает вставку данных по компенсации 579 в Excel."""
-    paste_to_excel_comp_579()
+    _dispatch("run_compens_579")
 
 
 # == Позиции и сделки (6JX / 42X) =============================================
 
 def run_dz_spot():
     """Запускает вставку данных по dz spot в Excel."""
-    paste_to_excel_dz_spot()
+    _dispatch("run_dz_spot")
 
 def run_diff_spot():
     """Запускает вставку данных по diff spot в Excel."""
-    paste_to_excel_diff_spot()
+    _dispatch("run_diff_spot")
 
 def run_fz_ccf_6jx():
     """Запускает вставку данных по FZ CCF 6JX в Excel."""
-    paste_to_excel_fz_ccf_6jx()
+    _dispatch("run_fz_ccf_6jx")
 
 def run_6jx_reserve():
     """Запускает вставку данных по 6JX reserve в Excel."""
-    paste_to_excel_6jx_reserve()
+    _dispatch("run_6jx_reserve")
 
 def run_repo_6jx():
     """Запускает вставку данных по РЕПО в Excel."""
-    paste_to_excel_repo()
+    _dispatch("run_repo_6jx")
 
 def run_42x_banks():
     """Запускает вставку данных для 42X по банкам в Excel."""
-    paste_to_excel_banks_42x()
+    _dispatch("run_42x_banks")
 
 
 # == Регуляторный капитал =====================================================
 
 def run_rc_comp():
     """Запускает вставку данных для компонентов РК в Excel."""
-    paste_to_excel_rc_comp()
+    _dispatch("run_rc_comp")
 
 def run_rc_nma():
     """Запускает вставку данных по РК НМА в Excel."""
-    paste_to_excel_rc_nma()
+    _dispatch("run_rc_nma")
 
 
 # == Детализация счетов (6SX / 7SX / A7X) =====================================
 
 def run_a7x_details():
     """Запускает вставку данных из файла DA7X в Excel."""
-    paste_to_excel_a7x_details()
+    _dispatch("run_a7x_details")
 
 def run_detail_6sx():
     """Запускает формирование и контроль перечня счетов для 6S."""
-    paste_to_excel_detail_6sx()
+    _dispatch("run_detail_6sx")
 
 def run_pay_6sx():
     """Запускает формирование перечня документов, формирующих остатки для 6S."""
-    paste_to_excel_pay_6sx()
+    _dispatch("run_pay_6sx")
 
 def run_forex_6sx():
     """Запускает формирование перечня forex-сделок по документам 6S."""
-    paste_to_excel_forex_6sx()
+    _dispatch("run_forex_6sx")
 
 def run_interest_7sx():
     """Запускает расчёт процентного риска торговой книги 7S."""
-    paste_to_excel_interest_7sx()
+    _dispatch("run_interest_7sx")
+
+def run_reset_6sx():
+    """Сбрасывает сохранённые результаты цепочки 6S (счета, документы) — следующий запуск запросит БД."""
+    _dispatch("run_reset_6sx")
 
 
 # == Графики ==================================================================
 
 def run_plot_var_es():
     """Создает и вставляет график VAR ES в Excel."""
-    paste_plot_var_es()
+    _dispatch("run_plot_var_es")
 
 def run_plot_as():
     """Создает и вставляет графики AS ES в Excel."""
-    insert_image_to_excel()
+    _dispatch("run_plot_as")
 
 def run_plot_es_trade():
     """Создает и вставляет графики ES Trade в Excel."""
-    paste_plot_var_es_trade()
+    _dispatch("run_plot_es_trade")
 
 def run_plot_as_trade():
     """Создает и вставляет графики AS Trade в Excel."""
-    insert_chart_as_trade()
+    _dispatch("run_plot_as_trade")
 
 def run_chart_7s():
     """Создать и вставить график динамики минимального размера рыночного риска."""
-    create_market_risk_chart()
+    _dispatch("run_chart_7s")
 
 
 # == База данных ==============================================================
 
 def run_single_6kx_file():
     """Обрабатывает один файл 6KX для добавление в БД."""
-    process_single_6kx_file()
+    _dispatch("run_single_6kx_file")
+
+
+# =============================================================================
+# Замер времени импорта (python main.py)
+# =============================================================================
+
+def _import_time(code: str, repeat: int = 3):
+    """
+    Время импорта (мс) для python -X importtime -c code — сумма cumulative
+    по модулям верхнего уровня, минимум из repeat запусков; None, если код
+    завершился с ошибкой.
+    """
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if result.returncode != 0:
+            return None
+        total = 0
+        for line in result.stderr.splitlines():
+            # "import time:  self [us] | cumulative | imported package"; вложенные — с отступом в имени
+            parts = line.split("|")
+            if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+                continue
+            if not parts[2].startswith("  "):
+                total += int(parts[1])
+        best = total if best is None else min(best, total)
+    return best / 1000
+
+
+def _bench_import():
+    """
+    Сравнивает время импорта: прежний main (все модули реестра сразу) против
+    ленивого main с импортом модуля одной кнопки. Модули, которые не
+    импортируются в текущем окружении, исключаются из сравнения.
+    """
+    modules = sorted({module for module, _ in REGISTRY.values()})
+    missing = [m for m in modules if _import_time(f"import {m}", repeat=1) is None]
+    available = [m for m in modules if m not in missing]
+
+    eager = _import_time("import " + ", ".join(available))
+    lazy = _import_time("import main")
+    print(f"Все модули реестра сразу (как раньше): {eager:8.1f} мс")
+    print(f"import main (реестр):                  {lazy:8.1f} мс")
+    for name, (module, _) in REGISTRY.items():
+        if module in available:
+            cost = _import_time(f"import main; main.resolve({name!r})")
+            print(f"  main.{name:<22} {cost:8.1f} мс")
+    if missing:
+        print("Не импортируются в этом окружении: " + ", ".join(missing))
+
+
+if __name__ == "__main__":
+    _bench_import()
@@ -0,0 +1,18 @@
+SELECT
+	SUBSTR(a.ACCOUNT_NUMBER, 1, 4) AS R020,
+	d.ACCOUNT_DT,
+	c.CODE AS CUR,
+	d.ACCOUNT_CT,
+	d.DESCRIPTION,
+	d.BASE_AMOUNT AS SUM_UAH,
+	a.ACCOUNT_NUMBER AS DATA_ACC
+FROM SR_BANK.DOCUMENT d
+INNER JOIN SR_BANK.CURRENCY c
+	ON d.CURRENCY_ID = c.ID
+INNER JOIN SR_BANK.ACCOUNT a
+	ON a.ID IN (d.ACCOUNT_DEBIT_ID, d.ACCOUNT_CREDIT_ID)
+WHERE
+	d.POST_DATE = TO_DATE(:date_param, 'dd.mm.yyyy')
+	/*Пары (счет, валюта) — Python раскрывает в фиксированное число bind-переменных*/
+	AND (a.ACCOUNT_NUMBER, c.CODE) IN (:data_acc_cur)
+ORDER BY d.ACCOUNT_DT, d.ACCOUNT_CT
\ No newline at end of file
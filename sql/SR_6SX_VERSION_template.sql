@@ -0,0 +1,22 @@
+/*Версия данных SR_BANK для цепочки 6S (utils.run_memo): число строк и суммы остатков и документов
+  на отчетную дату, число исключенных счетов. Перезагрузка данных за дату меняет результат*/
+SELECT
+	snp.SNAPSHOT_ROWS,
+	snp.SNAPSHOT_SUM,
+	doc.DOCUMENT_ROWS,
+	doc.DOCUMENT_SUM,
+	ex.EXCLUDE_ROWS
+FROM (
+	SELECT COUNT(*) AS SNAPSHOT_ROWS, SUM(asp.BASE_AMOUNT) AS SNAPSHOT_SUM
+	FROM SR_BANK.ACCOUNT_SNAPSHOT asp
+	WHERE asp.SNAPSHOT_DATE = TO_DATE(:date_param, 'dd.mm.yyyy')
+) snp
+CROSS JOIN (
+	SELECT COUNT(*) AS DOCUMENT_ROWS, SUM(d.BASE_AMOUNT) AS DOCUMENT_SUM
+	FROM SR_BANK.DOCUMENT d
+	WHERE d.POST_DATE = TO_DATE(:date_param, 'dd.mm.yyyy')
+) doc
+CROSS JOIN (
+	SELECT COUNT(*) AS EXCLUDE_ROWS
+	FROM SR_BANK.STATFILE_6SX_ACC_EXCLUDE
+) ex
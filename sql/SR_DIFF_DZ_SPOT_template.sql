@@ -9,7 +9,12 @@ SELECT
 													WHEN R020 = '9350' THEN 0.5
 													ELSE 1
 	  											END AS EFFECT_ON_EXPOSURE
-FROM  (SELECT 
+FROM  (SELECT
+	R020
+	/*Условная агрегация вместо PIVOT: в PIVOT ... IN bind-переменные не допускаются*/
+	, SUM(CASE WHEN RDATE = TO_DATE(:date_param_old, 'DD.MM.YYYY') THEN SUM_UAH END) AS OLD_DATE
+	, SUM(CASE WHEN RDATE = TO_DATE(:date_param, 'DD.MM.YYYY') THEN SUM_UAH END) AS ACTUAL_DATE
+	FROM  (SELECT 
 	TRUNC(ACS.SNAPSHOT_DATE, 'DD') AS RDATE
 	, CASE 
 		WHEN R011.CODE = '5' THEN SUBSTR(A.ACCOUNT_NUMBER, 1, 4) || '-NBU'
@@ -49,9 +54,5 @@ FROM  (SELECT
 			WHEN (SUBSTR(A.ACCOUNT_NUMBER, 1, 4) = '9200' AND A.NAME LIKE '%Національний%') THEN SUBSTR(A.ACCOUNT_NUMBER, 1, 4) || '-NBU'
 			ELSE SUBSTR(A.ACCOUNT_NUMBER, 1, 4)
 		END)
-	
-PIVOT (SUM(SUM_UAH)
-	FOR RDATE IN (TO_DATE(:date_param_old, 'DD.MM.YYYY') AS OLD_DATE,
-				  TO_DATE(:date_param, 'DD.MM.YYYY') AS ACTUAL_DATE)
-       )
+	GROUP BY R020)
 ORDER BY 1
\ No newline at end of file
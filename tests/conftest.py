@@ -0,0 +1,5 @@
+# Корень репозитория в sys.path: тесты импортируют db, utils и fetchers как пакеты
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from db import oracle, result_cache
+from fetchers import detail_6sx
+from utils import run_memo
+from utils.sql_templates import get_sql
+
+RDATE = datetime(2025, 3, 31)
+
+
+class FakeDb:
+    """Ответы на запросы перечня счетов; calls — число запросов остатков к «БД» (перечень исключений без дат не кешируется)."""
+
+    def __init__(self):
+        self.sum_uah = 100.0
+        self.calls = 0
+
+    def __call__(self, func, sql, params=None, **kwargs):
+        if sql == get_sql("SR_6SX_EXCLUDE_template.sql"):
+            return pd.DataFrame({"ACCOUNT_NUMBER": ["EXCL"]})
+        assert sql == get_sql("SR_6SX_ACCOUNT_template.sql")
+        self.calls += 1
+        return pd.DataFrame({
+            "R020": ["6000"], "ACCOUNT_NUMBER": ["6000001"], "CUR": ["840"],
+            "SUM_UAH": [self.sum_uah], "NAME_ACC": ["Рахунок"],
+        })
+
+    def probe(self):
+        return pd.DataFrame({
+            "SNAPSHOT_ROWS": [1], "SNAPSHOT_SUM": [self.sum_uah], "DOCUMENT_ROWS": [0],
+            "DOCUMENT_SUM": [0], "EXCLUDE_ROWS": [1],
+        })
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.delenv("SR_CACHE", raising=False)
+    monkeypatch.setattr(result_cache, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(run_memo, "MEMO_DIR", tmp_path / "run")
+    monkeypatch.setattr(oracle, "connection_identity", lambda: "SR@TEST")
+    fake = FakeDb()
+    monkeypatch.setattr(oracle, "_with_connection", fake)
+    return fake
+
+
+def _fetch(db):
+    acc_calc, _ = detail_6sx.fetch_6sx_data(ctx={"RDATE": RDATE}, probe=db.probe())
+    return acc_calc["SUM_UAH"].tolist()
+
+
+def test_probe_version_change_bypasses_cached_rows(db):
+    assert result_cache.ttl_for({"date_param": RDATE}) is None  # закрытый день кешируется бессрочно
+    assert _fetch(db) == [100.0]
+    calls = db.calls
+
+    # Перезагрузка данных за тот же день: probe меняется, пересчет должен прочитать новые строки
+    db.sum_uah = 250.0
+    assert _fetch(db) == [250.0]
+    assert db.calls == calls + 1
+
+
+def test_same_probe_version_reuses_result_cache(db):
+    assert _fetch(db) == [100.0]
+    calls = db.calls
+    run_memo.invalidate()
+    # Версия не изменилась — пересчет берет счета из кеша результатов без обращения к БД
+    assert _fetch(db) == [100.0]
+    assert db.calls == calls
@@ -0,0 +1,236 @@
+import argparse
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from db import batch_entry_db_6kx as loader
+
+
+def _source_frame(rows):
+    return pd.DataFrame(rows, columns=loader.EXPECTED_COLUMNS)
+
+
+def _create_tables(connection):
+    connection.execute('CREATE TABLE DB_6KX (Date TEXT, REC_NO TEXT, EKP TEXT, R030 TEXT, R031 TEXT, T100 TEXT)')
+    connection.execute('CREATE TABLE LCR_Combined (Date TEXT, "LCRвв" REAL, "LCRів" REAL, Min_NRM REAL, Target REAL)')
+
+
+@pytest.fixture
+def conn():
+    """База в памяти со структурой DB_6KX, LCR_Combined и LOAD_MANIFEST."""
+    connection = sqlite3.connect(":memory:")
+    _create_tables(connection)
+    loader.ensure_manifest_table(connection)
+    yield connection
+    connection.close()
+
+
+def _prepared(file_date, t100="100"):
+    combined = loader.build_combined_dataframe(_source_frame([["1", "A6K081", "980", t100]]), file_date)
+    return combined, loader.build_lcr_row(combined, file_date, logging.getLogger("test_6kx"))
+
+
+def _write_file(path, content):
+    path.write_bytes(content)
+    return path
+
+
+def test_extract_report_date():
+    assert loader.extract_report_date(Path("6K_31012025.xlsx")) == "2025-01-31"
+    with pytest.raises(ValueError):
+        loader.extract_report_date(Path("6K.xlsx"))
+    with pytest.raises(ValueError):
+        loader.extract_report_date(Path("6K_3101.xlsx"))
+
+
+def test_parse_pragma():
+    assert loader.parse_pragma(" Journal_Mode = WAL ") == ("journal_mode", "WAL")
+    assert loader.parse_pragma("cache_size=-200000") == ("cache_size", "-200000")
+    for text in ("user_version=1", "synchronous=OFF; DROP TABLE DB_6KX", "journal_mode="):
+        with pytest.raises(argparse.ArgumentTypeError):
+            loader.parse_pragma(text)
+
+
+def test_build_combined_dataframe_and_lcr_row(caplog):
+    df = _source_frame([
+        ["1", "A6K081", "980", "125,5"],
+        ["2", "A6K082", "840", "н/д"],
+        ["3", "A6K010", "#", "7"],
+    ])
+    combined = loader.build_combined_dataframe(df, "2025-01-31")
+    assert combined.columns.tolist() == loader.DB_6KX_COLUMNS
+    assert combined["R031"].tolist() == ["NV", "FCY", "#"]
+    assert set(combined["Date"]) == {"2025-01-31"}
+
+    with caplog.at_level(logging.WARNING):
+        row = loader.build_lcr_row(combined, "2025-01-31", logging.getLogger("test_6kx"))
+    assert row == {"Date": "2025-01-31", "LCRвв": 1.255, "LCRів": None, "Min_NRM": 1.00, "Target": 1.10}
+    assert "A6K082" in caplog.text
+
+
+def test_log_recorder_replays_in_order(caplog):
+    recorder = loader.LogRecorder()
+    recorder.info("Обработка файла %s", "a.xlsx")
+    recorder.debug("подробно")
+    recorder.warning("T100 для %s", "A6K081")
+    recorder.error("Ошибка %s: %s", "b.xlsx", "нет колонок")
+
+    logger = logging.getLogger("test_6kx_replay")
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        loader.replay_records(recorder.records, logger)
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [
+        (logging.INFO, "Обработка файла a.xlsx"),
+        (logging.DEBUG, "подробно"),
+        (logging.WARNING, "T100 для A6K081"),
+        (logging.ERROR, "Ошибка b.xlsx: нет колонок"),
+    ]
+
+
+def test_prepare_in_pool_keeps_input_order(tmp_path):
+    # Файлов нет — каждый обработчик вернет None и запись об ошибке чтения
+    items = [(f"2025-01-{day:02d}", tmp_path / f"6K_{day:02d}012025.xlsx") for day in range(1, 6)]
+    results = list(loader.prepare_in_pool(items, workers=2))
+    assert [result for result, _ in results] == [None] * len(items)
+    for (file_date, file_path), (_, records) in zip(items, results):
+        assert records[0] == (logging.INFO, "Обработка файла %s (дата %s)", (file_path.name, file_date))
+        assert records[-1][0] == logging.ERROR
+
+
+def test_manifest_classify(tmp_path):
+    first = _write_file(tmp_path / "6K_31012025.xlsx", b"v1")
+    manifest = loader.LoadManifest()
+    status, entry = manifest.classify(first, "2025-01-31")
+    assert status == "new"
+    assert entry.sha256 == loader.file_sha256(first)
+    assert entry.path == loader.manifest_key(first)
+
+    manifest = loader.LoadManifest([entry])
+    assert manifest.classify(first, "2025-01-31") == ("unchanged", entry)
+
+    # Тот же файл под другим именем — содержимое за дату уже загружено
+    copy = _write_file(tmp_path / "6K_31012025_copy.xlsx", b"v1")
+    assert manifest.classify(copy, "2025-01-31")[0] == "same_content"
+
+    _write_file(first, b"v2")
+    stat = first.stat()
+    os.utime(first, ns=(stat.st_atime_ns, entry.mtime_ns + 10**9))
+    status, changed = manifest.classify(first, "2025-01-31")
+    assert status == "changed"
+    assert changed.sha256 != entry.sha256
+
+
+def test_manifest_current_hash_is_last_loaded(conn):
+    older = loader.ManifestEntry("a.xlsx", 1, 1, "hash-a", "2025-01-31", "2025-02-01 10:00:00")
+    newer = loader.ManifestEntry("b.xlsx", 1, 1, "hash-b", "2025-01-31", "2025-02-02 10:00:00")
+    with conn:
+        loader.record_manifest(conn, newer)
+        loader.record_manifest(conn, older)
+    manifest = loader.LoadManifest.load(conn)
+    assert len(manifest) == 2
+    assert manifest.current_hash == {"2025-01-31": "hash-b"}
+
+
+def test_manifest_load_without_table():
+    assert len(loader.LoadManifest.load(sqlite3.connect(":memory:"))) == 0
+
+
+def test_insert_file_replace_swaps_date_rows(conn):
+    entry = loader.ManifestEntry("6K.xlsx", 2, 1, "hash-1", "2025-01-31")
+    with conn:
+        loader.insert_file(conn, *_prepared("2025-01-31", "100"), manifest_entry=entry)
+        loader.insert_file(conn, *_prepared("2025-02-28", "90"))
+    with conn:
+        loader.insert_file(
+            conn, *_prepared("2025-01-31", "120"), replace=True,
+            manifest_entry=entry._replace(sha256="hash-2"),
+        )
+
+    assert conn.execute("SELECT Date, T100 FROM DB_6KX ORDER BY Date").fetchall() == [
+        ("2025-01-31", "120"), ("2025-02-28", "90"),
+    ]
+    assert conn.execute('SELECT Date, "LCRвв" FROM LCR_Combined ORDER BY Date').fetchall() == [
+        ("2025-01-31", 1.2), ("2025-02-28", 0.9),
+    ]
+    assert conn.execute(f"SELECT path, sha256 FROM {loader.MANIFEST_TABLE}").fetchall() == [("6K.xlsx", "hash-2")]
+
+
+def test_bulk_writer_retries_failed_batch_per_file(conn, caplog):
+    # Запись за 2025-02-28 отклоняется триггером — пачка откатывается, остальные файлы пишутся по одному
+    conn.execute(
+        "CREATE TRIGGER reject BEFORE INSERT ON LCR_Combined WHEN NEW.Date = '2025-02-28' "
+        "BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+    )
+    writer = loader.BulkWriter(conn, logging.getLogger("test_6kx_writer"), batch_size=3)
+    dates = ["2025-01-31", "2025-02-28", "2025-03-31"]
+    results = []
+    with caplog.at_level(logging.INFO, logger="test_6kx_writer"):
+        for file_date in dates:
+            results += writer.add(Path(f"6K_{file_date}.xlsx"), file_date, *_prepared(file_date))
+    assert results == [
+        (Path("6K_2025-01-31.xlsx"), True),
+        (Path("6K_2025-02-28.xlsx"), False),
+        (Path("6K_2025-03-31.xlsx"), True),
+    ]
+    assert writer.flush() == []
+    assert conn.execute("SELECT Date FROM DB_6KX ORDER BY Date").fetchall() == [("2025-01-31",), ("2025-03-31",)]
+    assert "пачка отменена" in caplog.text
+    assert "rejected" in caplog.text
+
+
+def _run_main(tmp_path, monkeypatch, t100, *options):
+    """Запускает main() на файлах-заглушках: содержимое каждого файла — строка A6K081 с T100 из t100."""
+    source = tmp_path / "6K"
+    source.mkdir()
+    for name in t100:
+        _write_file(source / name, b"xlsx")
+    db_path = tmp_path / "liquidity.db"
+    with sqlite3.connect(db_path) as db:
+        _create_tables(db)
+        # Файл с T100 = 999 отклоняется базой
+        db.execute(
+            'CREATE TRIGGER reject BEFORE INSERT ON LCR_Combined WHEN NEW."LCRвв" = 9.99 '
+            "BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+        )
+    db.close()
+
+    monkeypatch.setattr(
+        loader, "read_source_dataframe",
+        lambda path: _source_frame([["1", "A6K081", "980", t100[path.name]]]),
+    )
+    monkeypatch.setattr("sys.argv", [
+        "batch_entry_db_6kx", "--source", str(source), "--db", str(db_path),
+        "--pattern", "6K_*.xlsx", "--no-file-log", *options,
+    ])
+    return loader.main(), db_path
+
+
+def test_main_logs_file_results_in_file_order(tmp_path, monkeypatch, caplog):
+    t100 = {"6K_30012025.xlsx": "100", "6K_31012025.xlsx": "110"}
+    with caplog.at_level(logging.INFO, logger="entry_db_6kx_batch"):
+        code, _ = _run_main(tmp_path, monkeypatch, t100, "--batch-size", "5")
+    assert code == 0
+    lines = [r.getMessage() for r in caplog.records
+             if r.getMessage().startswith(("Обработка файла", "Файл "))]
+    assert lines == [
+        "Обработка файла 6K_30012025.xlsx (дата 2025-01-30)",
+        "Файл 6K_30012025.xlsx успешно загружен",
+        "Обработка файла 6K_31012025.xlsx (дата 2025-01-31)",
+        "Файл 6K_31012025.xlsx успешно загружен",
+    ]
+
+
+def test_main_keeps_date_unloaded_when_file_is_rolled_back(tmp_path, monkeypatch):
+    # Первый файл за 31.01 отклоняется базой внутри пачки
+    t100 = {"6K_30012025.xlsx": "100", "6K_31012025.xlsx": "999", "6K_31012025_v2.xlsx": "110"}
+    code, db_path = _run_main(tmp_path, monkeypatch, t100, "--skip-existing", "--batch-size", "5")
+    assert code == 1
+
+    with sqlite3.connect(db_path) as db:
+        rows = db.execute("SELECT Date, T100 FROM DB_6KX ORDER BY Date").fetchall()
+    db.close()
+    # Дата 31.01 не считалась загруженной после отката — повторный файл за нее записан
+    assert rows == [("2025-01-30", "100"), ("2025-01-31", "110")]
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from utils import excel_writer
+from utils.excel_format import MAX_ADDRESS_LEN, apply_row_styles, style_runs, union_addresses
+from utils.fake_workbook import FakeBook, installed
+
+COLUMNS = ["ACCOUNT_DT", "ACCOUNT_CT", "CUR", "AMOUNT", "DESCRIPTION"]
+STYLES = {"DT": {"Color": 0x006100}, "CT": {"Color": 0x0000FF}}
+
+
+@pytest.fixture(autouse=True)
+def com_backend(monkeypatch):
+    monkeypatch.delenv(excel_writer.BACKEND_ENV, raising=False)
+
+
+def _format(keys):
+    """Форматирует тело таблицы на FakeBook; возвращает (число диапазонов, число обращений к Excel)."""
+    book = FakeBook()
+    book.add_table("6SX_ACC", "t6S_PAY", pd.DataFrame(columns=COLUMNS))
+    with installed(book):
+        book.reset_counter()
+        ranges = apply_row_styles("6SX_ACC", "t6S_PAY", keys, STYLES, default={"ColorIndex": -4105})
+        return ranges, book.reset_counter()
+
+
+def test_style_runs_and_union_addresses():
+    runs = style_runs(["CT", "CT", "DT", "CT"])
+    assert runs == {"CT": [(0, 2), (3, 1)], "DT": [(2, 1)]}
+    assert union_addresses(runs["CT"], 2, 1, 5) == ["A2:E3,A5:E5"]
+
+
+def test_union_addresses_respect_length_limit():
+    runs = [(offset, 1) for offset in range(0, 2000, 2)]
+    addresses = union_addresses(runs, 2, 1, 5)
+    assert all(len(address) <= MAX_ADDRESS_LEN for address in addresses)
+    assert ",".join(addresses).count(":") == len(runs)
+
+
+def test_long_runs_cost_does_not_depend_on_rows():
+    costs = {_format(["CT"] * (rows // 2) + ["DT"] * (rows // 2)) for rows in (100, 10000)}
+    assert len(costs) == 1
+
+
+def test_alternating_rows_worst_case_cost():
+    # Худший случай: ключи чередуются через строку, каждый блок — одна строка
+    rows = 1000
+    ranges, calls = _format(["DT" if i % 2 else "CT" for i in range(rows)])
+    assert ranges == 41                 # тело таблицы + по ~20 строк на диапазон
+    assert calls == 130                 # против ~3 обращений на строку при построчном форматировании
+    assert calls < rows / 5
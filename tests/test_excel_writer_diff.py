@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from utils import excel_writer
+from utils.excel_writer import _changed_blocks, paste_to_excel_diff
+from utils.fake_workbook import FakeBook, installed
+
+
+def test_changed_blocks_empty():
+    assert _changed_blocks(np.zeros((3, 4), dtype=bool)) == []
+
+
+def test_changed_blocks_split_on_row_gaps_with_column_span():
+    changed = np.zeros((6, 5), dtype=bool)
+    changed[0, 1] = True
+    changed[1, 3] = True
+    changed[4, 0] = True
+    assert _changed_blocks(changed) == [(0, 2, 1, 4), (4, 5, 0, 1)]
+
+
+def test_changed_blocks_last_row():
+    changed = np.zeros((3, 2), dtype=bool)
+    changed[2, 1] = True
+    assert _changed_blocks(changed) == [(2, 3, 1, 2)]
+
+
+def _diff_book(df):
+    book = FakeBook()
+    book.add_table("LIST", "tDATA", df, top_left="A1")
+    return book
+
+
+def _table_values(book, rows):
+    sheet = book.sheets["LIST"]
+    return [[sheet._get(r, c) for c in (1, 2)] for r in range(2, rows + 2)]
+
+
+def test_paste_to_excel_diff_writes_only_changed_cells(monkeypatch):
+    monkeypatch.delenv(excel_writer.BACKEND_ENV, raising=False)
+    old = pd.DataFrame({"ACC": ["1", "2", "3"], "AMOUNT": [1.0, 2.0, 3.0]})
+    new = pd.DataFrame({"ACC": ["1", "2", "3"], "AMOUNT": [1.0, 5.0, 3.0]})
+    book = _diff_book(old)
+    with installed(book):
+        assert paste_to_excel_diff("LIST", "tDATA", old) == 0
+        assert paste_to_excel_diff("LIST", "tDATA", new) == 1
+    assert _table_values(book, 3) == [["1", 1.0], ["2", 5.0], ["3", 3.0]]
+
+
+def test_paste_to_excel_diff_counts_added_and_removed_rows(monkeypatch):
+    monkeypatch.delenv(excel_writer.BACKEND_ENV, raising=False)
+    book = _diff_book(pd.DataFrame({"ACC": ["1", "2"], "AMOUNT": [1.0, 2.0]}))
+    with installed(book):
+        longer = pd.DataFrame({"ACC": ["1", "2", "3"], "AMOUNT": [1.0, 2.0, 3.0]})
+        assert paste_to_excel_diff("LIST", "tDATA", longer) == 2
+        shorter = pd.DataFrame({"ACC": ["1"], "AMOUNT": [1.0]})
+        assert paste_to_excel_diff("LIST", "tDATA", shorter) == 4
+    assert book.sheets["LIST"]._list_objects["tDATA"].body_rows == 1
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from utils.parser_forex import extract_forex_numbers, parse_forex_numbers
+
+
+def test_parse_forex_numbers_normalizes_c_and_keeps_nine():
+    text = "угоди неттінг №№с11132,c11133 та №954521482, ASW99807/180226, ГУ №04/63-182ГУ"
+    assert parse_forex_numbers(text) == ["c11132", "c11133", "954521482"]
+
+
+def test_parse_forex_numbers_skips_matches_inside_words():
+    assert parse_forex_numbers("abc123 x9123 ASW9999 rus с1") == ["c1"]
+
+
+def test_extract_forex_numbers_links_rows():
+    descriptions = pd.Series(
+        ["№с11 та №c12", None, "Комісія", "угода №9001"],
+        index=[10, 11, 12, 13],
+    )
+    links = extract_forex_numbers(descriptions)
+    assert links.columns.tolist() == ["ROW", "DEAL_NO"]
+    assert links["ROW"].tolist() == [10, 10, 13]
+    assert links["DEAL_NO"].tolist() == ["c11", "c12", "9001"]
+
+
+def test_extract_forex_numbers_matches_parse_in_loop():
+    descriptions = pd.Series([
+        "Зарахування коштів згідно угоди №с123 від 18.02.2026",
+        "Переказ № ASW99807/180226 /BNF/FOREX DEAL",
+        float("nan"),
+        "неттінг №№c11132,с11133; №954521482",
+    ])
+    expected = [n for d in descriptions.dropna() for n in parse_forex_numbers(d)]
+    assert extract_forex_numbers(descriptions)["DEAL_NO"].tolist() == expected
+
+
+def test_extract_forex_numbers_empty():
+    links = extract_forex_numbers(pd.Series([None, "без номерів"], dtype=object))
+    assert links.empty
+    assert links.columns.tolist() == ["ROW", "DEAL_NO"]
@@ -0,0 +1,81 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from db import result_cache
+
+SQL = "SELECT * FROM t WHERE d = TO_DATE(:date_param, 'dd.mm.yyyy')"
+
+
+def test_make_key_ignores_param_order_and_case():
+    a = result_cache.make_key(SQL, {"date_param": date(2025, 3, 31), "ccf": 1}, "U@DB")
+    b = result_cache.make_key(SQL, {"CCF": 1, "DATE_PARAM": date(2025, 3, 31)}, "U@DB")
+    assert a == b
+
+
+def test_make_key_treats_midnight_datetime_as_date():
+    assert (result_cache.make_key(SQL, {"date_param": datetime(2025, 3, 31)})
+            == result_cache.make_key(SQL, {"date_param": date(2025, 3, 31)}))
+
+
+def test_make_key_depends_on_connection_identity():
+    params = {"date_param": date(2025, 3, 31)}
+    assert (result_cache.make_key(SQL, params, "SR@PROD")
+            != result_cache.make_key(SQL, params, "SR@TEST"))
+
+
+def test_make_key_depends_on_data_version():
+    params = {"date_param": date(2025, 3, 31)}
+    assert result_cache.make_key(SQL, params, "SR@PROD") == result_cache.make_key(SQL, params, "SR@PROD", None)
+    assert (result_cache.make_key(SQL, params, "SR@PROD", "v1")
+            != result_cache.make_key(SQL, params, "SR@PROD", "v2"))
+
+
+def test_ttl_for_past_dates_is_unlimited():
+    assert result_cache.ttl_for({"date_param": date(2020, 1, 2)}) is None
+    assert result_cache.ttl_for({"date_param": "02.01.2020"}) is None
+
+
+def test_ttl_for_today_or_volatile_is_short():
+    assert result_cache.ttl_for({"date_param": date.today()}) == result_cache.SHORT_TTL
+    assert result_cache.ttl_for({"date_param": date.today() + timedelta(days=1)}) == result_cache.SHORT_TTL
+    assert result_cache.ttl_for({"date_param": date(2020, 1, 2)}, volatile=True) == result_cache.SHORT_TTL
+
+
+def test_ttl_for_without_dates_disables_cache():
+    assert result_cache.ttl_for({"n": 5}) is False
+    assert result_cache.ttl_for(None) is False
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    if result_cache.pq is None:
+        pytest.skip("нужен pyarrow")
+    monkeypatch.setattr(result_cache, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def _expires(key):
+    table = result_cache.pq.read_table(result_cache._path(key))
+    return float(table.schema.metadata[result_cache._META_KEY])
+
+
+def test_put_get_roundtrip_keeps_closed_date_forever(cache_dir):
+    df = pd.DataFrame({"A": [1.0, 2.0], "B": ["x", "y"]})
+    assert result_cache.put("k", df, None)
+    pd.testing.assert_frame_equal(result_cache.get("k"), df)
+    assert _expires("k") == 0
+
+
+def test_put_empty_result_is_not_immutable(cache_dir):
+    before = time.time()
+    assert result_cache.put("empty", pd.DataFrame({"A": pd.Series([], dtype=float)}), None)
+    assert before < _expires("empty") <= time.time() + result_cache.SHORT_TTL
+
+
+def test_get_drops_expired_entry(cache_dir):
+    result_cache.put("old", pd.DataFrame({"A": [1]}), -1)
+    assert result_cache.get("old") is None
+    assert not result_cache._path("old").exists()
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+import main
+from utils import run_context
+from utils.fake_workbook import FakeBook, installed
+from utils.run_context import RunContext, current_context
+
+
+def _book(name, rdate):
+    book = FakeBook(name=name)
+    book.set_name("RDATE", rdate)
+    book.set_name("d_r020", "1500")
+    return book
+
+
+@pytest.fixture(autouse=True)
+def com_backend(monkeypatch):
+    monkeypatch.delenv("SR_EXCEL_BACKEND", raising=False)
+
+
+def test_names_are_read_from_the_given_book():
+    target = _book("Target.xlsm", datetime(2025, 3, 31))
+    active = _book("Active.xlsm", datetime(2024, 12, 31))
+    # Одно приложение Excel на обе книги: Application.Evaluate видит только активную
+    target.app = active.app
+
+    ctx = RunContext(target)
+    assert ctx.rdate == datetime(2025, 3, 31)
+    assert ctx["d_r020"] == "1500"
+    assert "ForecastDate" not in ctx
+
+
+def test_dispatch_runs_in_one_context(monkeypatch):
+    seen = []
+
+    def fetcher():
+        seen.append(current_context())
+        seen.append(current_context())
+        return current_context().rdate
+
+    monkeypatch.setitem(main._resolved, "run_test", fetcher)
+    book = _book("Caller.xlsm", datetime(2025, 3, 31))
+    with installed(book):
+        assert main._dispatch("run_test") == datetime(2025, 3, 31)
+    assert seen[0] is seen[1]
+    assert run_context._active is None
+
+
+def test_unused_context_does_not_open_book(monkeypatch):
+    monkeypatch.setitem(main._resolved, "run_test", lambda: "ok")
+    # Вне Excel xw.Book.caller() недоступен — функции, не читающие книгу, все равно работают
+    assert main._dispatch("run_test") == "ok"
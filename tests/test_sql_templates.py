@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from utils import sql_templates
+from utils.sql_templates import extract_binds, get_binds, get_sql, get_sql_variant, validate_params
+
+
+@pytest.fixture
+def templates_dir(tmp_path, monkeypatch):
+    """Временный каталог шаблонов с пустым кэшем."""
+    monkeypatch.setattr(sql_templates, "get_sql_path", lambda name: tmp_path / name)
+    monkeypatch.setattr(sql_templates, "_templates", {})
+    monkeypatch.setattr(sql_templates, "_preloaded", False)
+    return tmp_path
+
+
+def test_extract_binds_finds_names_case_insensitive():
+    sql = "SELECT * FROM t WHERE a = :Date_Param AND b IN (:data_acc) AND c = :date_param"
+    assert extract_binds(sql) == {"date_param", "data_acc"}
+
+
+def test_extract_binds_skips_literals_comments_and_double_colon():
+    sql = """
+        SELECT TO_CHAR(d, 'HH24:MI:SS') AS T, x::text   -- :commented
+        FROM t /* :date_r020 */
+        WHERE a = :real
+    """
+    assert extract_binds(sql) == {"real"}
+
+
+def test_validate_params_accepts_matching_params():
+    validate_params("SELECT 1 FROM dual WHERE a = :a AND b = :B", {"A": 1, "b": 2})
+    validate_params("SELECT 1 FROM dual", None)
+
+
+def test_validate_params_reports_missing_and_extra():
+    with pytest.raises(ValueError) as exc:
+        validate_params("SELECT 1 FROM dual WHERE a = :a AND b = :b", {"a": 1, "c": 3})
+    assert "не переданы: b" in str(exc.value)
+    assert "лишние: c" in str(exc.value)
+
+
+def test_get_sql_variant_replaces_only_whole_placeholder(templates_dir):
+    (templates_dir / "V.sql").write_text(
+        "SELECT * FROM t WHERE :cond AND a = :cond_value AND s = 'x:cond'", encoding="utf-8"
+    )
+    sql = get_sql_variant("V.sql", cond="ACS.BASE_AMOUNT > 0")
+    assert sql == "SELECT * FROM t WHERE ACS.BASE_AMOUNT > 0 AND a = :cond_value AND s = 'x:cond'"
+    assert extract_binds(sql) == {"cond_value"}
+
+
+def test_all_templates_load_and_strip_semicolon():
+    sql_templates.preload()
+    assert sql_templates._templates
+    for filename in sql_templates._templates:
+        sql = get_sql(filename)
+        assert sql and not sql.endswith(";")
+        assert get_binds(filename) == extract_binds(sql)
+
+
+def test_template_reloaded_after_change(templates_dir):
+    path = templates_dir / "T.sql"
+    path.write_text("SELECT :a FROM dual;", encoding="utf-8")
+    assert get_binds("T.sql") == {"a"}
+    path.write_text("SELECT :b FROM dual", encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert get_sql("T.sql") == "SELECT :b FROM dual"
+    assert get_binds("T.sql") == {"b"}
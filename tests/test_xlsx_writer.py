@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import openpyxl
+import pytest
+from openpyxl.workbook.defined_name import DefinedName
+
+from utils import xlsx_writer
+
+
+@pytest.fixture
+def book_path(tmp_path, monkeypatch):
+    """Книга с именами: ячейка, диапазон, формула."""
+    path = tmp_path / "book.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "sys"
+    ws["A1"] = datetime(2025, 3, 31)
+    ws["B1"] = "1500"
+    ws["B2"] = "1600"
+    ws["C1"] = "=A1+1"
+    for name, ref in (("RDATE", "sys!$A$1"), ("d_r020", "sys!$B$1:$B$2"), ("ForecastDate", "sys!$C$1")):
+        wb.defined_names[name] = DefinedName(name, attr_text=ref)
+    wb.save(path)
+
+    monkeypatch.setenv(xlsx_writer.PATH_ENV, str(path))
+    monkeypatch.setattr(xlsx_writer, "_book", None)
+    monkeypatch.setattr(xlsx_writer, "_book_path", None)
+    monkeypatch.setattr(xlsx_writer, "_book_mtime", None)
+    monkeypatch.setattr(xlsx_writer, "_dirty", False)
+    return path
+
+
+def test_read_name_single_cell(book_path):
+    assert xlsx_writer.read_name("RDATE") == datetime(2025, 3, 31)
+
+
+def test_read_name_range_returns_first_cell(book_path):
+    assert xlsx_writer.read_name("d_r020") == "1500"
+
+
+def test_read_name_formula_or_missing_is_none(book_path):
+    assert xlsx_writer.read_name("ForecastDate") is None
+    assert xlsx_writer.read_name("num_acc") is None
@@ -1,3 +1,4 @@
+import numpy as np
 import xlwings as xw
 @xw.func
 def py_RoundLR(data, threshold):
@@ -11,4 +12,22 @@ def py_RoundLR(data, threshold):
     if abs(data) > threshold:
         return data
     else:
-        return 0
\ No newline at end of file
+        return 0
+
+
+@xw.func
+@xw.arg("data", np.array, ndim=2, dtype=float)
+@xw.ret(np.array)
+def py_RoundLR_arr(data, threshold):
+    """
+    Векторный вариант py_RoundLR для диапазона: один вызов Python на весь диапазон
+    вместо вызова на каждую ячейку. Результат той же формы, что и data
+    (в Excel 365 — динамический массив, «разливается» из одной ячейки).
+
+    Для одной ячейки результат совпадает с py_RoundLR; пустые ячейки остаются пустыми.
+
+    Параметры:
+    data : диапазон чисел (или одна ячейка)
+    threshold : пороговое значение
+    """
+    return np.where(np.isnan(data) | (np.abs(data) > threshold), data, 0.0)
@@ -4,6 +4,8 @@ from pandas.tseries.offsets import BDay
 import pandas as pd
 import xlwings as xw
 
+from utils.excel_writer import headless_backend
+
 # Определяем функцию для получения предыдущего рабочего дня
 def get_previous_working_day():
     # Получаем сегодняшнюю дату и время с помощью pd.Timestamp.today()
@@ -11,11 +13,20 @@ def get_previous_working_day():
     # После этого приводим результат к дате (без времени) с помощью .date()
     return (pd.Timestamp.today() - BDay(1)).date()
 
-def forecast_date():
-    # Получаем текущую книгу и лист DIFF
-    wb = xw.Book.caller()
-    # Получаем значения из именованных ячеек
-    date_forecast = wb.names['ForecastDate'].refers_to_range.value
+def forecast_date(ctx=None):
+    # Если передан контекст запуска (utils.run_context) — значение уже прочитано из книги
+    if ctx is not None:
+        return ctx.forecast_date
+
+    headless = headless_backend()
+    if headless:
+        # Файловый бэкенд (SR_EXCEL_BACKEND=xlsx): значение берем из книги SR_XLSX_PATH
+        date_forecast = headless.read_name('ForecastDate')
+    else:
+        # Получаем текущую книгу и лист DIFF
+        wb = xw.Book.caller()
+        # Получаем значения из именованных ячеек
+        date_forecast = wb.names['ForecastDate'].refers_to_range.value
     
  # Проверяем, что значение из ячейки не пустое (не None)
     if date_forecast:
@@ -0,0 +1,118 @@
+# Пакетное форматирование строк таблиц Excel: строки группируются по стилю, каждый стиль применяется один раз
+
+from utils.excel_writer import headless_backend, target_book
+
+MAX_ADDRESS_LEN = 255   # предел длины адреса для Worksheet.Range("A2:E5,A9:E12,...")
+
+
+def column_letter(col: int) -> str:
+    """Номер столбца (1 = A) в буквенное обозначение Excel."""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def style_runs(keys) -> dict:
+    """
+    Группирует подряд идущие одинаковые ключи стиля.
+
+    Returns:
+        dict: ключ -> список (смещение первой строки, число строк)
+    """
+    runs = {}
+    start = 0
+    keys = list(keys)
+    for i in range(1, len(keys) + 1):
+        if i == len(keys) or keys[i] != keys[start]:
+            runs.setdefault(keys[start], []).append((start, i - start))
+            start = i
+    return runs
+
+
+def union_addresses(runs, first_row: int, first_col: int, col_count: int) -> list:
+    """
+    Собирает адреса вида "A2:E5,A9:E12" для набора строковых блоков.
+
+    Адреса режутся на части не длиннее MAX_ADDRESS_LEN, поэтому на каждую часть
+    приходится одно обращение к Excel вместо обращения на каждую строку.
+    """
+    left = column_letter(first_col)
+    right = column_letter(first_col + col_count - 1)
+    addresses = []
+    current = ""
+    for offset, length in runs:
+        top = first_row + offset
+        part = f"{left}{top}:{right}{top + length - 1}"
+        if current and len(current) + 1 + len(part) > MAX_ADDRESS_LEN:
+            addresses.append(current)
+            current = part
+        else:
+            current = f"{current},{part}" if current else part
+    if current:
+        addresses.append(current)
+    return addresses
+
+
+def _apply_font(range_api, font: dict):
+    target = range_api.Font
+    for attr, value in font.items():
+        setattr(target, attr, value)
+
+
+def apply_row_styles(sheet_name: str, table_name: str, keys, styles: dict,
+                     default: dict = None, num_columns: int = None) -> int:
+    """
+    Применяет стили шрифта к строкам тела таблицы Excel по ключу строки.
+
+    Вместо установки Font.* для каждой строки строки группируются по ключу
+    в непрерывные блоки, блоки одного стиля объединяются в один адрес,
+    и атрибуты шрифта устанавливаются один раз на объединённый диапазон.
+
+    Число обращений к Excel растет с числом блоков, а не строк: адрес ограничен
+    MAX_ADDRESS_LEN, поэтому при ключах, чередующихся через строку, на каждые
+    ~20 строк приходится один диапазон (Range + Font).
+
+    Args:
+        sheet_name (str): Имя листа Excel
+        table_name (str): Имя таблицы Excel
+        keys (Iterable): ключ стиля для каждой строки (например, mark или роль), по порядку строк
+        styles (dict): ключ -> атрибуты Font ({'Color': 0x0000FF, 'Bold': True})
+        default (dict): атрибуты Font для всего тела таблицы до применения стилей
+        num_columns (int): ширина форматируемой области (по умолчанию — все столбцы таблицы)
+
+    Returns:
+        int: число диапазонов, к которым применялось форматирование
+    """
+    keys = list(keys)
+    if not keys:
+        return 0
+
+    headless = headless_backend()
+    if headless:
+        return headless.apply_row_styles(sheet_name, table_name, keys, styles, default, num_columns)
+
+    wb = target_book()
+    sheet = wb.sheets[sheet_name]
+    table = sheet.api.ListObjects(table_name)
+    start_row = table.HeaderRowRange.Row + 1
+    start_col = table.Range.Column
+    if num_columns is None:
+        num_columns = table.ListColumns.Count
+
+    applied = 0
+    if default:
+        # Общий стиль — одним диапазоном на всё тело таблицы
+        body = sheet.range((start_row, start_col)).resize(len(keys), num_columns)
+        _apply_font(body.api, default)
+        applied += 1
+
+    for key, runs in style_runs(keys).items():
+        font = styles.get(key)
+        if not font:
+            continue
+        for address in union_addresses(runs, start_row, start_col, num_columns):
+            _apply_font(sheet.api.Range(address), font)
+            applied += 1
+    return applied
@@ -1,8 +1,353 @@
 # Модуль для вставки данных из pandas DataFrame в таблицу Excel
+import logging
+import os
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
 import xlwings as xw  # Библиотека для работы с Excel
 import pandas as pd   # Библиотека для работы с данными
 
-def paste_to_excel(sheet_name: str, table_name: str, df: pd.DataFrame):
+# Нулевой день последовательной нумерации дат Excel (система 1900)
+EXCEL_EPOCH = np.datetime64("1899-12-30", "ns")
+
+# Формат ячеек по типу столбца; None — формат ячеек не меняется
+NUMBER_FORMATS = {
+    'date': 'dd.mm.yyyy',
+    'datetime': 'dd.mm.yyyy hh:mm:ss',
+    'number': None,
+    'general': None,
+}
+
+# Строк в одном присваивании range.value: большие DataFrame пишутся частями,
+# чтобы не держать весь list of lists в памяти и не упираться в пределы COM
+WRITE_CHUNK_ROWS = 20_000
+
+# Типы столбцов для конкретных таблиц, если автоопределение не подходит:
+# {"tDetailAcc": {"DATE_OPEN": "date", "SUM_UAH": "number"}}
+TABLE_COLUMN_TYPES = {}
+
+# Бэкенд записи: по умолчанию живой Excel через COM (xlwings);
+# SR_EXCEL_BACKEND=xlsx — файл SR_XLSX_PATH через openpyxl (см. utils/xlsx_writer.py)
+BACKEND_ENV = "SR_EXCEL_BACKEND"
+
+# Логирование дифференциальной записи: число записанных ячеек (logs/excel_writer.log)
+ENABLE_LOGGING = True
+
+
+def _setup_logger():
+    """Настройка логгера для модуля excel_writer."""
+    if not ENABLE_LOGGING:
+        return logging.getLogger("excel_writer_disabled")
+    logger = logging.getLogger("excel_writer")
+    if logger.handlers:
+        return logger
+    logger.setLevel(logging.INFO)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    log_dir = os.path.abspath(os.path.join(script_dir, '..', 'logs'))
+    os.makedirs(log_dir, exist_ok=True)
+    handler = logging.FileHandler(os.path.join(log_dir, 'excel_writer.log'), encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    return logger
+
+
+logger = _setup_logger()
+
+# Активная сессия записи (см. excel_session); пока она открыта,
+# отдельные функции вставки не переключают состояние Excel
+_active_session = None
+
+
+def headless_backend():
+    """Модуль файлового бэкенда, если выбран SR_EXCEL_BACKEND=xlsx, иначе None."""
+    if os.environ.get(BACKEND_ENV, "").lower() != "xlsx":
+        return None
+    from utils import xlsx_writer
+    return xlsx_writer
+
+
+def target_book():
+    """Книга для записи: книга активной excel_session, иначе вызвавшая скрипт (xw.Book.caller())."""
+    if _active_session is not None and _active_session.book is not None:
+        return _active_session.book
+    return xw.Book.caller()
+
+
+def _app_state(app):
+    """Текущее состояние Excel: обновление экрана, режим вычислений, события."""
+    return app.screen_updating, app.calculation, app.api.EnableEvents
+
+
+def _set_app_state(app, screen_updating, calculation, events):
+    app.screen_updating = screen_updating
+    app.calculation = calculation
+    app.api.EnableEvents = events
+
+
+def _column_kind(series: pd.Series) -> str:
+    """Определяет тип столбца для записи в Excel: date, datetime, number или general."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.dropna()
+        if values.dt.tz is not None:
+            values = values.dt.tz_localize(None)
+        return 'date' if (values == values.dt.normalize()).all() else 'datetime'
+    if pd.api.types.is_bool_dtype(series):
+        return 'general'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'number'
+    if series.dtype == object:
+        first = series.first_valid_index()
+        if first is not None:
+            sample = series.loc[first]
+            if isinstance(sample, Decimal):
+                return 'number'
+            if isinstance(sample, date):
+                return _column_kind(pd.to_datetime(series, errors='coerce'))
+    return 'general'
+
+
+def infer_column_types(df: pd.DataFrame, overrides: dict = None) -> dict:
+    """Типы столбцов DataFrame (см. _column_kind) с учетом явно заданных overrides."""
+    kinds = {col: _column_kind(df[col]) for col in df.columns}
+    kinds.update({col: kind for col, kind in (overrides or {}).items() if col in kinds})
+    return kinds
+
+
+def marshal_frame(df: pd.DataFrame, kinds: dict = None) -> np.ndarray:
+    """
+    Готовит значения DataFrame к записи в Excel целыми столбцами.
+
+    - даты — в последовательные номера Excel (float), формат задается отдельно
+      один раз на столбец (см. _apply_number_formats);
+    - Decimal и прочие числа — в float (целые остаются целыми);
+    - NaN / NaT / None — в None (пустая ячейка).
+
+    Результат — один двумерный массив object, без промежуточного fillna-копирования
+    и без поячеечного преобразования дат и Decimal в xlwings.
+
+    Args:
+        df (pd.DataFrame): данные
+        kinds (dict): типы столбцов (по умолчанию — infer_column_types(df))
+
+    Returns:
+        np.ndarray: массив формы df.shape
+    """
+    kinds = kinds or infer_column_types(df)
+    out = np.empty(df.shape, dtype=object)
+    for j, col in enumerate(df.columns):
+        series = df.iloc[:, j]
+        kind = kinds.get(col, 'general')
+        if kind in ('date', 'datetime'):
+            stamps = pd.to_datetime(series, errors='coerce')
+            if stamps.dt.tz is not None:
+                stamps = stamps.dt.tz_localize(None)
+            stamps = stamps.to_numpy(dtype='datetime64[ns]')
+            mask = np.isnat(stamps)
+            out[:, j] = (stamps - EXCEL_EPOCH) / np.timedelta64(1, 'D')
+        elif kind == 'number' and pd.api.types.is_integer_dtype(series) and not series.hasnans:
+            out[:, j] = series.to_numpy()
+            continue
+        elif kind == 'number':
+            try:
+                # Decimal и числа приводятся к float одним проходом numpy
+                values = series.to_numpy(dtype=float, na_value=np.nan)
+            except (TypeError, ValueError):
+                values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            mask = np.isnan(values)
+            out[:, j] = values
+        else:
+            out[:, j] = series.to_numpy(dtype=object)
+            mask = pd.isna(series).to_numpy()
+        out[mask, j] = None
+    return out
+
+
+def _table_kinds(table_name: str, df: pd.DataFrame, overrides: dict = None) -> dict:
+    """Типы столбцов с учетом TABLE_COLUMN_TYPES для таблицы и явных overrides."""
+    return infer_column_types(df, {**TABLE_COLUMN_TYPES.get(table_name, {}), **(overrides or {})})
+
+
+def _apply_number_formats(sheet, first_row: int, first_col: int, row_count: int, columns, kinds: dict):
+    """
+    Устанавливает NumberFormat по типам столбцов — один вызов на группу
+    соседних столбцов с одинаковым форматом, а не на ячейку.
+    """
+    if row_count <= 0:
+        return
+    formats = [NUMBER_FORMATS.get(kinds.get(col, 'general')) for col in columns]
+    start = 0
+    for j in range(1, len(formats) + 1):
+        if j == len(formats) or formats[j] != formats[start]:
+            if formats[start]:
+                target = sheet.range((first_row, first_col + start)).resize(row_count, j - start)
+                target.api.NumberFormat = formats[start]
+            start = j
+
+
+def _iter_slices(chunks, chunk_rows: int):
+    """Разбивает DataFrame или поток DataFrame на части не длиннее chunk_rows строк."""
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    for chunk in chunks:
+        # Пустая часть тоже передается дальше — по ней известен набор колонок
+        for start in range(0, max(len(chunk), 1), chunk_rows):
+            yield chunk.iloc[start:start + chunk_rows]
+
+
+def _progress_reporter(app, progress):
+    """
+    Возвращает функцию report(written, total) для progress:
+    True — строка состояния Excel, callable — сама функция, None — без отчета.
+    """
+    if progress is True:
+        def report(written, total):
+            suffix = f" из {total}" if total else ""
+            app.status_bar = f"Записано строк: {written}{suffix}"
+        return report
+    return progress
+
+
+def _write_slices(sheet, table_name: str, first_row: int, first_col: int, slices,
+                  column_types: dict = None, report=None, total: int = None):
+    """
+    Пишет части данных одна под другой, начиная с (first_row, first_col).
+
+    Returns:
+        tuple: (число строк, колонки, типы столбцов или None, если данных не было)
+    """
+    columns = []
+    kinds = None
+    written = 0
+    for part in slices:
+        columns = part.columns
+        if part.empty:
+            continue
+        # Типы столбцов определяются по первой непустой части
+        if kinds is None:
+            kinds = _table_kinds(table_name, part, column_types)
+        data_range = sheet.range((first_row + written, first_col)).resize(len(part), len(columns))
+        data_range.value = marshal_frame(part, kinds).tolist()
+        written += len(part)
+        if report:
+            report(written, total)
+
+    # Форматы дат — один раз на столбец по всем записанным строкам
+    if kinds:
+        _apply_number_formats(sheet, first_row, first_col, written, columns, kinds)
+    return written, columns, kinds
+
+
+@contextmanager
+def _suspended(app):
+    """
+    Отключает обновление экрана, автоматические вычисления и события на время блока
+    и восстанавливает прежнее состояние, даже при исключении.
+    Внутри excel_session ничего не делает — состоянием управляет сессия.
+    """
+    if _active_session is not None or app is None:
+        yield
+        return
+    saved = _app_state(app)
+    _set_app_state(app, False, 'manual', False)
+    try:
+        yield
+    finally:
+        _set_app_state(app, *saved)
+
+
+class ExcelSession:
+    """
+    Очередь операций записи в книгу Excel, выполняемых в одной сессии.
+
+    Операции (вставка таблиц, форматирование) накапливаются через paste() / format()
+    и выполняются по порядку в flush() — при выходе из блока excel_session
+    или раньше, если результат нужен внутри блока.
+    """
+
+    def __init__(self, book):
+        self.book = book
+        # Без книги (файловый бэкенд) состоянием Excel управлять не нужно
+        self.app = book.app if book is not None else None
+        self._ops = []
+
+    def paste(self, sheet_name: str, table_name: str, df: pd.DataFrame, smart: bool = True, **options):
+        """Ставит в очередь вставку DataFrame в таблицу (paste_to_excel_smart или paste_to_excel)."""
+        writer = paste_to_excel_smart if smart else paste_to_excel
+        self._ops.append((writer, (sheet_name, table_name, df), options))
+        return self
+
+    def format(self, func, *args, **kwargs):
+        """Ставит в очередь операцию форматирования func(*args, **kwargs)."""
+        self._ops.append((func, args, kwargs))
+        return self
+
+    def flush(self) -> int:
+        """Выполняет накопленные операции; возвращает их число."""
+        ops, self._ops = self._ops, []
+        for func, args, kwargs in ops:
+            func(*args, **kwargs)
+        return len(ops)
+
+
+@contextmanager
+def excel_session(book=None):
+    """
+    Сессия записи в Excel: обновление экрана, вычисления и события отключаются
+    один раз на весь блок, а не на каждую таблицу.
+
+    Пример:
+        with excel_session() as session:
+            session.paste("6SX_ACC", "t6S_TO_CALC", acc_calc)
+            session.format(apply_exclude_formatting, "6SX_ACC", "t6S_EXCLUDE", acc_exclude)
+
+    Операции выполняются при выходе из блока. Прежнее состояние Excel
+    восстанавливается в любом случае, в том числе при исключении.
+    Вложенный excel_session использует внешнюю сессию.
+    С файловым бэкендом (SR_EXCEL_BACKEND=xlsx) книга сохраняется при выходе из блока.
+
+    Args:
+        book (xw.Book): книга Excel (по умолчанию — вызвавшая скрипт); в нее пишут
+                        все операции сессии и функции записи, вызванные внутри блока
+    """
+    global _active_session
+    if _active_session is not None:
+        # Вложенный блок: состояние Excel уже отключено внешней сессией
+        session = _active_session
+        yield session
+        session.flush()
+        return
+
+    headless = headless_backend()
+    if headless:
+        # Файловый бэкенд: операции копятся так же, книга сохраняется один раз в конце
+        session = ExcelSession(None)
+        _active_session = session
+        try:
+            yield session
+            session.flush()
+            headless.save()
+        finally:
+            _active_session = None
+            session._ops.clear()
+        return
+
+    session = ExcelSession(book or xw.Book.caller())
+    saved = _app_state(session.app)
+    _set_app_state(session.app, False, 'manual', False)
+    _active_session = session
+    try:
+        yield session
+        session.flush()
+    finally:
+        _active_session = None
+        session._ops.clear()
+        _set_app_state(session.app, *saved)
+
+
+def paste_to_excel(sheet_name: str, table_name: str, df: pd.DataFrame, column_types: dict = None,
+                   diff: bool = False):
     """
     Вставляет данные из DataFrame в существующую таблицу Excel.
     
@@ -10,82 +355,402 @@ def paste_to_excel(sheet_name: str, table_name: str, df: pd.DataFrame):
         sheet_name (str): Имя листа Excel
         table_name (str): Имя таблицы Excel
         df (pd.DataFrame): DataFrame с данными для вставки
+        column_types (dict): явные типы столбцов (дополняют TABLE_COLUMN_TYPES)
+        diff (bool): записать только изменившиеся ячейки (см. paste_to_excel_diff)
+
+    Returns:
+        int | None: при diff=True — число записанных или очищенных ячеек
     """
+    if diff:
+        return paste_to_excel_diff(sheet_name, table_name, df, column_types)
+    headless = headless_backend()
+    if headless:
+        return headless.paste_to_excel(sheet_name, table_name, df, column_types)
+
+    # Большие DataFrame пишутся частями по WRITE_CHUNK_ROWS строк
+    if len(df) > WRITE_CHUNK_ROWS:
+        paste_to_excel_chunks(sheet_name, table_name, df, column_types)
+        return
+
     # Получаем активную книгу Excel
-    wb = xw.Book.caller()
+    wb = target_book()
     app = wb.app
     
-    # Отключаем обновление экрана и автоматические вычисления для ускорения работы
-    app.screen_updating = False
-    app.calculation = 'manual'
-    
-    # Получаем объекты листа и таблицы
+    # Отключаем обновление экрана, вычисления и события (вне excel_session)
+    with _suspended(app):
+        # Получаем объекты листа и таблицы
+        sheet = wb.sheets[sheet_name]
+        table = sheet.api.ListObjects(table_name)
+
+        # Очищаем существующие данные в таблице, если они есть
+        if table.DataBodyRange:
+            table.DataBodyRange.ClearContents()
+
+        # Определяем начальную позицию для вставки (строка после заголовка, первый столбец таблицы)
+        start_row = table.HeaderRowRange.Row + 1
+        start_col = table.Range.Column
+
+        # Создаем диапазон для новых данных и вставляем их
+        # Значения готовятся целыми столбцами (даты — номерами Excel, NaN — пустыми ячейками)
+        if not df.empty:
+            kinds = _table_kinds(table_name, df, column_types)
+            data_range = sheet.range((start_row, start_col)).resize(len(df), len(df.columns))
+            data_range.value = marshal_frame(df, kinds).tolist()
+            _apply_number_formats(sheet, start_row, start_col, len(df), df.columns, kinds)
+
+        # Изменяем размер таблицы, чтобы включить все новые данные
+        # +1 в размере учитывает строку заголовка (пустая таблица сохраняет одну строку тела)
+        col_count = len(df.columns) or table.ListColumns.Count
+        new_range = sheet.range((table.HeaderRowRange.Row, start_col)).resize(max(len(df), 1) + 1, col_count)
+        table.Resize(new_range.api)
+
+
+def _changed_blocks(changed: np.ndarray):
+    """
+    Группирует изменившиеся строки в непрерывные блоки.
+
+    Args:
+        changed (np.ndarray): булева матрица строк x столбцов (True — ячейка изменилась)
+
+    Returns:
+        list: (первая строка, конец строк, первый столбец, конец столбцов) — прямоугольники для записи
+    """
+    rows = np.flatnonzero(changed.any(axis=1))
+    if not rows.size:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) > 1)
+    starts = np.r_[rows[0], rows[breaks + 1]]
+    ends = np.r_[rows[breaks], rows[-1]] + 1
+    blocks = []
+    for start, end in zip(starts, ends):
+        # В пределах блока пишем только столбцы от первого до последнего изменившегося
+        cols = np.flatnonzero(changed[start:end].any(axis=0))
+        blocks.append((int(start), int(end), int(cols[0]), int(cols[-1]) + 1))
+    return blocks
+
+
+def paste_to_excel_diff(sheet_name: str, table_name: str, df: pd.DataFrame, column_types: dict = None) -> int:
+    """
+    Обновляет таблицу Excel, записывая только изменившиеся ячейки.
+
+    Текущее тело таблицы читается один раз (Value2 — даты как номера Excel,
+    в том же виде, что готовит marshal_frame), сравнение выполняется в NumPy,
+    записываются только прямоугольные блоки изменившихся строк. Размер таблицы
+    меняется, только если изменилось число строк. Так зависимые формулы
+    пересчитываются лишь от реально изменившихся ячеек.
+
+    Если набор столбцов таблицы не совпадает с DataFrame или таблица пуста,
+    выполняется обычная полная запись (paste_to_excel).
+
+    Args:
+        sheet_name (str): Имя листа Excel
+        table_name (str): Имя таблицы Excel
+        df (pd.DataFrame): DataFrame с данными для вставки
+        column_types (dict): явные типы столбцов (дополняют TABLE_COLUMN_TYPES)
+
+    Returns:
+        int: число записанных или очищенных ячеек
+    """
+    headless = headless_backend()
+    if headless:
+        touched = headless.paste_to_excel_diff(sheet_name, table_name, df, column_types)
+    else:
+        touched = _paste_to_excel_diff_com(sheet_name, table_name, df, column_types)
+    logger.info("%s: записано ячеек %s из %s", table_name, touched, len(df) * len(df.columns))
+    return touched
+
+
+def _paste_to_excel_diff_com(sheet_name: str, table_name: str, df: pd.DataFrame, column_types: dict = None) -> int:
+    wb = target_book()
+    app = wb.app
     sheet = wb.sheets[sheet_name]
     table = sheet.api.ListObjects(table_name)
-    
-    # Очищаем существующие данные в таблице, если они есть
-    if table.DataBodyRange:
-        table.DataBodyRange.ClearContents()
-    
-    # Определяем начальную позицию для вставки (строка после заголовка, первый столбец таблицы)
-    start_row = table.HeaderRowRange.Row + 1
+
+    col_count = len(df.columns)
+    current_rows = table.ListRows.Count
+    if not current_rows or not len(df) or table.ListColumns.Count != col_count:
+        paste_to_excel(sheet_name, table_name, df, column_types)
+        return len(df) * col_count
+
+    with _suspended(app):
+        start_row = table.HeaderRowRange.Row + 1
+        start_col = table.Range.Column
+
+        # Текущее содержимое — одним обращением к Excel
+        raw = table.DataBodyRange.Value2
+        if not isinstance(raw, tuple):
+            raw = ((raw,),)
+        current = np.empty((current_rows, col_count), dtype=object)
+        current[:, :] = raw
+
+        kinds = _table_kinds(table_name, df, column_types)
+        new = marshal_frame(df, kinds)
+        overlap = min(current_rows, len(df))
+        touched = 0
+
+        # Изменившиеся ячейки в общих строках
+        changed = current[:overlap] != new[:overlap]
+        for r0, r1, c0, c1 in _changed_blocks(changed):
+            target = sheet.range((start_row + r0, start_col + c0)).resize(r1 - r0, c1 - c0)
+            target.value = new[r0:r1, c0:c1].tolist()
+            touched += (r1 - r0) * (c1 - c0)
+
+        if len(df) > current_rows:
+            # Новые строки дописываются под таблицей, таблица расширяется на них
+            added = _iter_slices(df.iloc[current_rows:], WRITE_CHUNK_ROWS)
+            written, _, _ = _write_slices(sheet, table_name, start_row + current_rows, start_col, added, column_types)
+            touched += written * col_count
+        elif len(df) < current_rows:
+            # Лишние строки очищаются, таблица сокращается
+            surplus = sheet.range((start_row + len(df), start_col)).resize(current_rows - len(df), col_count)
+            surplus.api.ClearContents()
+            touched += (current_rows - len(df)) * col_count
+
+        if len(df) != current_rows:
+            new_range = sheet.range((start_row - 1, start_col)).resize(len(df) + 1, col_count)
+            table.Resize(new_range.api)
+
+    return touched
+
+
+# Константы Excel для Range.Insert / Range.Delete
+XL_SHIFT_DOWN = -4121
+XL_SHIFT_UP = -4162
+
+
+def _resize_table_rows(sheet, table, row_count: int):
+    """
+    Меняет число строк тела таблицы (ListObject) одной операцией.
+
+    Вставляются или удаляются только ячейки в столбцах таблицы со сдвигом
+    вниз/вверх — так же, как это делают ListRows.Add / ListRows.Delete,
+    поэтому таблицы, размещенные под ней, сдвигаются вместе с данными.
+    Пустая таблица в Excel все равно занимает одну строку тела.
+    """
+    header_row = table.HeaderRowRange.Row
     start_col = table.Range.Column
-    
-    # Создаем диапазон для новых данных и вставляем их
-    # Заменяем NaN на пустые строки для корректного отображения
-    data_range = sheet.range((start_row, start_col)).resize(len(df), len(df.columns))
-    data_range.value = df.fillna('').values.tolist()
-    
-    # Изменяем размер таблицы, чтобы включить все новые данные
-    # +1 в размере учитывает строку заголовка
-    new_range = sheet.range((table.HeaderRowRange.Row, start_col)).resize(len(df) + 1, len(df.columns))
-    table.Resize(new_range.api)
-    
-    # Возвращаем настройки Excel в исходное состояние
-    app.calculation = 'automatic'
-    app.screen_updating = True
+    col_count = table.Range.Columns.Count
+
+    # Фактически занятые телом строки (у пустой таблицы — одна строка вставки)
+    current = max(table.ListRows.Count, 1)
+    target = max(row_count, 1)
 
+    if target > current:
+        # Вставляем недостающие ячейки сразу под таблицей и расширяем таблицу на них
+        below = sheet.range((header_row + 1 + current, start_col)).resize(target - current, col_count)
+        below.api.Insert(Shift=XL_SHIFT_DOWN)
+        new_range = sheet.range((header_row, start_col)).resize(target + 1, col_count)
+        table.Resize(new_range.api)
+    elif target < current:
+        # Удаляем лишние строки тела снизу одним диапазоном
+        surplus = sheet.range((header_row + 1 + target, start_col)).resize(current - target, col_count)
+        surplus.api.Delete(Shift=XL_SHIFT_UP)
 
-def paste_to_excel_smart(sheet_name: str, table_name: str, df: pd.DataFrame):
+    if row_count == 0 and table.DataBodyRange:
+        table.DataBodyRange.ClearContents()
+
+
+def paste_to_excel_smart(sheet_name: str, table_name: str, df: pd.DataFrame, column_types: dict = None):
     """
     Старый аналог процедуры paste_to_excel
     Данная версия корректно работает с smart-таблицами размещенных одна под другой
+
+    Размер таблицы подгоняется под DataFrame одной вставкой/удалением диапазона
+    (см. _resize_table_rows), а не построчными ListRows.Add / Delete.
+    Значения и форматы дат готовятся по столбцам (см. marshal_frame, column_types
+    как в paste_to_excel).
     """
+    headless = headless_backend()
+    if headless:
+        return headless.paste_to_excel_smart(sheet_name, table_name, df, column_types)
     # Получаем активную книгу Excel, вызвавшую скрипт
-    wb = xw.Book.caller()
+    wb = target_book()
+    app = wb.app
 
-    # Получаем нужный лист по имени
-    sheet = wb.sheets[sheet_name]
+    # Отключаем обновление экрана, вычисления и события (вне excel_session)
+    with _suspended(app):
+        # Получаем нужный лист и таблицу Excel (ListObject) по имени
+        sheet = wb.sheets[sheet_name]
+        table = sheet.api.ListObjects(table_name)
 
-    # Получаем таблицу Excel (ListObject) по имени
+        # Количество строк и столбцов в переданном DataFrame
+        new_row_count = df.shape[0]
+        col_count = df.shape[1]
+
+        # Подгоняем число строк таблицы под DataFrame
+        _resize_table_rows(sheet, table, new_row_count)
+
+        # Вставляем значения из DataFrame в ячейки под заголовками таблицы
+        # (частями по WRITE_CHUNK_ROWS строк — таблица уже нужного размера)
+        if new_row_count and col_count:
+            _write_slices(sheet, table_name, table.HeaderRowRange.Row + 1, table.Range.Column,
+                          _iter_slices(df, WRITE_CHUNK_ROWS), column_types)
+
+
+def _paste_to_excel_smart_loop(sheet_name: str, table_name: str, df: pd.DataFrame):
+    """Прежняя построчная реализация paste_to_excel_smart (для сравнения в бенчмарке)."""
+    wb = target_book()
+    sheet = wb.sheets[sheet_name]
     table = sheet.api.ListObjects(table_name)
 
-    # Определяем текущее количество строк в таблице
     current_row_count = table.ListRows.Count
-
-    # Количество строк и столбцов в переданном DataFrame
     new_row_count = df.shape[0]
     col_count = df.shape[1]
 
-    # Если в DataFrame больше строк, чем в таблице —
-    # добавляем недостающие строки в таблицу Excel
     if new_row_count > current_row_count:
         for _ in range(new_row_count - current_row_count):
             table.ListRows.Add()
 
-    # Определяем начальную ячейку для вставки данных —
-    # это первая ячейка под заголовками таблицы
     dest_range = sheet.range((table.HeaderRowRange.Row + 1, table.Range.Column))
-
-    # Определяем диапазон нужного размера (по числу строк и столбцов DataFrame)
     dest_range = dest_range.resize(new_row_count, col_count)
-
-    # Вставляем значения из DataFrame как список списков (list of lists)
     dest_range.value = df.values.tolist()
 
-    # Если в DataFrame меньше строк, чем в текущей таблице —
-    # удаляем лишние строки таблицы снизу
     if new_row_count < current_row_count:
         for _ in range(current_row_count - new_row_count):
             table.ListRows(new_row_count + 1).Delete()
 
+
+def paste_to_excel_chunks(sheet_name: str, table_name: str, chunks, column_types: dict = None,
+                          chunk_rows: int = WRITE_CHUNK_ROWS, progress=None):
+    """
+    Вставляет в таблицу Excel большой DataFrame или результат, поступающий частями
+    (например, из query_iter).
+
+    Данные пишутся блоками не более chunk_rows строк, каждый сразу под предыдущим,
+    поэтому в памяти одновременно находится только один блок list of lists.
+    Размер таблицы меняется один раз в конце.
+
+    Args:
+        sheet_name (str): Имя листа Excel
+        table_name (str): Имя таблицы Excel
+        chunks (pd.DataFrame | Iterable[pd.DataFrame]): данные или части данных с одинаковым набором колонок
+        column_types (dict): явные типы столбцов (дополняют TABLE_COLUMN_TYPES)
+        chunk_rows (int): строк в одном блоке записи
+        progress: True — число записанных строк в строке состояния Excel,
+            callable(written, total) — своя функция отчета, None — без отчета
+
+    Returns:
+        int: число записанных строк
+    """
+    headless = headless_backend()
+    if headless:
+        return headless.paste_to_excel_chunks(sheet_name, table_name, chunks, column_types, chunk_rows, progress)
+    # Получаем активную книгу Excel
+    wb = target_book()
+    app = wb.app
+    total = len(chunks) if isinstance(chunks, pd.DataFrame) else None
+    report = _progress_reporter(app, progress)
+
+    # Отключаем обновление экрана, вычисления и события (вне excel_session)
+    with _suspended(app):
+        try:
+            # Получаем объекты листа и таблицы
+            sheet = wb.sheets[sheet_name]
+            table = sheet.api.ListObjects(table_name)
+
+            # Очищаем существующие данные в таблице, если они есть
+            if table.DataBodyRange:
+                table.DataBodyRange.ClearContents()
+
+            header_row = table.HeaderRowRange.Row
+            start_col = table.Range.Column
+            written, columns, _ = _write_slices(sheet, table_name, header_row + 1, start_col,
+                                                _iter_slices(chunks, chunk_rows), column_types, report, total)
+
+            # Изменяем размер таблицы один раз: заголовок + записанные строки (минимум одна строка тела)
+            col_count = len(columns) or table.ListColumns.Count
+            new_range = sheet.range((header_row, start_col)).resize(max(written, 1) + 1, col_count)
+            table.Resize(new_range.api)
+        finally:
+            if progress is True:
+                # Возвращаем стандартную строку состояния Excel
+                app.status_bar = False
+
+    return written
+
+
+def _bench_smart(rows: int = 5000, cols: int = 10):
+    """
+    Сравнивает построчную и пакетную подгонку размера smart-таблицы.
+
+    Создает новую книгу с двумя таблицами одна под другой, заполняет верхнюю
+    rows строками, затем сокращает до 10 строк, и проверяет, что нижняя
+    таблица не пострадала. Требует установленного Excel.
+    """
+    import time
+
+    wb = xw.Book()
+    wb.set_mock_caller()
+    sheet = wb.sheets[0]
+    sheet.name = "BENCH"
+    headers = [f"C{i}" for i in range(cols)]
+    sheet.range("A1").value = headers
+    sheet.range("A4").value = headers
+    sheet.range("A5").value = ["lower"] * cols
+    sheet.api.ListObjects.Add(1, sheet.range((1, 1), (2, cols)).api, None, 1).Name = "tTop"
+    sheet.api.ListObjects.Add(1, sheet.range((4, 1), (5, cols)).api, None, 1).Name = "tLower"
+
+    big = pd.DataFrame([[r * cols + c for c in range(cols)] for r in range(rows)], columns=headers)
+    small = big.head(10)
+
+    for label, func in (("loop", _paste_to_excel_smart_loop), ("bulk", paste_to_excel_smart)):
+        start = time.perf_counter()
+        func("BENCH", "tTop", big)
+        grow = time.perf_counter() - start
+        start = time.perf_counter()
+        func("BENCH", "tTop", small)
+        shrink = time.perf_counter() - start
+        lower = sheet.api.ListObjects("tLower").DataBodyRange.Cells(1, 1).Value
+        print(f"{label}: рост до {rows} строк {grow:.2f} c, сокращение до 10 строк {shrink:.2f} c, "
+              f"нижняя таблица: {lower!r}")
+
+    wb.close()
+
+
+def _bench_marshal(rows: int = 100_000, cols: int = 20):
+    """
+    Сравнивает подготовку значений: прежний df.fillna('').values.tolist()
+    и marshal_frame(...).tolist() на синтетическом DataFrame rows x cols
+    (даты, Decimal, числа с NaN, строки). Excel не требуется.
+    """
+    import time
+
+    rng = np.random.default_rng(0)
+    data = {}
+    for j in range(cols):
+        kind = j % 4
+        if kind == 0:
+            dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 700, rows), unit="D")
+            data[f"D{j}"] = dates.where(rng.random(rows) > 0.05)
+        elif kind == 1:
+            data[f"M{j}"] = [Decimal(int(v)) / 100 for v in rng.integers(-10**8, 10**8, rows)]
+        elif kind == 2:
+            values = rng.normal(0, 1e6, rows)
+            values[rng.random(rows) < 0.1] = np.nan
+            data[f"F{j}"] = values
+        else:
+            data[f"S{j}"] = pd.Series(rng.integers(0, 1000, rows)).map("ACC{:04d}".format)
+    df = pd.DataFrame(data)
+
+    start = time.perf_counter()
+    old = df.fillna('').values.tolist()
+    old_time = time.perf_counter() - start
+    # Ячейки, которые xlwings затем преобразует по одной (даты и Decimal)
+    per_cell = sum(isinstance(v, (date, Decimal)) for row in old for v in row)
+
+    start = time.perf_counter()
+    new = marshal_frame(df).tolist()
+    new_time = time.perf_counter() - start
+
+    print(f"{rows} x {cols}: fillna+tolist {old_time:.2f} c (поячеечных преобразований в xlwings: {per_cell}), "
+          f"marshal_frame {new_time:.2f} c (0)")
+    return old, new
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m utils.excel_writer smart 5000 | marshal 100000 20
+    mode = sys.argv[1] if len(sys.argv) > 1 else "marshal"
+    args = [int(arg) for arg in sys.argv[2:]]
+    {"smart": _bench_smart, "marshal": _bench_marshal}[mode](*args)
@@ -0,0 +1,986 @@
+"""
+Заменитель книги xlwings для запуска и профилирования конвейера без Excel (Linux, CI).
+
+Реализует используемое проектом подмножество xlwings / COM:
+- книга: sheets, names[...].refers_to_range, app (screen_updating, calculation,
+  status_bar, api.EnableEvents, api.Evaluate);
+- лист: range(...), used_range, tables[...], pictures, api.ListObjects(...), api.Range(...);
+- диапазон: value, options(pd.DataFrame, header=1, index=False), resize, offset, end,
+  api.Value2 / Value / Font / NumberFormat / Insert / Delete / ClearContents;
+- ListObject: HeaderRowRange, Range, DataBodyRange, ListRows, ListColumns, Resize.
+
+Данные хранятся в памяти; книгу можно собрать из DataFrame (add_table, set_name)
+или загрузить значения, таблицы и имена из .xlsx/.xlsm (FakeBook.from_xlsx).
+Каждое обращение, которое в Excel было бы вызовом COM, увеличивает
+book.com_calls — по нему сравниваются оптимизации записи и форматирования.
+
+Пример:
+    book = FakeBook.from_xlsx("SR.xlsm")
+    with installed(book):            # xw.Book.caller() возвращает book
+        main.run_pay_6sx()
+    print(book.com_calls)
+"""
+import re
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import xlwings as xw
+
+from utils.excel_format import column_letter
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+XL_SHIFT_DOWN = -4121
+XL_SHIFT_UP = -4162
+XL_ERR_NAME = -2146826259    # #NAME? в значении, которое возвращает COM
+
+_CELL = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+_BLANK_NAME = re.compile(r"ISBLANK\((\w+)\)")
+
+
+# =============================================================================
+# Адреса
+# =============================================================================
+
+def column_index(letters: str) -> int:
+    """Буквенное обозначение столбца в номер (A = 1)."""
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index
+
+
+def parse_address(address: str):
+    """'A1', '$A$1:$C$5' или 'A2:E5,A9:E12' в список (r1, c1, r2, c2)."""
+    areas = []
+    for area in address.split(","):
+        corners = []
+        for part in area.split("!")[-1].split(":"):
+            match = _CELL.match(part.strip())
+            if not match:
+                raise ValueError(f"Неподдерживаемый адрес: {address}")
+            corners.append((int(match.group(2)), column_index(match.group(1))))
+        (r1, c1), (r2, c2) = corners[0], corners[-1]
+        areas.append((min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)))
+    return areas
+
+
+def format_address(r1: int, c1: int, r2: int, c2: int) -> str:
+    """Адрес в стиле Excel: $A$1 или $A$1:$C$5."""
+    first = f"${column_letter(c1)}${r1}"
+    if (r1, c1) == (r2, c2):
+        return first
+    return f"{first}:${column_letter(c2)}${r2}"
+
+
+def _to_serial(value):
+    """Дата как номер Excel (так ее возвращает Value2)."""
+    if isinstance(value, datetime):
+        return (value - EXCEL_EPOCH) / timedelta(days=1)
+    if isinstance(value, date):
+        return float((value - EXCEL_EPOCH.date()).days)
+    return value
+
+
+def _is_date_format(fmt) -> bool:
+    return bool(fmt) and ("yy" in fmt.lower() or "dd" in fmt.lower())
+
+
+def _normalize_value(value):
+    """Значение, записываемое в ячейку, в виде, который хранит Excel."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.to_pydatetime()
+    return value
+
+
+# =============================================================================
+# Книга и приложение
+# =============================================================================
+
+class _AppApi:
+    def __init__(self, book):
+        object.__setattr__(self, "_book", book)
+        object.__setattr__(self, "_state", {"EnableEvents": True})
+
+    def __getattr__(self, name):
+        if name not in self._state:
+            raise AttributeError(name)
+        self._book.tick()
+        return self._state[name]
+
+    def __setattr__(self, name, value):
+        self._book.tick()
+        self._state[name] = value
+
+    def Evaluate(self, expression: str):
+        """Application.Evaluate: имена ищутся в книге приложения (в Excel — в активной книге)."""
+        return _evaluate(self._book, expression)
+
+
+def _evaluate(book, expression: str):
+    """
+    Evaluate в объеме utils.run_context: выражение
+    CHOOSE({1,2,...},IF(ISBLANK(имя),"",имя),...) возвращает строку значений имен книги book.
+    Как и в Excel, даты в результате вычисления — номера (Double), а не VT_DATE.
+    """
+    book.tick()
+    values = []
+    for name in _BLANK_NAME.findall(expression):
+        if name not in book.names:
+            values.append(XL_ERR_NAME)
+            continue
+        defined = book.names._names[name]
+        (row, col, _, _), = parse_address(defined._address)
+        value = book._sheets[defined._sheet_name]._get(row, col)
+        values.append("" if value is None else _to_serial(value))
+    return (tuple(values),)
+
+
+class FakeApp:
+    """Приложение Excel: состояние обновления экрана, вычислений и строки состояния."""
+
+    def __init__(self, book):
+        self._book = book
+        self._screen_updating = True
+        self._calculation = "automatic"
+        self._status_bar = False
+        self.api = _AppApi(book)
+
+    @property
+    def screen_updating(self):
+        self._book.tick()
+        return self._screen_updating
+
+    @screen_updating.setter
+    def screen_updating(self, value):
+        self._book.tick()
+        self._screen_updating = value
+
+    @property
+    def calculation(self):
+        self._book.tick()
+        return self._calculation
+
+    @calculation.setter
+    def calculation(self, value):
+        self._book.tick()
+        self._calculation = value
+
+    @property
+    def status_bar(self):
+        self._book.tick()
+        return self._status_bar
+
+    @status_bar.setter
+    def status_bar(self, value):
+        self._book.tick()
+        self._status_bar = value
+
+
+class _Sheets:
+    def __init__(self, book):
+        self._book = book
+
+    def __getitem__(self, key):
+        self._book.tick()
+        if isinstance(key, int):
+            return list(self._book._sheets.values())[key]
+        return self._book._sheets[key]
+
+    def __iter__(self):
+        return iter(list(self._book._sheets.values()))
+
+    def __len__(self):
+        return len(self._book._sheets)
+
+
+class _Name:
+    def __init__(self, book, name, sheet_name, address):
+        self._book = book
+        self.name = name
+        self._sheet_name = sheet_name
+        self._address = address
+
+    @property
+    def refers_to(self):
+        return f"='{self._sheet_name}'!{self._address}"
+
+    @property
+    def refers_to_range(self):
+        self._book.tick()
+        return self._book._sheets[self._sheet_name].range(self._address)
+
+
+class _Names:
+    def __init__(self, book):
+        self._book = book
+        self._names = {}
+
+    def __getitem__(self, name):
+        self._book.tick()
+        return self._names[name]
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(list(self._names.values()))
+
+    def __len__(self):
+        return len(self._names)
+
+
+class FakeBook:
+    """Книга в памяти с интерфейсом xlwings.Book (в объеме, используемом проектом)."""
+
+    def __init__(self, name: str = "FakeBook.xlsm"):
+        self.name = name
+        self.fullname = name
+        self.com_calls = 0
+        self._sheets = {}
+        self.app = FakeApp(self)
+        self.sheets = _Sheets(self)
+        self.names = _Names(self)
+
+    # --- Счетчик обращений ---------------------------------------------------
+
+    def tick(self, count: int = 1):
+        """Учитывает обращение, которое в Excel было бы вызовом COM."""
+        self.com_calls += count
+
+    def reset_counter(self) -> int:
+        """Обнуляет счетчик и возвращает прежнее значение."""
+        calls, self.com_calls = self.com_calls, 0
+        return calls
+
+    # --- Построение книги ----------------------------------------------------
+
+    def add_sheet(self, name: str) -> "FakeSheet":
+        if name not in self._sheets:
+            self._sheets[name] = FakeSheet(self, name)
+        return self._sheets[name]
+
+    def add_table(self, sheet_name: str, table_name: str, df: pd.DataFrame, top_left: str = "A1") -> "ListObject":
+        """Создает именованную таблицу с заголовками и данными df."""
+        sheet = self.add_sheet(sheet_name)
+        (row, col, _, _), = parse_address(top_left)
+        for j, header in enumerate(df.columns):
+            sheet._set(row, col + j, str(header))
+        for i, values in enumerate(df.itertuples(index=False), start=1):
+            for j, value in enumerate(values):
+                sheet._set(row + i, col + j, value)
+        return sheet._add_list_object(table_name, row, col, col + len(df.columns) - 1, len(df))
+
+    def set_name(self, name: str, value=None, sheet_name: str = "sys", address: str = None):
+        """Создает именованную ячейку (по умолчанию — в первой свободной строке столбца A листа sys)."""
+        sheet = self.add_sheet(sheet_name)
+        if address is None:
+            used = [r for (r, c) in sheet.cells if c == 1]
+            address = f"$A${max(used, default=0) + 1}"
+        (row, col, _, _), = parse_address(address)
+        sheet._set(row, col, value)
+        self.names._names[name] = _Name(self, name, sheet_name, format_address(row, col, row, col))
+
+    @classmethod
+    def from_xlsx(cls, path: str) -> "FakeBook":
+        """Загружает значения (результаты формул), форматы, таблицы и имена из файла Excel."""
+        import openpyxl
+        from openpyxl.utils import range_boundaries
+
+        workbook = openpyxl.load_workbook(path, data_only=True)
+        book = cls(name=path)
+        for ws in workbook.worksheets:
+            sheet = book.add_sheet(ws.title)
+            for row in ws.iter_rows():
+                for cell in row:
+                    if cell.value is not None:
+                        sheet._set(cell.row, cell.column, cell.value)
+                        if cell.number_format != "General":
+                            sheet.formats[(cell.row, cell.column)] = cell.number_format
+            for table in ws.tables.values():
+                c1, r1, c2, r2 = range_boundaries(table.ref)
+                sheet._add_list_object(table.displayName, r1, c1, c2, r2 - r1)
+        for name, defined in workbook.defined_names.items():
+            for sheet_title, coord in defined.destinations:
+                book.names._names[name] = _Name(book, name, sheet_title, coord)
+                break
+        return book
+
+    # --- Совместимость с xlwings.Book ----------------------------------------
+
+    def set_mock_caller(self):
+        pass
+
+    def save(self, path=None):
+        self.tick()
+
+    def close(self):
+        self.tick()
+
+
+@contextmanager
+def installed(book: FakeBook):
+    """Подменяет xw.Book.caller(), чтобы код проекта работал с book."""
+    original = xw.Book.__dict__["caller"]
+    xw.Book.caller = staticmethod(lambda: book)
+    try:
+        yield book
+    finally:
+        xw.Book.caller = original
+
+
+# =============================================================================
+# Лист
+# =============================================================================
+
+class _ListObjectsApi:
+    def __init__(self, sheet):
+        self._sheet = sheet
+
+    def __call__(self, name):
+        self._sheet.book.tick()
+        return self._sheet._list_objects[name]
+
+    @property
+    def Count(self):
+        self._sheet.book.tick()
+        return len(self._sheet._list_objects)
+
+    def Add(self, source_type, source, link_source=None, has_headers=1):
+        self._sheet.book.tick()
+        r1, c1, r2, c2 = source.bounds
+        name = f"Table{sum(len(s._list_objects) for s in self._sheet.book._sheets.values()) + 1}"
+        return self._sheet._add_list_object(name, r1, c1, c2, r2 - r1)
+
+
+class _SheetApi:
+    def __init__(self, sheet):
+        self._sheet = sheet
+        self.ListObjects = _ListObjectsApi(sheet)
+
+    @property
+    def Name(self):
+        return self._sheet.name
+
+    def Range(self, address: str):
+        self._sheet.book.tick()
+        return RangeApi(self._sheet, parse_address(address))
+
+    def Evaluate(self, expression: str):
+        """Worksheet.Evaluate: имена ищутся в книге этого листа."""
+        return _evaluate(self._sheet.book, expression)
+
+
+class _Tables:
+    def __init__(self, sheet):
+        self._sheet = sheet
+
+    def __getitem__(self, name):
+        self._sheet.book.tick()
+        return Table(self._sheet._list_objects[name])
+
+    def __iter__(self):
+        return iter([Table(lo) for lo in self._sheet._list_objects.values()])
+
+
+class Picture:
+    def __init__(self, pictures, name, path, left, top):
+        self._pictures = pictures
+        self.name = name
+        self.path = path
+        self.left = left
+        self.top = top
+        self.width = None
+        self.height = None
+
+    def delete(self):
+        self._pictures._book.tick()
+        self._pictures._items.remove(self)
+
+
+class _Pictures:
+    def __init__(self, book):
+        self._book = book
+        self._items = []
+
+    def __iter__(self):
+        self._book.tick()
+        return iter(list(self._items))
+
+    def add(self, path, name=None, update=False, left=0, top=0, **kwargs):
+        self._book.tick()
+        name = name or f"Picture {len(self._items) + 1}"
+        if update:
+            self._items = [pic for pic in self._items if pic.name != name]
+        picture = Picture(self, name, path, left, top)
+        self._items.append(picture)
+        return picture
+
+
+class FakeSheet:
+    """Лист: значения и форматы ячеек в словарях {(строка, столбец): ...}."""
+
+    def __init__(self, book, name):
+        self.book = book
+        self.name = name
+        self.cells = {}
+        self.formats = {}
+        self.fonts = {}
+        self._list_objects = {}
+        self.api = _SheetApi(self)
+        self.tables = _Tables(self)
+        self.pictures = _Pictures(book)
+
+    # --- Интерфейс xlwings ---------------------------------------------------
+
+    def range(self, cell1, cell2=None) -> "Range":
+        self.book.tick()
+        if isinstance(cell1, str):
+            (r1, c1, r2, c2), = parse_address(cell1)
+        else:
+            r1, c1 = cell1
+            r2, c2 = cell2 if cell2 is not None else cell1
+        if cell2 is not None and isinstance(cell2, str):
+            (_, _, r2, c2), = parse_address(cell2)
+        return Range(self, r1, c1, r2, c2)
+
+    @property
+    def used_range(self) -> "Range":
+        self.book.tick()
+        if not self.cells:
+            return Range(self, 1, 1, 1, 1)
+        rows = [r for r, _ in self.cells]
+        cols = [c for _, c in self.cells]
+        return Range(self, 1, 1, max(rows), max(cols))
+
+    # --- Данные --------------------------------------------------------------
+
+    def _get(self, row, col):
+        return self.cells.get((row, col))
+
+    def _set(self, row, col, value):
+        value = _normalize_value(value)
+        if value is None:
+            self.cells.pop((row, col), None)
+        else:
+            self.cells[(row, col)] = value
+
+    def _add_list_object(self, name, header_row, c1, c2, body_rows):
+        list_object = ListObject(self, name, header_row, c1, c2, body_rows)
+        self._list_objects[name] = list_object
+        return list_object
+
+    def _shift(self, r1, c1, c2, delta):
+        """Сдвигает ячейки столбцов c1..c2 начиная со строки r1 на delta строк."""
+        for store in (self.cells, self.formats, self.fonts):
+            moved = {}
+            for (row, col), value in list(store.items()):
+                if c1 <= col <= c2 and row >= r1:
+                    del store[(row, col)]
+                    moved[(row + delta, col)] = value
+            store.update(moved)
+
+    def insert_cells(self, r1, c1, r2, c2):
+        """Range.Insert(Shift=xlShiftDown): вставка ячеек со сдвигом вниз."""
+        count = r2 - r1 + 1
+        self._shift(r1, c1, c2, count)
+        for list_object in self._list_objects.values():
+            if not (c1 <= list_object.c1 and list_object.c2 <= c2):
+                continue
+            if list_object.header_row >= r1:
+                list_object.header_row += count
+            elif r1 <= list_object.last_row:
+                # Вставка внутри тела таблицы расширяет ее
+                list_object.body_rows = max(list_object.body_rows, 1) + count
+
+    def delete_cells(self, r1, c1, r2, c2):
+        """Range.Delete(Shift=xlShiftUp): удаление ячеек со сдвигом вверх."""
+        count = r2 - r1 + 1
+        for store in (self.cells, self.formats, self.fonts):
+            for key in [k for k in store if r1 <= k[0] <= r2 and c1 <= k[1] <= c2]:
+                del store[key]
+        self._shift(r2 + 1, c1, c2, -count)
+        for list_object in self._list_objects.values():
+            if not (c1 <= list_object.c1 and list_object.c2 <= c2):
+                continue
+            if list_object.header_row > r2:
+                list_object.header_row -= count
+            elif list_object.header_row < r1 <= list_object.last_row:
+                list_object.body_rows = max(list_object.body_rows - count, 0)
+
+
+# =============================================================================
+# Диапазоны
+# =============================================================================
+
+class _Count:
+    def __init__(self, book, value):
+        self._book = book
+        self._value = value
+
+    @property
+    def Count(self):
+        self._book.tick()
+        return self._value
+
+
+class _Font:
+    def __init__(self, range_api):
+        object.__setattr__(self, "_range", range_api)
+
+    def __setattr__(self, name, value):
+        self._range.sheet.book.tick()
+        for row, col in self._range.cells():
+            self._range.sheet.fonts.setdefault((row, col), {})[name] = value
+
+    def __getattr__(self, name):
+        self._range.sheet.book.tick()
+        (r1, c1, _, _) = self._range.areas[0]
+        return self._range.sheet.fonts.get((r1, c1), {}).get(name)
+
+
+class RangeApi:
+    """COM-объект Range (Value2, Font, NumberFormat, Insert/Delete, ...)."""
+
+    def __init__(self, sheet, areas):
+        self.sheet = sheet
+        self.areas = areas
+
+    @property
+    def bounds(self):
+        return self.areas[0]
+
+    def cells(self):
+        for r1, c1, r2, c2 in self.areas:
+            for row in range(r1, r2 + 1):
+                for col in range(c1, c2 + 1):
+                    yield row, col
+
+    def _read(self, raw: bool):
+        self.sheet.book.tick()
+        r1, c1, r2, c2 = self.bounds
+        rows = []
+        for row in range(r1, r2 + 1):
+            values = []
+            for col in range(c1, c2 + 1):
+                value = self.sheet._get(row, col)
+                values.append(_to_serial(value) if raw else value)
+            rows.append(tuple(values))
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return rows[0][0]
+        return tuple(rows)
+
+    def _write(self, value):
+        self.sheet.book.tick()
+        r1, c1, _, _ = self.bounds
+        rows = value if isinstance(value, (list, tuple)) else ((value,),)
+        for i, row in enumerate(rows):
+            row = row if isinstance(row, (list, tuple)) else (row,)
+            for j, item in enumerate(row):
+                self.sheet._set(r1 + i, c1 + j, item)
+
+    @property
+    def Value2(self):
+        return self._read(raw=True)
+
+    @Value2.setter
+    def Value2(self, value):
+        self._write(value)
+
+    @property
+    def Value(self):
+        return self._read(raw=False)
+
+    @Value.setter
+    def Value(self, value):
+        self._write(value)
+
+    @property
+    def Font(self):
+        self.sheet.book.tick()
+        return _Font(self)
+
+    @property
+    def NumberFormat(self):
+        self.sheet.book.tick()
+        r1, c1, _, _ = self.bounds
+        return self.sheet.formats.get((r1, c1), "General")
+
+    @NumberFormat.setter
+    def NumberFormat(self, fmt):
+        self.sheet.book.tick()
+        for cell in self.cells():
+            self.sheet.formats[cell] = fmt
+
+    @property
+    def Row(self):
+        self.sheet.book.tick()
+        return self.bounds[0]
+
+    @property
+    def Column(self):
+        self.sheet.book.tick()
+        return self.bounds[1]
+
+    @property
+    def Rows(self):
+        r1, _, r2, _ = self.bounds
+        return _Count(self.sheet.book, r2 - r1 + 1)
+
+    @property
+    def Columns(self):
+        _, c1, _, c2 = self.bounds
+        return _Count(self.sheet.book, c2 - c1 + 1)
+
+    @property
+    def Address(self):
+        self.sheet.book.tick()
+        return ",".join(format_address(*area) for area in self.areas)
+
+    def Cells(self, row, col):
+        self.sheet.book.tick()
+        r1, c1, _, _ = self.bounds
+        return RangeApi(self.sheet, [(r1 + row - 1, c1 + col - 1, r1 + row - 1, c1 + col - 1)])
+
+    def Resize(self, rows, cols):
+        self.sheet.book.tick()
+        r1, c1, _, _ = self.bounds
+        return RangeApi(self.sheet, [(r1, c1, r1 + rows - 1, c1 + cols - 1)])
+
+    def ClearContents(self):
+        self.sheet.book.tick()
+        for cell in list(self.cells()):
+            self.sheet.cells.pop(cell, None)
+
+    def Insert(self, Shift=XL_SHIFT_DOWN):
+        self.sheet.book.tick()
+        self.sheet.insert_cells(*self.bounds)
+
+    def Delete(self, Shift=XL_SHIFT_UP):
+        self.sheet.book.tick()
+        self.sheet.delete_cells(*self.bounds)
+
+
+class _Options:
+    def __init__(self, rng, convert=None, header=1, index=True, ndim=None, **kwargs):
+        self._range = rng
+        self._convert = convert
+        self._header = header
+        self._index = index
+        self._ndim = ndim
+
+    @property
+    def value(self):
+        rows = self._range._values()
+        if self._convert is pd.DataFrame:
+            header = rows[0] if self._header else None
+            df = pd.DataFrame(rows[1:] if self._header else rows, columns=header)
+            if self._index:
+                df = df.set_index(df.columns[0])
+            return df
+        if self._ndim == 2:
+            return rows
+        return self._range.value
+
+
+class Range:
+    """Диапазон xlwings (value, options, resize, offset, end, ...)."""
+
+    def __init__(self, sheet, r1, c1, r2, c2):
+        self.sheet = sheet
+        self.r1, self.c1, self.r2, self.c2 = r1, c1, r2, c2
+        self.api = RangeApi(sheet, [(r1, c1, r2, c2)])
+
+    def _values(self):
+        """Значения как в xlwings: даты в ячейках с форматом даты — datetime."""
+        self.sheet.book.tick()
+        rows = []
+        for row in range(self.r1, self.r2 + 1):
+            values = []
+            for col in range(self.c1, self.c2 + 1):
+                value = self.sheet._get(row, col)
+                if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                        and _is_date_format(self.sheet.formats.get((row, col))):
+                    value = EXCEL_EPOCH + timedelta(days=value)
+                values.append(value)
+            rows.append(values)
+        return rows
+
+    @property
+    def value(self):
+        rows = self._values()
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return rows[0][0]
+        if len(rows) == 1:
+            return rows[0]
+        if all(len(row) == 1 for row in rows):
+            return [row[0] for row in rows]
+        return rows
+
+    @value.setter
+    def value(self, value):
+        if isinstance(value, pd.DataFrame):
+            value = [list(value.columns)] + value.values.tolist()
+        elif isinstance(value, np.ndarray):
+            value = value.tolist()
+        if isinstance(value, (list, tuple)) and value and not isinstance(value[0], (list, tuple)):
+            value = [value]
+        self.api._write(value)
+
+    def options(self, convert=None, **kwargs):
+        return _Options(self, convert, **kwargs)
+
+    def resize(self, row_size=None, column_size=None):
+        rows = row_size if row_size is not None else self.r2 - self.r1 + 1
+        cols = column_size if column_size is not None else self.c2 - self.c1 + 1
+        if rows < 1 or cols < 1:
+            raise ValueError("Размер диапазона должен быть не меньше 1")
+        return Range(self.sheet, self.r1, self.c1, self.r1 + rows - 1, self.c1 + cols - 1)
+
+    def offset(self, row_offset=0, column_offset=0):
+        return Range(self.sheet, self.r1 + row_offset, self.c1 + column_offset,
+                     self.r2 + row_offset, self.c2 + column_offset)
+
+    def end(self, direction):
+        self.sheet.book.tick()
+        if direction != "up":
+            raise NotImplementedError(direction)
+        rows = [r for (r, c) in self.sheet.cells if c == self.c1 and r <= self.r1]
+        row = max(rows, default=1)
+        return Range(self.sheet, row, self.c1, row, self.c1)
+
+    def expand(self, mode="table"):
+        self.sheet.book.tick()
+        r2 = self.r2
+        while any(self.sheet._get(r2 + 1, col) is not None for col in range(self.c1, self.c2 + 1)):
+            r2 += 1
+        return Range(self.sheet, self.r1, self.c1, r2, self.c2)
+
+    def clear_contents(self):
+        self.api.ClearContents()
+
+    @property
+    def address(self):
+        return format_address(self.r1, self.c1, self.r2, self.c2)
+
+    @property
+    def row(self):
+        return self.r1
+
+    @property
+    def column(self):
+        return self.c1
+
+    @property
+    def shape(self):
+        return self.r2 - self.r1 + 1, self.c2 - self.c1 + 1
+
+    @property
+    def left(self):
+        return float(self.c1 - 1) * 48
+
+    @property
+    def top(self):
+        return float(self.r1 - 1) * 15
+
+
+# =============================================================================
+# Таблицы (ListObject)
+# =============================================================================
+
+class _ListRow:
+    def __init__(self, list_object, index):
+        self._list_object = list_object
+        self._index = index
+
+    @property
+    def Range(self):
+        lo = self._list_object
+        lo.sheet.book.tick()
+        row = lo.header_row + self._index
+        return RangeApi(lo.sheet, [(row, lo.c1, row, lo.c2)])
+
+    def Delete(self):
+        lo = self._list_object
+        lo.sheet.book.tick()
+        row = lo.header_row + self._index
+        if lo.body_rows == 1:
+            # Последняя строка: остается пустая строка вставки
+            for col in range(lo.c1, lo.c2 + 1):
+                lo.sheet.cells.pop((row, col), None)
+            lo.body_rows = 0
+            return
+        lo.sheet.delete_cells(row, lo.c1, row, lo.c2)
+
+
+class _ListRows:
+    def __init__(self, list_object):
+        self._list_object = list_object
+
+    @property
+    def Count(self):
+        self._list_object.sheet.book.tick()
+        return self._list_object.body_rows
+
+    def Add(self):
+        lo = self._list_object
+        lo.sheet.book.tick()
+        if lo.body_rows == 0:
+            lo.body_rows = 1
+            return _ListRow(lo, 1)
+        row = lo.last_row + 1
+        lo.sheet.insert_cells(row, lo.c1, row, lo.c2)
+        lo.body_rows += 1
+        return _ListRow(lo, lo.body_rows)
+
+    def __call__(self, index):
+        self._list_object.sheet.book.tick()
+        return _ListRow(self._list_object, index)
+
+
+class ListObject:
+    """COM-объект ListObject: строка заголовка, тело, изменение размера."""
+
+    def __init__(self, sheet, name, header_row, c1, c2, body_rows):
+        self.sheet = sheet
+        self.Name = name
+        self.header_row = header_row
+        self.c1 = c1
+        self.c2 = c2
+        self.body_rows = body_rows
+        self.ListRows = _ListRows(self)
+
+    @property
+    def last_row(self):
+        # Пустая таблица занимает одну строку вставки под заголовком
+        return self.header_row + max(self.body_rows, 1)
+
+    @property
+    def Range(self):
+        self.sheet.book.tick()
+        return RangeApi(self.sheet, [(self.header_row, self.c1, self.last_row, self.c2)])
+
+    @property
+    def HeaderRowRange(self):
+        self.sheet.book.tick()
+        return RangeApi(self.sheet, [(self.header_row, self.c1, self.header_row, self.c2)])
+
+    @property
+    def DataBodyRange(self):
+        self.sheet.book.tick()
+        if not self.body_rows:
+            return None
+        return RangeApi(self.sheet, [(self.header_row + 1, self.c1, self.last_row, self.c2)])
+
+    @property
+    def ListColumns(self):
+        return _Count(self.sheet.book, self.c2 - self.c1 + 1)
+
+    def Resize(self, range_api):
+        self.sheet.book.tick()
+        r1, c1, r2, c2 = range_api.bounds
+        self.header_row, self.c1, self.c2 = r1, c1, c2
+        self.body_rows = r2 - r1
+
+    def to_frame(self) -> pd.DataFrame:
+        """Содержимое таблицы как DataFrame (без учета обращений)."""
+        calls = self.sheet.book.com_calls
+        df = Range(self.sheet, self.header_row, self.c1, self.last_row, self.c2) \
+            .options(pd.DataFrame, header=1, index=False).value
+        self.sheet.book.com_calls = calls
+        return df.iloc[:self.body_rows].reset_index(drop=True)
+
+
+class Table:
+    """Таблица уровня xlwings (sheet.tables[name])."""
+
+    def __init__(self, list_object):
+        self.api = list_object
+        self.name = list_object.Name
+
+    @property
+    def range(self):
+        lo = self.api
+        return Range(lo.sheet, lo.header_row, lo.c1, lo.last_row, lo.c2)
+
+    @property
+    def header_row_range(self):
+        lo = self.api
+        return Range(lo.sheet, lo.header_row, lo.c1, lo.header_row, lo.c2)
+
+    @property
+    def data_body_range(self):
+        lo = self.api
+        if not lo.body_rows:
+            return None
+        return Range(lo.sheet, lo.header_row + 1, lo.c1, lo.last_row, lo.c2)
+
+    def resize(self, rng):
+        self.api.Resize(rng.api)
+
+
+# =============================================================================
+# Замер обращений к Excel
+# =============================================================================
+
+def _bench(rows: int = 5000):
+    """
+    Считает обращения к Excel (COM) для записи и форматирования t6S_PAY:
+    прежние построчные варианты против пакетных.
+    """
+    from utils.excel_format import apply_row_styles
+    from utils.excel_writer import _paste_to_excel_smart_loop, paste_to_excel_smart
+
+    columns = ["ACCOUNT_DT", "ACCOUNT_CT", "CUR", "AMOUNT", "DESCRIPTION"]
+    df = pd.DataFrame({
+        "ACCOUNT_DT": [f"6{i % 50:04d}" for i in range(rows)],
+        "ACCOUNT_CT": [f"7{i % 70:04d}" for i in range(rows)],
+        "CUR": "UAH",
+        "AMOUNT": np.arange(rows, dtype=float),
+        "DESCRIPTION": "payment",
+    })
+    roles = ["DT" if (i // 7) % 2 else "CT" for i in range(rows)]
+    styles = {"DT": {"Color": 0x006100}, "CT": {"Color": 0x0000FF}}
+
+    def per_row_styles(sheet_name, table_name, keys):
+        # Прежний способ: по обращению к Font на каждую строку
+        wb = xw.Book.caller()
+        sheet = wb.sheets[sheet_name]
+        table = sheet.api.ListObjects(table_name)
+        start_row = table.HeaderRowRange.Row + 1
+        start_col = table.Range.Column
+        for i, key in enumerate(keys):
+            row_range = sheet.range((start_row + i, start_col)).resize(1, len(columns))
+            row_range.api.Font.Color = styles[key]["Color"]
+
+    results = {}
+    for label, write, fmt in (
+        ("построчно", _paste_to_excel_smart_loop, lambda: per_row_styles("6SX_ACC", "t6S_PAY", roles)),
+        ("пакетно", paste_to_excel_smart, lambda: apply_row_styles("6SX_ACC", "t6S_PAY", roles, styles)),
+    ):
+        book = FakeBook()
+        book.add_table("6SX_ACC", "t6S_PAY", pd.DataFrame(columns=columns), top_left="A1")
+        book.add_table("6SX_ACC", "t6S_FOREX", pd.DataFrame({"DEAL_NO": ["C1"]}), top_left="A5")
+        with installed(book):
+            write("6SX_ACC", "t6S_PAY", df)
+            write_calls = book.reset_counter()
+            fmt()
+            format_calls = book.reset_counter()
+        forex = book.sheets["6SX_ACC"]._list_objects["t6S_FOREX"]
+        results[label] = (write_calls, format_calls)
+        print(f"{label}: запись {rows} строк — {write_calls} обращений, "
+              f"форматирование — {format_calls}, t6S_FOREX начинается со строки {forex.header_row}")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    _bench(*(int(arg) for arg in sys.argv[1:]))
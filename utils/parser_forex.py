@@ -1,5 +1,19 @@
 import re
 
+import pandas as pd
+
+# Буква 'с' во всех вариантах: английская c, русская с, украинская с
+C_VARIANTS = "cсс"  # c (eng), с (rus), с (ukr)
+
+# Номер сделки: 'с'/'c' + цифры или число, начинающееся на '9', не внутри слова.
+# Эквивалент (?<!\w)[с]\d+|\b9\d+, но шаблон начинается с набора символов —
+# движок re быстро пропускает позиции, не начинающиеся с 'c'/'с'/'9',
+# а проверка «не внутри слова» делается уже после найденного символа.
+FOREX_PATTERN = re.compile(rf"[{C_VARIANTS}9](?<!\w[{C_VARIANTS}9])\d+")
+
+# Таблица нормализации первой буквы к английской 'c'
+_TO_LATIN_C = str.maketrans({ch: "c" for ch in C_VARIANTS})
+
 
 def parse_forex_numbers(text: str) -> list[str]:
     """
@@ -7,16 +21,11 @@ def parse_forex_numbers(text: str) -> list[str]:
     1. Номера, начинающиеся на 'с' (рус/укр/англ) — нормализует к английской 'c'
     2. Номера, начинающиеся на '9'
     """
-    # Буква 'с' во всех вариантах: английская c, русская с, украинская с
-    c_variants = "cсс"  # c (eng), с (rus), с (ukr)
-
-    pattern = rf"(?<!\w)[{c_variants}]\d+|\b9\d+"
-
-    matches = re.findall(pattern, text)
+    matches = FOREX_PATTERN.findall(text)
 
     result = []
     for m in matches:
-        if m[0] in c_variants:
+        if m[0] in C_VARIANTS:
             result.append("c" + m[1:])  # нормализуем к английской c
         else:
             result.append(m)
@@ -24,6 +33,67 @@ def parse_forex_numbers(text: str) -> list[str]:
     return result
 
 
+def extract_forex_numbers(descriptions: pd.Series) -> pd.DataFrame:
+    """
+    Извлекает номера сделок сразу из всей колонки описаний.
+
+    Результат — «длинная» таблица связей документ -> номер сделки: по строке
+    на каждое вхождение, в порядке строк и вхождений (как у parse_forex_numbers
+    в цикле), что позволяет присоединить найденные сделки к исходным документам.
+
+    Args:
+        descriptions (pd.Series): колонка DESCRIPTION (пустые значения пропускаются)
+
+    Returns:
+        pd.DataFrame: колонки ROW (индекс строки в descriptions) и DEAL_NO
+                      (номер, нормализованный к английской 'c')
+    """
+    text = descriptions.dropna().astype(str)
+    found = text.str.findall(FOREX_PATTERN).explode().dropna()
+    # Номер состоит из буквы и цифр, поэтому translate всей строки меняет только букву
+    deal_no = found.astype(str).str.translate(_TO_LATIN_C)
+    return pd.DataFrame({
+        "ROW": found.index.to_numpy(),
+        "DEAL_NO": deal_no.to_numpy(dtype=object),
+    })
+
+
+def _benchmark(rows: int):
+    """Сравнивает прежний построчный разбор с extract_forex_numbers на синтетических описаниях."""
+    import time
+
+    import numpy as np
+
+    templates = [
+        "Зарахування коштів згідно угоди №с{n} від 18.02.2026 з АТ \"ОТП БАНК\"",
+        "Переказ № ASW{n}/180226 від 18.02.26 р. Призн.- /BNF/FOREX DEAL 2026-02-18",
+        "Зарахування коштів згідно угоди неттінг №№c{n},с{m} з АТ \"Райффайзен Банк\"",
+        "Зарахування коштів згідно угоди №9{n} від 18.02.2026 з Національний банк України",
+        "Комісія за обслуговування рахунку",
+    ]
+    rng = np.random.default_rng(0)
+    numbers = rng.integers(10000, 99999, size=rows)
+    kinds = rng.integers(0, len(templates), size=rows)
+    series = pd.Series([templates[k].format(n=n, m=n + 1) for k, n in zip(kinds, numbers)])
+
+    # Прежний вариант: нескомпилированный шаблон с lookbehind в начале, цикл по строкам
+    legacy_pattern = rf"(?<!\w)[{C_VARIANTS}]\d+|\b9\d+"
+    started = time.perf_counter()
+    loop_numbers = []
+    for desc in series.dropna():
+        for m in re.findall(legacy_pattern, str(desc)):
+            loop_numbers.append("c" + m[1:] if m[0] in C_VARIANTS else m)
+    loop_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    links = extract_forex_numbers(series)
+    vector_time = time.perf_counter() - started
+
+    assert links["DEAL_NO"].tolist() == loop_numbers
+    print(f"{rows} строк: цикл {loop_time:.2f} с, по колонке {vector_time:.2f} с, "
+          f"найдено номеров {len(links)}")
+
+
 if __name__ == "__main__":
     sample = (
         "Переказ № ASW99807/180226 від 18.02.26 р. Призн.- /BNF/FOREX DEAL 2026-02-18 "
@@ -41,3 +111,9 @@ if __name__ == "__main__":
 
     result = parse_forex_numbers(sample)
     print(result)
+    print(extract_forex_numbers(pd.Series([sample])))
+
+    # Замер на синтетических описаниях: python -m utils.parser_forex 100000 1000000
+    import sys
+    for rows in map(int, sys.argv[1:]):
+        _benchmark(rows)
@@ -0,0 +1,275 @@
+"""
+Контекст запуска макроса: параметры книги, прочитанные один раз.
+
+Раньше каждый fetcher читал нужные ему имена сам: forecast_date() вызывался
+дважды на выборку, RDATE читался отдельно в detail_6sx и pay_6sx, а таблица
+tParam перечитывалась целиком ради одного пути. RunContext читает все
+именованные ячейки одним вызовом Evaluate (на листе своей книги) и таблицу tParam одним
+чтением диапазона, а затем отдает значения из памяти.
+
+Пример:
+    with run_context() as ctx:        # один контекст на весь запуск
+        paste_to_excel_pay_6sx(ctx=ctx)
+    ...
+    ctx = current_context()           # внутри fetcher: активный контекст или новый
+    rdate = ctx.rdate
+"""
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import xlwings as xw
+
+from utils.excel_writer import headless_backend
+
+# Именованные ячейки книги, которые используют fetchers
+WORKBOOK_NAMES = ("RDATE", "ForecastDate", "date_start", "date_end", "d_r020", "num_acc")
+# Имена с датами: Evaluate возвращает их номером Excel (Double), а не датой
+DATE_NAMES = frozenset({"RDATE", "ForecastDate", "date_start", "date_end"})
+PARAM_SHEET = "sys"
+PARAM_TABLE = "tParam"
+MAX_FORMULA_LEN = 255    # предел длины выражения для Application.Evaluate
+
+# Ошибки Excel, которые COM возвращает вместо значения (#NULL!, #DIV/0!, #VALUE!, #REF!, #NAME?, #NUM!, #N/A)
+XL_ERRORS = {-2146826288, -2146826281, -2146826273, -2146826265, -2146826259, -2146826252, -2146826246}
+
+_active = None
+
+
+def _formula_groups(names) -> list:
+    """Делит имена на группы, выражение CHOOSE для каждой из которых короче MAX_FORMULA_LEN."""
+    groups, current = [], []
+    for name in names:
+        candidate = current + [name]
+        if current and len(_choose_formula(candidate)) > MAX_FORMULA_LEN:
+            groups.append(current)
+            candidate = [name]
+        current = candidate
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _choose_formula(names) -> str:
+    """
+    CHOOSE({1,2,...},IF(ISBLANK(a),"",a),...) — строка значений имен за одно вычисление.
+    ISBLANK нужен, чтобы пустая ячейка вернулась пустой строкой, а не нулем.
+    """
+    indexes = ",".join(str(i) for i in range(1, len(names) + 1))
+    values = ",".join(f'IF(ISBLANK({name}),"",{name})' for name in names)
+    return f"CHOOSE({{{indexes}}},{values})"
+
+
+def _flatten(result) -> list:
+    if isinstance(result, (list, tuple)):
+        return [item for part in result for item in _flatten(part)]
+    return [result]
+
+
+def _clean(name: str, value):
+    """Значение из Evaluate в том виде, в каком его возвращает range.value."""
+    if value == "":
+        return None
+    if name in DATE_NAMES and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return xw.to_datetime(value)
+    if isinstance(value, datetime):
+        # pywintypes.datetime с часовым поясом -> обычная datetime
+        return datetime(*value.timetuple()[:6])
+    return value
+
+
+def _is_error(value) -> bool:
+    return isinstance(value, int) and value in XL_ERRORS
+
+
+class RunContext:
+    """
+    Параметры книги на один запуск: именованные ячейки и таблица tParam.
+
+    Книга не открывается при создании: контекст, в котором ничего не читали
+    (например, main.run_reset_6sx), не обращается к Excel.
+
+    Args:
+        book: книга xlwings (по умолчанию xw.Book.caller())
+        names (Iterable[str]): имена, которые читаются вместе с первым запрошенным
+    """
+
+    def __init__(self, book=None, names=WORKBOOK_NAMES):
+        self._headless = headless_backend()
+        self._book = book
+        self._values = {}
+        self._missing = set()
+        self._params = None
+        self._pending = list(names)
+
+    @property
+    def book(self):
+        """Книга контекста (None при SR_EXCEL_BACKEND=xlsx)."""
+        if self._book is None and not self._headless:
+            self._book = xw.Book.caller()
+        return self._book
+
+    def load(self, names):
+        """Читает еще не прочитанные имена: одним Evaluate на группу, ошибки — поштучно."""
+        # Первое чтение забирает и остальные имена из WORKBOOK_NAMES — одним Evaluate
+        names, self._pending = self._pending + [n for n in names if n not in self._pending], []
+        names = [n for n in names if n not in self._values and n not in self._missing]
+        if not names:
+            return
+        if self._headless:
+            for name in names:
+                self._values[name] = self._headless.read_name(name)
+            return
+
+        retry = []
+        for group in _formula_groups(names):
+            try:
+                # Worksheet.Evaluate, а не Application.Evaluate: последний ищет имена
+                # в активной книге, которая может быть не self.book
+                values = _flatten(self.book.sheets[0].api.Evaluate(_choose_formula(group)))
+            except Exception:
+                values = []
+            if len(values) != len(group):
+                retry.extend(group)
+                continue
+            for name, value in zip(group, values):
+                if _is_error(value):
+                    # Нет имени или в ячейке ошибка — уточняем отдельным чтением
+                    retry.append(name)
+                else:
+                    self._values[name] = _clean(name, value)
+        for name in retry:
+            self._read_single(name)
+
+    def _read_single(self, name):
+        try:
+            value = self.book.names[name].refers_to_range.value
+        except Exception:
+            self._missing.add(name)
+            return
+        self._values[name] = value
+
+    def get(self, name: str, default=None):
+        """Значение именованной ячейки (default, если имени нет или ячейка пуста)."""
+        self.load([name])
+        value = self._values.get(name)
+        return default if value is None else value
+
+    def __getitem__(self, name: str):
+        """Значение именованной ячейки; KeyError, если такого имени в книге нет."""
+        self.load([name])
+        if name in self._missing:
+            raise KeyError(name)
+        return self._values[name]
+
+    def __contains__(self, name: str) -> bool:
+        self.load([name])
+        return name not in self._missing
+
+    @property
+    def rdate(self):
+        """Отчетная дата (RDATE) или None."""
+        return self.get("RDATE")
+
+    @property
+    def forecast_date(self):
+        """Дата прогноза (ForecastDate) или None, если ячейка пуста."""
+        return self.get("ForecastDate") or None
+
+    @property
+    def params(self) -> dict:
+        """Таблица tParam (лист sys) как словарь Параметр -> Значение, читается один раз."""
+        if self._params is None:
+            df = self._read_param_table()
+            self._params = {}
+            for name, value in zip(df['Параметр'], df['Значение']):
+                # Как и при поиске по таблице, берется первая строка с этим параметром
+                self._params.setdefault(name, value)
+        return self._params
+
+    def _read_param_table(self) -> pd.DataFrame:
+        if self._headless:
+            return self._headless.read_table(PARAM_SHEET, PARAM_TABLE)
+        sheet = self.book.sheets[PARAM_SHEET]
+        table = sheet.api.ListObjects(PARAM_TABLE)
+        return sheet.range(table.Range.Address).options(pd.DataFrame, header=1, index=False).value
+
+    def param(self, name: str, default=None):
+        """Значение параметра из tParam (default, если параметра нет)."""
+        return self.params.get(name, default)
+
+
+@contextmanager
+def run_context(book=None):
+    """
+    Делает контекст активным на время блока: current_context() внутри него
+    возвращает тот же объект. Вложенные блоки используют внешний контекст.
+    """
+    global _active
+    if _active is not None:
+        yield _active
+        return
+    _active = RunContext(book)
+    try:
+        yield _active
+    finally:
+        _active = None
+
+
+def current_context() -> RunContext:
+    """Активный контекст запуска или новый, если вызов сделан вне run_context()."""
+    return _active if _active is not None else RunContext()
+
+
+def _bench():
+    """
+    Считает обращения к Excel (COM) на чтение параметров для типичного набора
+    выборок: прежнее чтение по месту против одного RunContext.
+    """
+    from utils.fake_workbook import FakeBook, installed
+    from utils.date_utils import forecast_date
+
+    book = FakeBook()
+    for name, value in [("RDATE", datetime(2025, 3, 31)), ("ForecastDate", datetime(2025, 4, 1)),
+                        ("date_start", datetime(2025, 3, 1)), ("date_end", datetime(2025, 3, 31)),
+                        ("d_r020", "1500"), ("num_acc", "1500%")]:
+        book.set_name(name, value)
+    book.add_table(PARAM_SHEET, PARAM_TABLE,
+                   pd.DataFrame({'Параметр': ['Path_DA7X'], 'Значение': ['C:\\DA7X.xlsx']}), top_left="D1")
+
+    with installed(book):
+        book.reset_counter()
+        # Прежний порядок: banks_42x и grp_9000 — по два forecast_date(), detail_6sx и pay_6sx — RDATE,
+        # diff_acc — три имени, doc_acc — два, detail_a7x — tParam целиком
+        for _ in range(2):
+            forecast_date()
+            forecast_date()
+        wb = xw.Book.caller()
+        for _ in range(2):
+            wb.names['RDATE'].refers_to_range.value
+        for name in ("date_start", "date_end", "d_r020", "date_end", "num_acc"):
+            wb.names[name].refers_to_range.value
+        sheet = wb.sheets[PARAM_SHEET]
+        table = sheet.api.ListObjects(PARAM_TABLE)
+        sheet.range(table.Range.Address).options(pd.DataFrame, header=1, index=False).value
+        before = book.reset_counter()
+
+        ctx = RunContext()
+        for _ in range(2):
+            ctx.forecast_date
+            ctx.forecast_date
+        for _ in range(2):
+            ctx.rdate
+        for name in ("date_start", "date_end", "d_r020", "date_end", "num_acc"):
+            ctx[name]
+        ctx.param('Path_DA7X')
+        after = book.reset_counter()
+
+    # Evaluate отдает даты номерами Excel — в контексте они должны быть датами, как у range.value
+    assert ctx.rdate == datetime(2025, 3, 31) and ctx.forecast_date == datetime(2025, 4, 1), ctx._values
+
+    print(f"Обращений к Excel на чтение параметров: по месту {before}, RunContext {after}")
+
+
+if __name__ == "__main__":
+    _bench()
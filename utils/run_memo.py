@@ -0,0 +1,104 @@
+# Мемоизация промежуточных результатов цепочки 6S (detail -> pay -> forex) в пределах окна
+import hashlib
+import os
+import pickle
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+from db.result_cache import CACHE_DIR
+
+ENABLE_MEMO = True
+MEMO_WINDOW = 15 * 60               # секунд, в течение которых шаг переиспользует результат
+MEMO_DIR = CACHE_DIR / "run"        # каталог с сохранёнными результатами шагов
+
+
+def is_enabled() -> bool:
+    """Мемоизация включена в модуле и не отключена через SR_CACHE=off."""
+    if not ENABLE_MEMO:
+        return False
+    return os.environ.get("SR_CACHE", "").lower() not in ("off", "0", "false", "no")
+
+
+def _rdate_key(rdate) -> str:
+    if isinstance(rdate, datetime):
+        rdate = rdate.date()
+    if isinstance(rdate, date):
+        return rdate.isoformat()
+    return str(rdate)
+
+
+def _path(step: str, rdate):
+    return MEMO_DIR / f"{step}_{_rdate_key(rdate)}.pkl"
+
+
+def data_version(*frames) -> str:
+    """Версия данных — хеш содержимого DataFrame (используется как probe для следующих шагов)."""
+    digest = hashlib.sha1()
+    for df in frames:
+        digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def memoize(step: str, rdate, compute, version: str = None, refresh: bool = False, window: float = None):
+    """
+    Возвращает результат шага step для отчётной даты rdate.
+
+    Сохранённый результат переиспользуется, если он моложе window секунд
+    и получен при той же версии входных данных (version). Иначе вызывается
+    compute() и результат сохраняется для следующих шагов цепочки.
+
+    Args:
+        step (str): имя шага (например, "6sx_accounts")
+        rdate: отчётная дата
+        compute (callable): функция без аргументов, вычисляющая результат
+        version (str): версия входных данных (см. data_version)
+        refresh (bool): всегда пересчитать и перезаписать результат
+        window (float): окно переиспользования, по умолчанию MEMO_WINDOW
+    """
+    if not is_enabled():
+        return compute()
+
+    window = MEMO_WINDOW if window is None else window
+    path = _path(step, rdate)
+
+    if not refresh and path.exists():
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            if time.time() - entry["created"] <= window and entry["version"] == version:
+                return entry["value"]
+        except Exception:
+            # Повреждённый или несовместимый файл — просто пересчитываем
+            pass
+
+    value = compute()
+    try:
+        MEMO_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"created": time.time(), "version": version, "value": value}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+    return value
+
+
+def invalidate(step: str = None, rdate=None) -> int:
+    """
+    Удаляет сохранённые результаты: все, одного шага или одной даты.
+
+    Returns:
+        int: число удалённых записей
+    """
+    if not MEMO_DIR.exists():
+        return 0
+    step_mask = step or "*"
+    rdate_mask = _rdate_key(rdate) if rdate is not None else "*"
+    removed = 0
+    for path in MEMO_DIR.glob(f"{step_mask}_{rdate_mask}.pkl"):
+        path.unlink(missing_ok=True)
+        removed += 1
+    return removed
@@ -0,0 +1,97 @@
+# Реестр SQL-шаблонов из папки sql/: загрузка один раз, кеш по mtime, проверка bind-параметров
+import re
+import threading
+from functools import lru_cache
+
+from utils.path_utils import get_sql_path
+
+# Комментарии и строковые литералы вырезаются перед поиском bind-переменных,
+# чтобы не принять за параметр, например, 'HH24:MI:SS' или закомментированный ':date_r020'
+_COMMENTS_AND_LITERALS = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'", re.DOTALL)
+_BIND = re.compile(r"(?<![\w:]):([A-Za-z_][\w$#]*)")
+
+_templates = {}   # имя файла -> (mtime, текст, bind-переменные)
+_lock = threading.Lock()
+_preloaded = False
+
+
+@lru_cache(maxsize=256)
+def extract_binds(sql: str) -> frozenset:
+    """Возвращает множество имён bind-переменных (в нижнем регистре), объявленных в тексте SQL."""
+    stripped = _COMMENTS_AND_LITERALS.sub(" ", sql)
+    return frozenset(name.lower() for name in _BIND.findall(stripped))
+
+
+def _load(filename: str, mtime: float):
+    path = get_sql_path(filename)
+    with open(path, encoding="utf-8") as f:
+        sql = f.read().strip().rstrip(";")
+    entry = (mtime, sql, extract_binds(sql))
+    _templates[filename] = entry
+    return entry
+
+
+def preload():
+    """Загружает все sql/*.sql одним проходом по каталогу."""
+    global _preloaded
+    with _lock:
+        for path in get_sql_path("").glob("*.sql"):
+            _load(path.name, path.stat().st_mtime)
+        _preloaded = True
+
+
+def _entry(filename: str):
+    if not _preloaded:
+        preload()
+    mtime = get_sql_path(filename).stat().st_mtime
+    entry = _templates.get(filename)
+    if entry is None or entry[0] != mtime:
+        # Шаблон добавлен или изменён после загрузки — перечитываем только его
+        with _lock:
+            entry = _load(filename, mtime)
+    return entry
+
+
+def get_sql(filename: str) -> str:
+    """Возвращает текст шаблона sql/<filename> без завершающей ';'."""
+    return _entry(filename)[1]
+
+
+def get_sql_variant(filename: str, **fragments) -> str:
+    """
+    Возвращает вариант шаблона, в котором плейсхолдеры :<name> заменены фиксированными фрагментами SQL.
+
+    Фрагменты должны браться из заранее известного набора (например, условие
+    ACS.BASE_AMOUNT > 0 / <> 0), чтобы число различных текстов запроса было
+    конечным и Oracle переиспользовал их разбор. Значения данных передаются
+    только через bind-переменные.
+    """
+    sql = get_sql(filename)
+    for name, fragment in fragments.items():
+        sql = re.sub(rf"(?<![\w:]):{re.escape(name)}\b", lambda _: fragment, sql)
+    return sql
+
+
+def get_binds(filename: str) -> frozenset:
+    """Возвращает bind-переменные, объявленные в шаблоне sql/<filename>."""
+    return _entry(filename)[2]
+
+
+def validate_params(sql: str, params: dict = None):
+    """
+    Сверяет переданные параметры с bind-переменными запроса до обращения к БД.
+
+    Raises:
+        ValueError: если каких-то переменных не хватает или переданы лишние
+    """
+    binds = extract_binds(sql)
+    given = {str(name).lower() for name in (params or {})}
+    missing = sorted(binds - given)
+    extra = sorted(given - binds)
+    if missing or extra:
+        details = []
+        if missing:
+            details.append(f"не переданы: {', '.join(missing)}")
+        if extra:
+            details.append(f"лишние: {', '.join(extra)}")
+        raise ValueError(f"Параметры запроса не совпадают с bind-переменными ({'; '.join(details)})")
@@ -0,0 +1,280 @@
+"""
+Запись в именованные таблицы .xlsx без Excel (openpyxl).
+
+Бэкенд utils.excel_writer для ночных пакетных запусков и серверов без Excel:
+функции вставки имеют тот же API, что и COM-версии, но пишут в книгу
+SR_XLSX_PATH. Включается переменной окружения SR_EXCEL_BACKEND=xlsx.
+
+Книга загружается один раз за процесс и перечитывается, если файл изменился
+на диске. Запись вне excel_session сохраняется сразу после вызова, внутри
+сессии — один раз при выходе из нее (а также явным save() и при завершении
+процесса). Это важно для рабочего процесса worker.py, который живет долго.
+
+Ограничения относительно Excel:
+- формулы не пересчитываются (пересчет — при следующем открытии книги в Excel);
+- при сдвиге smart-таблиц ссылки в формулах вне сдвигаемых ячеек не обновляются.
+"""
+import atexit
+import functools
+import os
+import threading
+from copy import copy
+
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter, range_boundaries
+
+from utils import excel_writer
+from utils.excel_writer import (
+    BACKEND_ENV, NUMBER_FORMATS, WRITE_CHUNK_ROWS, _iter_slices, _table_kinds, marshal_frame,
+)
+
+PATH_ENV = "SR_XLSX_PATH"   # путь к книге с именованными таблицами
+
+_book = None
+_book_path = None
+_book_mtime = None
+_dirty = False
+_lock = threading.RLock()
+
+
+def workbook():
+    """Книга SR_XLSX_PATH: загружается один раз и перечитывается, если файл изменился на диске."""
+    global _book, _book_path, _book_mtime
+    path = os.environ.get(PATH_ENV)
+    if not path:
+        raise RuntimeError(f"Для {BACKEND_ENV}=xlsx не задан путь к книге ({PATH_ENV})")
+    with _lock:
+        mtime = os.path.getmtime(path)
+        # Несохраненные изменения (внутри excel_session) не отбрасываются
+        stale = _book_mtime != mtime and not _dirty
+        if _book is None or _book_path != path or stale:
+            keep_vba = path.lower().endswith(".xlsm")
+            _book = openpyxl.load_workbook(path, keep_vba=keep_vba)
+            _book_path = path
+            _book_mtime = mtime
+    return _book
+
+
+def save():
+    """Сохраняет книгу, если в нее что-то записано (через временный файл)."""
+    global _dirty, _book_mtime
+    with _lock:
+        if _book is None or not _dirty:
+            return
+        root, ext = os.path.splitext(_book_path)
+        tmp_path = f"{root}.tmp{ext}"
+        _book.save(tmp_path)
+        os.replace(tmp_path, _book_path)
+        _book_mtime = os.path.getmtime(_book_path)
+        _dirty = False
+
+
+atexit.register(save)
+
+
+def _saved(func):
+    """Вне excel_session книга сохраняется сразу после записи; в сессии — при выходе из нее."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        if excel_writer._active_session is None:
+            save()
+        return result
+    return wrapper
+
+
+def read_name(name: str):
+    """Значение именованной ячейки книги (None, если имени нет или это формула); для диапазона — его первая ячейка, как у Evaluate."""
+    wb = workbook()
+    if name not in wb.defined_names:
+        return None
+    for sheet_title, coord in wb.defined_names[name].destinations:
+        cell = wb[sheet_title][coord.replace("$", "")]
+        # Диапазон openpyxl возвращает кортежем строк (столбец целиком — кортежем ячеек)
+        while isinstance(cell, tuple):
+            cell = cell[0]
+        value = cell.value
+        if isinstance(value, str) and value.startswith("="):
+            return None
+        return value
+    return None
+
+
+def _find_table(sheet_name: str, table_name: str):
+    ws = workbook()[sheet_name]
+    if table_name not in ws.tables:
+        raise KeyError(f"Таблица {table_name} не найдена на листе {sheet_name}")
+    return ws, ws.tables[table_name]
+
+
+def _bounds(table):
+    """(первый столбец, строка заголовка, последний столбец, последняя строка) таблицы."""
+    return range_boundaries(table.ref)
+
+
+def read_table(sheet_name: str, table_name: str) -> pd.DataFrame:
+    """Содержимое именованной таблицы (строка заголовка — имена столбцов)."""
+    with _lock:
+        ws, table = _find_table(sheet_name, table_name)
+        min_col, header_row, max_col, max_row = _bounds(table)
+        rows = [list(row) for row in ws.iter_rows(min_row=header_row, max_row=max_row,
+                                                   min_col=min_col, max_col=max_col, values_only=True)]
+    return pd.DataFrame(rows[1:], columns=rows[0])
+
+
+def _set_rows(table, row_count: int):
+    """Задает число строк тела таблицы (минимум одна строка)."""
+    min_col, header_row, max_col, _ = _bounds(table)
+    ref = f"{get_column_letter(min_col)}{header_row}:{get_column_letter(max_col)}{header_row + max(row_count, 1)}"
+    table.ref = ref
+    if table.autoFilter is not None:
+        table.autoFilter.ref = ref
+
+
+def _clear(ws, first_row: int, first_col: int, rows: int, cols: int):
+    for row in ws.iter_rows(min_row=first_row, max_row=first_row + rows - 1,
+                            min_col=first_col, max_col=first_col + cols - 1):
+        for cell in row:
+            cell.value = None
+
+
+def _write_values(ws, table_name: str, first_row: int, first_col: int, slices, column_types=None, report=None,
+                  total=None):
+    """Пишет части данных одна под другой; формат дат — по типам столбцов (как в COM-версии)."""
+    global _dirty
+    written = 0
+    columns = []
+    for part in slices:
+        columns = part.columns
+        if part.empty:
+            continue
+        kinds = _table_kinds(table_name, part, column_types)
+        formats = [NUMBER_FORMATS.get(kinds.get(col, 'general')) for col in columns]
+        for i, row in enumerate(marshal_frame(part, kinds).tolist()):
+            for j, value in enumerate(row):
+                cell = ws.cell(row=first_row + written + i, column=first_col + j, value=value)
+                if formats[j]:
+                    cell.number_format = formats[j]
+        written += len(part)
+        if report:
+            report(written, total)
+    _dirty = True
+    return written, columns
+
+
+def _shift_below(ws, table, delta: int):
+    """
+    Сдвигает на delta строк ячейки под таблицей в ее столбцах (как Insert/Delete со сдвигом
+    в COM-версии) и таблицы, целиком лежащие в этих столбцах ниже.
+    """
+    min_col, _, max_col, max_row = _bounds(table)
+    if not delta or ws.max_row <= max_row:
+        return
+    block = f"{get_column_letter(min_col)}{max_row + 1}:{get_column_letter(max_col)}{ws.max_row}"
+    ws.move_range(block, rows=delta, translate=True)
+    for other in ws.tables.values():
+        o_min_col, o_header, o_max_col, o_max_row = _bounds(other)
+        if other is not table and o_header > max_row and min_col <= o_min_col and o_max_col <= max_col:
+            ref = (f"{get_column_letter(o_min_col)}{o_header + delta}:"
+                   f"{get_column_letter(o_max_col)}{o_max_row + delta}")
+            other.ref = ref
+            if other.autoFilter is not None:
+                other.autoFilter.ref = ref
+
+
+@_saved
+def paste_to_excel(sheet_name: str, table_name: str, df, column_types: dict = None, diff: bool = False):
+    """Аналог excel_writer.paste_to_excel: очистка тела, запись, новый размер таблицы."""
+    if diff:
+        return paste_to_excel_diff(sheet_name, table_name, df, column_types)
+    paste_to_excel_chunks(sheet_name, table_name, df, column_types)
+
+
+@_saved
+def paste_to_excel_chunks(sheet_name: str, table_name: str, chunks, column_types: dict = None,
+                          chunk_rows: int = WRITE_CHUNK_ROWS, progress=None) -> int:
+    """Аналог excel_writer.paste_to_excel_chunks (progress=True печатает число строк)."""
+    if progress is True:
+        progress = lambda written, total: print(f"{table_name}: записано строк {written}")  # noqa: E731
+    total = len(chunks) if hasattr(chunks, "columns") else None
+    with _lock:
+        ws, table = _find_table(sheet_name, table_name)
+        min_col, header_row, max_col, max_row = _bounds(table)
+        _clear(ws, header_row + 1, min_col, max_row - header_row, max_col - min_col + 1)
+        written, _ = _write_values(ws, table_name, header_row + 1, min_col, _iter_slices(chunks, chunk_rows),
+                                   column_types, progress, total)
+        _set_rows(table, written)
+    return written
+
+
+@_saved
+def paste_to_excel_smart(sheet_name: str, table_name: str, df, column_types: dict = None):
+    """Аналог excel_writer.paste_to_excel_smart: таблицы ниже сдвигаются вместе с данными."""
+    with _lock:
+        ws, table = _find_table(sheet_name, table_name)
+        min_col, header_row, max_col, max_row = _bounds(table)
+        current = max_row - header_row
+        target = max(len(df), 1)
+        if target < current:
+            _clear(ws, header_row + 1 + target, min_col, current - target, max_col - min_col + 1)
+        _shift_below(ws, table, target - current)
+        _set_rows(table, target)
+        _clear(ws, header_row + 1, min_col, target, max_col - min_col + 1)
+        _write_values(ws, table_name, header_row + 1, min_col, _iter_slices(df, WRITE_CHUNK_ROWS), column_types)
+
+
+@_saved
+def paste_to_excel_diff(sheet_name: str, table_name: str, df, column_types: dict = None) -> int:
+    """
+    Аналог excel_writer.paste_to_excel_diff. В файле пересчета нет, поэтому
+    выгоды от частичной записи тоже нет — таблица записывается целиком.
+    """
+    paste_to_excel(sheet_name, table_name, df, column_types)
+    return len(df) * len(df.columns)
+
+
+def _bgr_to_argb(color: int) -> str:
+    """Цвет Excel (BGR) в ARGB для openpyxl."""
+    red, green, blue = color & 0xFF, (color >> 8) & 0xFF, (color >> 16) & 0xFF
+    return f"FF{red:02X}{green:02X}{blue:02X}"
+
+
+def _font(base, attrs: dict) -> Font:
+    """Шрифт base с атрибутами в терминах COM (Color, ColorIndex, Bold, Strikethrough)."""
+    font = copy(base)
+    for attr, value in attrs.items():
+        if attr == "Color":
+            font.color = _bgr_to_argb(value)
+        elif attr == "ColorIndex":
+            font.color = None    # xlColorIndexAutomatic
+        elif attr == "Bold":
+            font.bold = bool(value)
+        elif attr == "Strikethrough":
+            font.strike = bool(value)
+    return font
+
+
+@_saved
+def apply_row_styles(sheet_name: str, table_name: str, keys, styles: dict, default: dict = None,
+                     num_columns: int = None) -> int:
+    """Аналог excel_format.apply_row_styles для файла."""
+    global _dirty
+    keys = list(keys)
+    if not keys:
+        return 0
+    with _lock:
+        ws, table = _find_table(sheet_name, table_name)
+        min_col, header_row, max_col, _ = _bounds(table)
+        if num_columns is None:
+            num_columns = max_col - min_col + 1
+        rows = ws.iter_rows(min_row=header_row + 1, max_row=header_row + len(keys),
+                            min_col=min_col, max_col=min_col + num_columns - 1)
+        for key, row in zip(keys, rows):
+            attrs = {**(default or {}), **styles.get(key, {})}
+            if attrs:
+                for cell in row:
+                    cell.font = _font(cell.font, attrs)
+        _dirty = True
+    return len(keys)
@@ -0,0 +1,357 @@
+"""
+Постоянный процесс для макросов xlwings (необязательный режим).
+
+Каждый RunPython запускает интерпретатор заново: импорт pandas/oracledb и модулей
+проекта, новое подключение к Oracle, пустые кеши. Рабочий процесс запускается
+один раз и выполняет run_*() из main.py по запросам макросов, сохраняя между
+вызовами импортированные модули, пул сессий Oracle, SQL-шаблоны и кеши.
+
+Включение: переменная окружения SR_WORKER=1. Тогда main.run_*() передает
+вызов рабочему процессу (запуская его при необходимости) и ждет результата;
+если процесс недоступен — выполняет функцию как раньше, в своем интерпретаторе.
+
+Связь — multiprocessing.connection через именованный канал (Windows) или
+Unix-сокет с ключом из ~/.sr_worker.key. Процесс завершается после
+IDLE_TIMEOUT секунд простоя.
+
+    python worker.py serve     # запустить в текущей консоли
+    python worker.py status    # проверка состояния (ping)
+    python worker.py stop      # остановить
+    python worker.py bench     # проверка на FakeBook (без Excel)
+"""
+import getpass
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from multiprocessing.connection import AuthenticationError, Client, Listener
+from pathlib import Path
+
+WORKER_ENV = "SR_WORKER"              # 1 — выполнять run_*() в рабочем процессе
+NAME_ENV = "SR_WORKER_NAME"           # имя канала (по умолчанию — sr_worker_<пользователь>)
+IDLE_ENV = "SR_WORKER_IDLE"
+IDLE_TIMEOUT = 30 * 60                # секунд простоя до завершения процесса
+START_TIMEOUT = 60                    # секунд ожидания запуска процесса
+KEY_PATH = Path.home() / ".sr_worker.key"
+LOG_PATH = Path(__file__).resolve().parent / "logs" / "worker.log"
+
+# Аргументы, которыми RunPython передает вызывающую книгу (их читает xw.Book.caller())
+CALLER_ARGS = ("--wb=", "--from_xl=", "--hwnd=")
+
+
+def is_enabled() -> bool:
+    return os.environ.get(WORKER_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+def _address(name: str = None) -> str:
+    """Именованный канал в Windows, Unix-сокет во временном каталоге в остальных системах."""
+    name = name or os.environ.get(NAME_ENV) or f"sr_worker_{getpass.getuser()}"
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{name}"
+    return os.path.join(tempfile.gettempdir(), f"{name}.sock")
+
+
+def _authkey() -> bytes:
+    """Общий ключ клиента и процесса (создается при первом обращении)."""
+    if not KEY_PATH.exists():
+        tmp_path = KEY_PATH.with_suffix(".tmp")
+        tmp_path.write_bytes(secrets.token_hex(32).encode("ascii"))
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, KEY_PATH)
+    return KEY_PATH.read_bytes()
+
+
+# =============================================================================
+# Рабочий процесс
+# =============================================================================
+
+class _State:
+    def __init__(self, idle_timeout):
+        self.started = time.monotonic()
+        self.last_activity = self.started
+        self.idle_timeout = idle_timeout
+        self.calls = 0
+        self.busy = False
+        self.stopped = False
+
+    def health(self) -> dict:
+        now = time.monotonic()
+        return {
+            "pid": os.getpid(),
+            "uptime": round(now - self.started, 1),
+            "idle": round(now - self.last_activity, 1),
+            "calls": self.calls,
+            "modules": len(sys.modules),
+        }
+
+
+@contextmanager
+def _caller_argv(argv):
+    """Подставляет аргументы вызывающей книги, чтобы xw.Book.caller() нашел ее как при RunPython."""
+    saved = sys.argv
+    sys.argv = [saved[0]] + [arg for arg in argv if arg.startswith(CALLER_ARGS)]
+    try:
+        yield
+    finally:
+        sys.argv = saved
+
+
+def _run(request, book_factory):
+    import main
+
+    name = request.get("name")
+    if name not in main.REGISTRY:
+        raise KeyError(f"Неизвестная функция {name}")
+    argv = request.get("argv", [])
+    with _caller_argv(argv):
+        if book_factory is None:
+            main.invoke(name)
+        else:
+            from utils.fake_workbook import installed
+            with installed(book_factory(argv)):
+                main.invoke(name)
+
+
+def _handle(request, state, book_factory):
+    op = request.get("op") if isinstance(request, dict) else None
+    if op == "ping":
+        return {"ok": True, **state.health()}
+    if op == "shutdown":
+        state.stopped = True
+        return {"ok": True}
+    if op != "run":
+        return {"ok": False, "error": f"Неизвестная операция {op!r}"}
+
+    state.busy = True
+    started = time.perf_counter()
+    try:
+        _run(request, book_factory)
+        return {"ok": True, "elapsed": time.perf_counter() - started}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+    finally:
+        state.calls += 1
+        state.busy = False
+        state.last_activity = time.monotonic()
+
+
+def _watchdog(state, address, authkey):
+    """Останавливает процесс после idle_timeout секунд простоя (будит accept() пустым подключением)."""
+    while not state.stopped:
+        time.sleep(min(5.0, state.idle_timeout / 2))
+        if not state.busy and time.monotonic() - state.last_activity > state.idle_timeout:
+            state.stopped = True
+            try:
+                Client(address, authkey=authkey).close()
+            except OSError:
+                pass
+
+
+def _shutdown():
+    """Освобождает ресурсы, которые держал процесс (пул Oracle)."""
+    if "db.connect_db_oracle" in sys.modules:
+        sys.modules["db.connect_db_oracle"].close_oracle_pool()
+
+
+def serve(name: str = None, idle_timeout: float = None, preload: bool = True, book_factory=None):
+    """
+    Принимает запросы до команды shutdown или простоя idle_timeout секунд.
+
+    Args:
+        name (str): имя канала (по умолчанию SR_WORKER_NAME или sr_worker_<пользователь>)
+        idle_timeout (float): секунд простоя до завершения (по умолчанию SR_WORKER_IDLE или IDLE_TIMEOUT)
+        preload (bool): сразу импортировать pandas, oracledb и модуль доступа к БД
+        book_factory (callable): argv -> книга вместо xw.Book.caller() (FakeBook для проверки без Excel)
+    """
+    address = _address(name)
+    authkey = _authkey()
+    if ping(name):
+        raise RuntimeError(f"Рабочий процесс уже запущен ({address})")
+    if sys.platform != "win32" and os.path.exists(address):
+        # Сокет остался от аварийно завершенного процесса
+        os.unlink(address)
+    if idle_timeout is None:
+        idle_timeout = float(os.environ.get(IDLE_ENV, IDLE_TIMEOUT))
+    state = _State(idle_timeout)
+
+    if preload:
+        import main  # noqa: F401
+        import db.oracle  # noqa: F401
+
+    with Listener(address, authkey=authkey) as listener:
+        print(f"Рабочий процесс {os.getpid()} слушает {address}", flush=True)
+        threading.Thread(target=_watchdog, args=(state, address, authkey), daemon=True).start()
+        while not state.stopped:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError):
+                continue
+            with conn:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    continue
+                response = _handle(request, state, book_factory)
+                try:
+                    conn.send(response)
+                except OSError:
+                    pass
+    _shutdown()
+    print(f"Рабочий процесс {os.getpid()} завершен (вызовов: {state.calls})", flush=True)
+
+
+# =============================================================================
+# Клиент (вызывается из main.run_*)
+# =============================================================================
+
+def _request(message: dict, name: str = None):
+    with Client(_address(name), authkey=_authkey()) as conn:
+        conn.send(message)
+        return conn.recv()
+
+
+def ping(name: str = None):
+    """Состояние процесса (pid, uptime, idle, calls) или None, если он не запущен."""
+    try:
+        return _request({"op": "ping"}, name)
+    except (OSError, EOFError, AuthenticationError):
+        return None
+
+
+def stop(name: str = None) -> bool:
+    try:
+        return _request({"op": "shutdown"}, name)["ok"]
+    except (OSError, EOFError, AuthenticationError):
+        return False
+
+
+def start(name: str = None, timeout: float = START_TIMEOUT) -> bool:
+    """Запускает процесс в фоне (вывод — в logs/worker.log) и ждет ответа на ping."""
+    LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ)
+    env.pop(WORKER_ENV, None)
+    if name:
+        env[NAME_ENV] = name
+    options = {}
+    if sys.platform == "win32":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    with open(LOG_PATH, "a", encoding="utf-8") as log:
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "serve"], cwd=LOG_PATH.parent.parent,
+                         env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=log, **options)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if ping(name):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def run_remote(target: str, name: str = None) -> bool:
+    """
+    Выполняет main.<target>() в рабочем процессе (запуская его при необходимости).
+
+    Returns:
+        bool: False, если процесс недоступен — тогда вызов нужно выполнить локально
+
+    Raises:
+        RuntimeError: функция завершилась ошибкой в рабочем процессе (с его traceback)
+    """
+    argv = [arg for arg in sys.argv if arg.startswith(CALLER_ARGS)]
+    if not ping(name) and not start(name):
+        print("Рабочий процесс недоступен — выполняется локально")
+        return False
+    response = _request({"op": "run", "name": target, "argv": argv}, name)
+    if not response["ok"]:
+        raise RuntimeError(f"{response['error']}\n\n{response.get('traceback', '')}")
+    return True
+
+
+# =============================================================================
+# Проверка без Excel (python worker.py bench)
+# =============================================================================
+
+def _demo_book(argv):
+    """FakeBook с параметрами запуска — книга для проверки без Excel."""
+    from datetime import datetime
+    from utils.fake_workbook import FakeBook
+
+    book = FakeBook(name=next((arg.split("=", 1)[1] for arg in argv if arg.startswith("--wb=")), "FakeBook.xlsm"))
+    book.set_name("RDATE", datetime(2025, 3, 31), address="A1")
+    book.set_name("ForecastDate", None, address="A2")
+    return book
+
+
+def _bench(name: str = "sr_worker_bench", repeat: int = 5):
+    """
+    Сравнивает вызов run_reset_6sx новым интерпретатором (как RunPython) и через
+    рабочий процесс; проверяет обработку ошибок на FakeBook и остановку по простою.
+    """
+    import multiprocessing
+
+    root = str(Path(__file__).resolve().parent)
+    command = [sys.executable, "-c", "import main; main.run_reset_6sx()"]
+    local_env = {k: v for k, v in os.environ.items() if k != WORKER_ENV}
+    remote_env = {**local_env, WORKER_ENV: "1", NAME_ENV: name}
+
+    def timed(call):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    cold = timed(lambda: subprocess.run(command, cwd=root, env=local_env, check=True))
+
+    process = multiprocessing.Process(target=serve, kwargs={"name": name, "idle_timeout": 3,
+                                                            "book_factory": _demo_book})
+    process.start()
+    deadline = time.monotonic() + START_TIMEOUT
+    while not ping(name) and time.monotonic() < deadline:
+        time.sleep(0.2)
+
+    # Как при RunPython: новый интерпретатор, import main, вызов через рабочий процесс
+    client = timed(lambda: subprocess.run(command, cwd=root, env=remote_env, check=True))
+    warm = timed(lambda: run_remote("run_reset_6sx", name))
+    print("run_reset_6sx, лучшее из", repeat)
+    print(f"  новый интерпретатор, локально:         {cold:8.1f} мс")
+    print(f"  новый интерпретатор, рабочий процесс:  {client:8.1f} мс")
+    print(f"  только вызов рабочего процесса:        {warm:8.1f} мс")
+
+    # Ошибка в рабочем процессе доходит до вызывающего вместе с traceback
+    sys.argv.append("--wb=Demo.xlsm")
+    try:
+        run_remote("run_detail_6sx", name)
+    except RuntimeError as e:
+        print(f"run_detail_6sx на FakeBook (без Oracle): {str(e).splitlines()[0]}")
+    finally:
+        sys.argv.pop()
+    print(f"Состояние: {ping(name)}")
+
+    process.join(timeout=15)
+    print(f"Остановка по простою: {'да' if not process.is_alive() else 'нет'}")
+    if process.is_alive():
+        stop(name)
+        process.join()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if command == "serve":
+        serve()
+    elif command == "status":
+        print(ping() or "Рабочий процесс не запущен")
+    elif command == "stop":
+        print("Остановлен" if stop() else "Рабочий процесс не запущен")
+    elif command == "bench":
+        _bench()
+    else:
+        print(__doc__)